@@ -0,0 +1,108 @@
+from random import randint
+
+LINE_CLEAR_MS = 200   # duration of the effect per completed line
+GAME_OVER_MS = 2000   # duration of the game over flash over the whole field
+
+
+class Tween:
+
+  def __init__(self, duration: int, delay: int = 0, on_done=None):
+    """Tween
+    Progress from 0 to 1 over duration milliseconds, driven by Scheduler.update().
+    Nothing waits, the progress is computed from the time of each frame.
+
+    Args:
+        duration: milliseconds from start to end
+        delay: milliseconds before start
+        on_done: called once when finished
+    """
+    self.duration, self.delay = duration, delay
+    self.on_done = on_done
+    self.started = None
+    self.progress = 0.0
+
+  def start(self, now: int):
+    self.started = now + self.delay
+
+  def update(self, now: int):
+    """Update the progress, returns False when finished"""
+    if now < self.started:
+      self.progress = 0.0
+      return True
+    self.progress = min((now - self.started) / self.duration, 1.0) if self.duration else 1.0
+    return self.progress < 1.0
+
+  @property
+  def running(self):
+    return self.started is not None and self.progress > 0.0
+
+  def cells(self):
+    """{(x, y): color} drawn on top of the field"""
+    return {}
+
+
+class LineClearEffect(Tween):
+
+  def __init__(self, height: int, width: int, field_height: int, delay: int = 0):
+    """Sweep of colored tiles from left to right over a completed line"""
+    super().__init__(LINE_CLEAR_MS, delay)
+    r = randint(30, 200)
+    g = int((field_height - height) / field_height * 200)
+    self.__colors = [((x, height), (r, g, int((width - x) / field_height * 200))) for x in range(width)]
+
+  def cells(self):
+    if not self.running:
+      return {}
+    shown = int(self.progress * len(self.__colors)) + 1
+    return dict(self.__colors[:shown])
+
+
+class GameOverEffect(Tween):
+
+  def __init__(self, width: int, height: int, on_done=None):
+    """Tiles of random colors filling the field row by row"""
+    super().__init__(GAME_OVER_MS, on_done=on_done)
+    self.__colors = [
+      ((x, y), (randint(30, 255), randint(30, 255), randint(30, 255)))
+      for y in range(height) for x in range(width)
+    ]
+
+  def cells(self):
+    shown = int(self.progress * len(self.__colors))
+    return dict(self.__colors[:shown])
+
+
+class Scheduler:
+
+  def __init__(self):
+    """Scheduler
+    Runs tweens over multiple frames, call update() once per frame with the current time.
+    """
+    self.__tweens = []
+    self.__now = 0
+
+  def __len__(self):
+    return len(self.__tweens)
+
+  def add(self, tween: Tween):
+    tween.start(self.__now)
+    self.__tweens.append(tween)
+    return tween
+
+  def update(self, now: int):
+    self.__now = now
+    finished = [tween for tween in self.__tweens if not tween.update(now)]
+    for tween in finished:
+      self.__tweens.remove(tween)
+      if tween.on_done:
+        tween.on_done()
+
+  def overlay(self):
+    """Cells of all running effects, later tweens on top"""
+    cells = {}
+    for tween in self.__tweens:
+      cells.update(tween.cells())
+    return cells
+
+  def clear(self):
+    self.__tweens = []
@@ -0,0 +1,54 @@
+import hashlib
+import json
+import os
+from util import filenames, svg2png
+
+ASSETS = 'assets'
+ICONS = os.path.join(ASSETS, 'icons')
+ICON_STAMP = os.path.join(ASSETS, '.icons.json')  # per svg name: [content hash, mtime in ns, size]
+
+
+def file_hash(path):
+  with open(path, 'rb') as f:
+    return hashlib.sha1(f.read()).hexdigest()
+
+
+def convert_icons(icons=ICONS, stamp=ICON_STAMP):
+  """Convert icon SVGs whose content changed since the last conversion to PNG
+
+  An SVG of the same mtime and size as at the last conversion is not read,
+  then this is a glob and a stat per icon: no hashing and no cairosvg import.
+  The mtime of each file is compared, an SVG edited in place does not touch its directory.
+
+  Returns:
+      list of converted paths without extension
+  """
+  try:
+    with open(stamp) as f:
+      stamps = json.load(f)
+  except (OSError, ValueError):
+    stamps = {}
+
+  converted, changed = [], False
+  for svg in sorted(filenames(os.path.join(icons, '*.svg'))):
+    path = svg[:-4]
+    name = os.path.basename(path)
+    stat = os.stat(svg)
+    known = stamps.get(name)
+    png = f"{path}.png"
+    exists = os.path.exists(png)
+    if exists and isinstance(known, list) and known[1:] == [stat.st_mtime_ns, stat.st_size]:
+      continue
+    digest = file_hash(svg)
+    stamps[name], changed = [digest, stat.st_mtime_ns, stat.st_size], True
+    # stamps of the previous format were the hash only
+    if exists and (known is None or (known[0] if isinstance(known, list) else known) == digest):
+      # unchanged, or shipped or converted before the stamp existed
+      continue
+    svg2png(path)
+    converted.append(path)
+
+  if changed:
+    with open(stamp, 'w') as f:
+      json.dump(stamps, f, indent=2, sort_keys=True)
+  return converted
@@ -0,0 +1,163 @@
+import os
+import time
+from random import choice
+from util import filenames
+
+ASSETS = 'assets'
+MUSIC = os.path.join(ASSETS, 'music', '*.wav')
+MUSIC_VOLUME = 0.5
+CROSSFADE_MS = 1500   # fade out of the old track, then fade in of the new one
+EFFECT_CHANNELS = 4   # reserved channels for sound effects, music does not use one
+
+# sound effect name -> (file, priority, min interval in ms)
+#   a higher priority steals the channel of a lower or equal one when the pool is full
+#   plays closer than the interval to the previous one of the same effect are dropped
+SOUNDS = {
+  'falled': ('sounds/WhipFoley_02_644.wav', 0, 60),
+  'completed': ('sounds/Interference_06_SP.wav', 1, 60),
+  'multiple': ('sounds/PlasticSheetWhipFoley_02_609.wav', 2, 60),
+  'combo': ('sounds/25_MediumSnare_SP_356_99.wav', 2, 60),
+  'gameover': ('sounds/HeavyWhooshes_39_342.wav', 3, 500),
+}
+
+
+class Audio:
+
+  def __init__(self, root=ASSETS, channels=EFFECT_CHANNELS, crossfade_ms=CROSSFADE_MS):
+    """Audio
+    Music is streamed from disk by pygame.mixer.music, one track at a time.
+    Effects are decoded on their first play and played on a fixed pool of reserved channels,
+    with voice stealing by priority and a rate limit per effect.
+    Call update() every frame for track changes.
+    """
+    import pygame
+    self.root = root
+    self.crossfade_ms = crossfade_ms
+    pygame.mixer.set_num_channels(channels)
+    pygame.mixer.set_reserved(channels)
+    self.__channels = [pygame.mixer.Channel(i) for i in range(channels)]
+    self.__voices = [None] * channels   # (priority, started) playing on each channel
+    self.__sounds = {}
+    self.__last_played = {}   # name -> time in ms
+    self.__tracks = None
+    self.__next_track = None  # waiting for the fade out of the current one
+    self.track = None
+    self.played, self.stolen, self.dropped = 0, 0, 0
+
+  ######################## effects
+
+  def sound(self, name):
+    import pygame
+    sound = self.__sounds.get(name)
+    if sound is None:
+      sound = self.__sounds[name] = pygame.mixer.Sound(os.path.join(self.root, SOUNDS[name][0]))
+    return sound
+
+  def play(self, name, now=None):
+    """Play an effect, returns False when it was rate limited or every channel had a higher priority"""
+    _, priority, interval = SOUNDS[name]
+    now = time.monotonic() * 1000 if now is None else now
+    last = self.__last_played.get(name)
+    if last is not None and now - last < interval:
+      self.dropped += 1
+      return False
+
+    idx = self.__free_channel()
+    if idx is None:
+      idx = self.__steal(priority)
+      if idx is None:
+        self.dropped += 1
+        return False
+      self.stolen += 1
+    self.__channels[idx].play(self.sound(name))
+    self.__voices[idx] = (priority, now)
+    self.__last_played[name] = now
+    self.played += 1
+    return True
+
+  def __free_channel(self):
+    for idx, channel in enumerate(self.__channels):
+      if not channel.get_busy():
+        return idx
+    return None
+
+  def __steal(self, priority):
+    """Oldest of the lowest priority voices, if not above priority"""
+    idx = min(range(len(self.__voices)), key=lambda i: self.__voices[i])
+    if self.__voices[idx][0] > priority:
+      return None
+    return idx
+
+  def stop_effects(self):
+    for channel in self.__channels:
+      channel.stop()
+
+  def unload(self):
+    """Free decoded effects, they are loaded again on the next play"""
+    self.stop_effects()
+    self.__sounds.clear()
+
+  ######################## music
+
+  def tracks(self):
+    if self.__tracks is None:
+      self.__tracks = filenames(MUSIC)
+    return self.__tracks
+
+  def play_music(self, path=None, volume=MUSIC_VOLUME):
+    """Stream a track, a random one by default, looped"""
+    import pygame
+    path = path or (choice(self.tracks()) if self.tracks() else None)
+    if path is None:
+      return
+    self.__next_track = None
+    self.track = path
+    pygame.mixer.music.load(path)
+    pygame.mixer.music.set_volume(volume)
+    pygame.mixer.music.play(loops=-1)
+
+  def crossfade(self, path=None):
+    """Fade out the current track, the next one fades in from update()
+    pygame.mixer.music streams a single track, so the two fades follow each other.
+    """
+    import pygame
+    path = path or (choice(self.tracks()) if self.tracks() else None)
+    if path is None:
+      return
+    if not pygame.mixer.music.get_busy():
+      self.play_music(path)
+      return
+    self.__next_track = path
+    pygame.mixer.music.fadeout(self.crossfade_ms)
+
+  def update(self):
+    import pygame
+    if self.__next_track and not pygame.mixer.music.get_busy():
+      path = self.__next_track
+      self.__next_track = None
+      self.track = path
+      pygame.mixer.music.load(path)
+      pygame.mixer.music.set_volume(MUSIC_VOLUME)
+      pygame.mixer.music.play(loops=-1, fade_ms=self.crossfade_ms)
+
+  ######################## report
+
+  def memory(self):
+    """Bytes of decoded PCM resident in memory, the music stream buffer is not counted"""
+    import pygame
+    init = pygame.mixer.get_init()
+    if not init:
+      return 0
+    frequency, size, channels = init
+    frame = abs(size) // 8 * channels
+    return sum(int(sound.get_length() * frequency) * frame for sound in self.__sounds.values())
+
+  def report(self):
+    return {
+      "effects loaded": len(self.__sounds),
+      "effect bytes": self.memory(),
+      "track": self.track,
+      "played": self.played,
+      "stolen": self.stolen,
+      "dropped": self.dropped,
+    }
@@ -0,0 +1,301 @@
+import numpy as np
+from figure import SHAPE_TABLE
+from shape import Shape, DifficultShape
+from item import Item
+from engine import (
+  Action, W, H, FALLING_SPEED_INITIAL, FALLING_SPEED_INCREASE,
+  FALLING_SPEED_ACCELERATED, FALLING_TRIGGER, DEFAULT_ITEM_PRESENCE_RATIO
+)
+
+# Shape ids, index into the piece tables
+SHAPES = list(SHAPE_TABLE)
+NORMAL_SHAPES = np.array([SHAPES.index(shape) for shape in Shape], dtype=np.int8)
+DIFFICULT_SHAPES = np.array([SHAPES.index(shape) for shape in DifficultShape], dtype=np.int8)
+BAR = SHAPES.index(Shape.BAR)
+
+# Item ids, 0 is no item
+ITEMS = [None] + list(Item)
+DOLLAR, BOLT, STAR = ITEMS.index(Item.DOLLAR), ITEMS.index(Item.BOLT), ITEMS.index(Item.STAR)
+
+# Piece tables: (shape, rotation, tile) -> dx, dy, padded by repeating the first tile
+MAX_TILES = max(len(rotations[0].offsets) for _, rotations in SHAPE_TABLE.values())
+OFFSETS = np.array([
+  [list(rotation.offsets) + [rotation.offsets[0]] * (MAX_TILES - len(rotation.offsets)) for rotation in rotations]
+  for _, rotations in SHAPE_TABLE.values()
+], dtype=np.int32)
+LEFT = np.array([[rotation.left for rotation in rotations] for _, rotations in SHAPE_TABLE.values()], dtype=np.int32)
+RIGHT = np.array([[rotation.right for rotation in rotations] for _, rotations in SHAPE_TABLE.values()], dtype=np.int32)
+# the first tile carries the item
+ITEM_TILE = np.zeros(MAX_TILES, dtype=bool)
+ITEM_TILE[0] = True
+
+QUEUE_SIZE = 32  # figures waiting per board at first, the queues double when an item adds more
+
+# A cell of the boards: shape id + 1 in the low 4 bits, item id in the high 4 bits, 0 is empty
+ITEM_SHIFT = 4
+
+
+class BatchTetris:
+
+  def __init__(self, n: int, width=W, height=H, item_presence_ratio=DEFAULT_ITEM_PRESENCE_RATIO,
+               falling_speed_initial=FALLING_SPEED_INITIAL, seed=None):
+    """BatchTetris
+    N games in lockstep, every rule of engine.Game applied as array operations across all boards.
+    boards is a (N, H, W) uint8 array, see ITEM_SHIFT for the cell encoding.
+    Games that are over are reset at the end of the step, see `done` of step().
+
+    Args:
+        n: count of boards
+        width, height: count of tiles of each board
+        item_presence_ratio: probability of a random figure carrying an item
+        falling_speed_initial: falling_count added per step
+        seed: seed of the numpy Generator of the whole batch
+    """
+    self.n, self.width, self.height = n, width, height
+    self.item_presence_ratio = item_presence_ratio
+    self.falling_speed_initial = falling_speed_initial
+    self.rng = np.random.default_rng(seed)
+
+    self.boards = np.zeros((n, height, width), dtype=np.uint8)
+    # falling figure
+    self.shape = np.zeros(n, dtype=np.int32)
+    self.rotation = np.zeros(n, dtype=np.int32)
+    self.x = np.zeros(n, dtype=np.int32)
+    self.y = np.zeros(n, dtype=np.int32)
+    self.item = np.zeros(n, dtype=np.uint8)
+    # figure queue as ring buffer, queue[head] is the next figure
+    self.queue_shape = np.zeros((n, QUEUE_SIZE), dtype=np.int32)
+    self.queue_item = np.zeros((n, QUEUE_SIZE), dtype=np.uint8)
+    self.head = np.zeros(n, dtype=np.int32)
+    self.length = np.zeros(n, dtype=np.int32)
+    # gravity
+    self.falling_speed = np.zeros(n, dtype=np.int32)
+    self.falling_count = np.zeros(n, dtype=np.int32)
+    self.fast_falling = np.zeros(n, dtype=bool)
+    # scores
+    self.score = np.zeros(n, dtype=np.int64)
+    self.combo = np.zeros(n, dtype=np.int32)
+    self.previously_completed_lines = np.zeros(n, dtype=np.int32)
+    self.total_lines = np.zeros(n, dtype=np.int64)
+    self.games = np.zeros(n, dtype=np.int64)
+
+    self.reset()
+
+  ######################## reset
+
+  def reset(self, mask=None):
+    """Start new games on boards of the mask (all by default)"""
+    idx = np.arange(self.n) if mask is None else np.flatnonzero(mask)
+    if idx.size == 0:
+      return
+    self.boards[idx] = 0
+    self.falling_speed[idx] = self.falling_speed_initial
+    self.falling_count[idx] = 0
+    self.fast_falling[idx] = False
+    self.score[idx] = 0
+    self.combo[idx] = 0
+    self.previously_completed_lines[idx] = 0
+    self.total_lines[idx] = 0
+    self.head[idx] = 0
+    self.length[idx] = 0
+    # current and next figure
+    self.__append_random(idx)
+    self.__append_random(idx)
+    self.__spawn(idx)
+
+  def __append(self, idx, shape, item):
+    size = self.queue_shape.shape[1]
+    if self.length[idx].max(initial=0) == size:
+      self.__grow()
+      size *= 2
+    position = (self.head[idx] + self.length[idx]) % size
+    self.queue_shape[idx, position] = shape
+    self.queue_item[idx, position] = item
+    self.length[idx] += 1
+
+  def __grow(self):
+    """Double the queues of every board, the waiting figures are moved to the start"""
+    size = self.queue_shape.shape[1]
+    lanes = np.arange(self.n)[:, None]
+    order = (self.head[:, None] + np.arange(size)) % size
+    self.queue_shape = np.concatenate([self.queue_shape[lanes, order], np.zeros_like(self.queue_shape)], axis=1)
+    self.queue_item = np.concatenate([self.queue_item[lanes, order], np.zeros_like(self.queue_item)], axis=1)
+    self.head[:] = 0
+
+  def __append_random(self, idx):
+    shape = self.rng.choice(NORMAL_SHAPES, size=idx.size)
+    with_item = self.rng.random(idx.size) < self.item_presence_ratio
+    item = np.where(with_item, self.rng.integers(1, len(ITEMS), size=idx.size), 0)
+    self.__append(idx, shape, item)
+
+  def __spawn(self, idx):
+    """Pop the queue into the falling figure, refill the queue to keep a next figure
+    Only the next figure is drawn ahead, pieces added afterwards come right after it, same as FigureQueue.
+    """
+    head = self.head[idx]
+    shape = self.queue_shape[idx, head]
+    self.shape[idx] = shape
+    self.item[idx] = self.queue_item[idx, head]
+    self.rotation[idx] = 0
+    self.x[idx] = self.width // 2
+    # difficult figures start one line lower, same as Figure
+    self.y[idx] = 1 + np.isin(shape, DIFFICULT_SHAPES)
+    self.head[idx] = (head + 1) % self.queue_shape.shape[1]
+    self.length[idx] -= 1
+    refill = idx[self.length[idx] < 1]
+    if refill.size:
+      self.__append_random(refill)
+
+  ######################## queries
+
+  @property
+  def next_shape(self):
+    return self.queue_shape[np.arange(self.n), self.head]
+
+  def fits(self, idx, shape, rotation, x, y):
+    """True where the figure of boards[idx] fits at (x, y), tiles above the top border are free"""
+    offsets = OFFSETS[shape, rotation]            # (n, tiles, 2)
+    xs = x[:, None] + offsets[:, :, 0]
+    ys = y[:, None] + offsets[:, :, 1]
+    inside = (xs >= 0) & (xs < self.width) & (ys < self.height)
+    visible = ys >= 0
+    filled = self.boards[
+      idx[:, None],
+      np.clip(ys, 0, self.height - 1),
+      np.clip(xs, 0, self.width - 1)
+    ] != 0
+    return (inside & ~(filled & visible)).all(axis=1)
+
+  ######################## step
+
+  def step(self, actions=None):
+    """Advance every board one tick
+
+    Args:
+        actions: (N,) of Action values, None or 0 is no input
+
+    Returns:
+        (completed lines, score, done) arrays of (N,), score is the final score where done
+    """
+    n = self.n
+    everyone = np.arange(n)
+    if actions is not None:
+      actions = np.asarray(actions)
+      self.__move(everyone, actions)
+      self.fast_falling |= actions == Action.FAST_ON.value
+      self.fast_falling &= actions != Action.FAST_OFF.value
+
+    # gravity
+    self.falling_count += np.where(self.fast_falling, FALLING_SPEED_ACCELERATED, self.falling_speed)
+    falling = self.falling_count > FALLING_TRIGGER
+    self.falling_count[falling] = 0
+    idx = np.flatnonzero(falling)
+    landed = np.zeros(n, dtype=bool)
+    if idx.size:
+      down = self.fits(idx, self.shape[idx], self.rotation[idx], self.x[idx], self.y[idx] + 1)
+      self.y[idx[down]] += 1
+      landed[idx[~down]] = True
+
+    completed = np.zeros(n, dtype=np.int32)
+    over = np.zeros(n, dtype=bool)
+    idx = np.flatnonzero(landed)
+    if idx.size:
+      over[idx] = self.__lock(idx)
+      completed[idx] = self.__complete_lines(idx)
+      over |= self.boards[:, 0, :].any(axis=1)
+
+    score = self.score.copy()
+    if over.any():
+      self.games += over
+      self.reset(over)
+    return completed, score, over
+
+  def __move(self, idx, actions):
+    # move x
+    dx = (actions == Action.RIGHT.value).astype(np.int32) - (actions == Action.LEFT.value)
+    moving = idx[dx != 0]
+    if moving.size:
+      x = self.x[moving] + dx[moving]
+      ok = self.fits(moving, self.shape[moving], self.rotation[moving], x, self.y[moving])
+      self.x[moving[ok]] = x[ok]
+
+    # rotate with wall kick back inside the border
+    rotating = idx[actions == Action.ROTATE.value]
+    if rotating.size:
+      shape = self.shape[rotating]
+      rotation = (self.rotation[rotating] + 1) % 4
+      x = np.clip(self.x[rotating], -LEFT[shape, rotation], self.width - 1 - RIGHT[shape, rotation])
+      ok = self.fits(rotating, shape, rotation, x, self.y[rotating])
+      self.rotation[rotating[ok]] = rotation[ok]
+      self.x[rotating[ok]] = x[ok]
+
+  def __lock(self, idx):
+    """Write falling figures into the boards, spawn the next ones
+
+    Returns:
+        True where a tile was above the top border
+    """
+    shape = self.shape[idx]
+    offsets = OFFSETS[shape, self.rotation[idx]]
+    xs = self.x[idx, None] + offsets[:, :, 0]
+    ys = self.y[idx, None] + offsets[:, :, 1]
+    cells = (shape + 1).astype(np.uint8)[:, None] | np.where(ITEM_TILE, self.item[idx, None] << ITEM_SHIFT, 0).astype(np.uint8)
+    visible = ys >= 0
+    rows = np.broadcast_to(idx[:, None], ys.shape)
+    self.boards[rows[visible], ys[visible], xs[visible]] = cells[visible]
+
+    self.score[idx] += 1
+    reset_combo = idx[self.previously_completed_lines[idx] == 0]
+    self.combo[reset_combo] = 0
+    self.previously_completed_lines[idx] = 0
+    self.__spawn(idx)
+    return ~visible.all(axis=1)
+
+  def __complete_lines(self, idx):
+    boards = self.boards[idx]
+    full = (boards != 0).all(axis=2)              # (n, H)
+    completed = full.sum(axis=1).astype(np.int32)
+    has = completed > 0
+    if not has.any():
+      return completed
+    idx, boards, full, completed = idx[has], boards[has], full[has], completed[has]
+
+    # items of completed lines
+    items = np.where(full[:, :, None], boards >> ITEM_SHIFT, 0)
+    dollars = (items == DOLLAR).sum(axis=(1, 2))
+    # BOLT and STAR in the order Game deals with them, lines from the bottom, tiles from the left
+    adding = items[:, ::-1, :].reshape(idx.size, -1)
+    adding = np.take_along_axis(adding, np.argsort((adding != BOLT) & (adding != STAR), axis=1, kind='stable'), axis=1)
+    adding_count = ((adding == BOLT) | (adding == STAR)).sum(axis=1)
+
+    # row compaction: completed rows go to the top and are emptied, the others keep their order
+    order = np.argsort(np.where(full, -1, np.arange(self.height)), axis=1, kind='stable')
+    boards = np.take_along_axis(boards, order[:, :, None], axis=1)
+    boards[np.arange(self.height)[None, :] < completed[:, None]] = 0
+    self.boards[idx] = boards
+
+    # score, same rules as Game
+    self.falling_speed[idx] = np.minimum(self.falling_speed[idx] + completed * FALLING_SPEED_INCREASE, FALLING_SPEED_ACCELERATED)
+    combo = self.combo[idx] + 1
+    combo_bonus = np.where(combo > 1, combo * 10, 0)
+    completed_bonus = completed * 2
+    multi_bonus = np.where(
+      completed > 1,
+      self.rng.integers(1, completed + 1) * self.rng.integers(completed, 6) * completed,
+      0
+    )
+    self.score[idx] += dollars * 100 + completed_bonus + multi_bonus + combo_bonus
+    self.combo[idx] = combo
+    self.previously_completed_lines[idx] = completed
+    self.total_lines[idx] += completed
+
+    # BOLT adds a difficult figure, STAR adds three bars
+    for i in range(int(adding_count.max(initial=0))):
+      bolt = idx[adding[:, i] == BOLT]
+      if bolt.size:
+        self.__append(bolt, self.rng.choice(DIFFICULT_SHAPES, size=bolt.size), 0)
+      star = idx[adding[:, i] == STAR]
+      if star.size:
+        for _ in range(3):
+          self.__append(star, BAR, 0)
+    return completed
@@ -0,0 +1,89 @@
+"""Steps per second of BatchTetris
+
+  python benchmarks/bench_batch.py [steps]
+
+Random inputs on every board, gravity fast enough that figures fall one tile
+every step, for N = 1, 64 and 1024 boards. Board-steps/sec is N x steps/sec.
+Checks first that the pieces added by BOLT and STAR come in the same place of
+the queue as in engine.Game, also when two rows of stars add more pieces than
+QUEUE_SIZE. The generators differ (numpy and random), so the
+pieces are compared by kind: added bars and difficult figures after the next figure.
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+import numpy as np
+from batch import BatchTetris, SHAPES, ITEMS, ITEM_SHIFT, QUEUE_SIZE
+from engine import Game, BASIC_ACTIONS, FALLING_TRIGGER, W, H
+from item import Item
+from shape import Shape
+
+# items on the bottom row, completed by the next lock
+ITEM_ROWS = [[Item.STAR], [Item.BOLT], [Item.BOLT, Item.STAR], [Item.STAR, Item.DOLLAR, Item.BOLT, Item.STAR]]
+# rows of stars adding more bars than QUEUE_SIZE at once, the queue grows instead of wrapping
+OVERFLOW = ([Item.STAR] * W, 2)
+
+
+def kind(shape):
+  return 'bar' if shape == Shape.BAR else 'normal' if isinstance(shape, Shape) else 'difficult'
+
+
+def game_added(items, seed, rows=1):
+  """Kinds of the pieces after the next figure once a Game cleared bottom rows with items"""
+  game = Game(seed=seed)
+  field = game.field
+  for y in range(H - rows, H):
+    field.rows[y] = field.full
+    field.cells[y] = [((128, 128, 128), items[x] if x < len(items) else None) for x in range(W)]
+  field.rehash()
+  figure = game.figures.current_figure
+  game.place(0, figure.x, field.drop_y(figure.rotations[0], figure.x, figure.y))
+  added = game.figures.size() - 2
+  return [kind(piece.shape) for piece in game.figures.preview(1 + added)[1:]]
+
+
+def batch_added(items, seed, rows=1):
+  """Same for lane 0 of a BatchTetris, the figure falls until it locks"""
+  batch = BatchTetris(1, falling_speed_initial=FALLING_TRIGGER + 1, seed=seed)
+  codes = [ITEMS.index(items[x]) if x < len(items) else 0 for x in range(W)]
+  batch.boards[0, H - rows:] = [1 | code << ITEM_SHIFT for code in codes]
+  while not batch.step()[0][0]:
+    pass
+  head, length = batch.head[0], batch.length[0]
+  return [kind(SHAPES[batch.queue_shape[0, (head + i) % batch.queue_shape.shape[1]]]) for i in range(1, length)]
+
+
+def check_added(seeds=5):
+  for items in ITEM_ROWS:
+    for seed in range(seeds):
+      assert batch_added(items, seed) == game_added(items, seed), (items, seed)
+  items, rows = OVERFLOW
+  for seed in range(seeds):
+    added = batch_added(items, seed, rows)
+    if len(added) <= QUEUE_SIZE or added != game_added(items, seed, rows):
+      raise AssertionError(f"seed {seed}: {len(added)} pieces added by {rows} rows of stars differ from Game")
+
+
+def measure(n, steps, seed=0):
+  batch = BatchTetris(n, falling_speed_initial=FALLING_TRIGGER + 1, seed=seed)
+  rng = np.random.default_rng(seed)
+  actions = rng.integers(1, len(BASIC_ACTIONS) + 1, size=(steps, n))
+  started = time.perf_counter()
+  for step in range(steps):
+    batch.step(actions[step])
+  elapsed = time.perf_counter() - started
+  return steps / elapsed, int(batch.games.sum())
+
+
+def main(steps=2000):
+  check_added()
+  print("added pieces: same as Game, also past QUEUE_SIZE")
+  for n in (1, 64, 1024):
+    steps_per_sec, games = measure(n, steps)
+    print(f"N={n:<5} {steps_per_sec:10,.0f} steps/sec  {steps_per_sec * n:12,.0f} board-steps/sec  ({games} games finished)")
+
+
+if __name__ == '__main__':
+  main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,174 @@
+"""Bitboard `Board` against the list-of-lists field
+
+  python benchmarks/bench_board.py [boards]
+
+Checks that line completion and collision give bit-exact the same results as
+the original list-of-lists implementation, and the column heights, holes,
+bumpiness and landing rows (also under overhangs) the same as counting tiles
+of the list-of-lists field one by one, then times both.
+"""
+import os
+import sys
+import time
+import random
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from board import Board
+from figure import Tile, SHAPE_TABLE
+from item import Item
+
+W, H = 10, 20
+
+
+######################## original list-of-lists implementation
+
+def field_complete_lines(field):
+  completed = []
+  rewrite_y = H - 1
+  for source_y in range(H - 1, -1, -1):
+    filled_count = 0
+    items = []
+    for x in range(W):
+      tile_filled = field[x][source_y]
+      if tile_filled:
+        filled_count += 1
+        _, item = tile_filled
+        if item:
+          items.append(item)
+      field[x][rewrite_y] = tile_filled
+    if filled_count == W:
+      completed.append((source_y, items))
+    else:
+      rewrite_y -= 1
+  return completed
+
+
+def field_cannot_move(field, tiles):
+  border_right = len(field) - 1
+  border_bottom = len(field[0]) - 1
+  outside_of_x = any([tile.x < 0 or tile.x > border_right for tile in tiles])
+  outside_of_y = any([tile.y > border_bottom for tile in tiles])
+  hit = any([field[min(tile.x, border_right)][min(tile.y, border_bottom)] for tile in tiles])
+  return outside_of_x or outside_of_y or hit
+
+
+######################## brute force, one tile at a time
+
+def field_heights(field):
+  return [next((H - y for y in range(H) if column[y]), 0) for column in field]
+
+
+def field_holes(field):
+  return sum(1 for x, column in enumerate(field) for y in range(H - field_heights(field)[x], H) if not column[y])
+
+
+def field_bumpiness(field):
+  heights = field_heights(field)
+  return sum(abs(heights[x] - heights[x + 1]) for x in range(W - 1))
+
+
+def field_drop_y(field, rotation, x, y):
+  while not field_cannot_move(field, [Tile(x + dx, y + 1 + dy) for dx, dy in rotation.offsets]):
+    y += 1
+  return y
+
+
+######################## fixtures
+
+def random_field(rng: random.Random, full_rows=2):
+  # upper half stays empty: the original pass does not clear the top rows
+  # after shifting, so it only matches when they were empty anyway
+  field = [[False for _ in range(H)] for _ in range(W)]
+  for y in range(H // 2, H):
+    full = rng.random() < full_rows / H * 2
+    for x in range(W):
+      if full or rng.random() < 0.6:
+        item = rng.choice(list(Item)) if rng.random() < 0.1 else None
+        field[x][y] = ((rng.randrange(256), rng.randrange(256), rng.randrange(256)), item)
+  return field
+
+
+def random_tiles(rng: random.Random):
+  x, y = rng.randrange(-1, W + 1), rng.randrange(0, H + 1)
+  return [Tile(x + dx, y + dy) for dx, dy in rng.choice([[(0, 0), (1, 0), (0, 1), (1, 1)], [(-1, 0), (0, 0), (1, 0), (2, 0)]])]
+
+
+def check_drops(board, field, rng: random.Random, poses=8):
+  """drop_y of random poses that fit against the brute force, returns how many were under an overhang"""
+  overhangs = 0
+  for i in range(poses):
+    rotation = rng.choice(rng.choice(list(SHAPE_TABLE.values()))[1])
+    # every other pose starts in the filled lower half, where it may be under an overhang
+    x, y = rng.randrange(-rotation.left, W - rotation.right), rng.randrange(2 if i % 2 else H // 2, H - 2)
+    if field_cannot_move(field, [Tile(x + dx, y + dy) for dx, dy in rotation.offsets]):
+      continue
+    landing = min(H - board.heights[x + dx] - 1 - dy for dx, dy in rotation.bottoms)
+    overhangs += landing < y
+    assert board.drop_y(rotation, x, y) == field_drop_y(field, rotation, x, y), (rotation, x, y)
+  return overhangs
+
+
+def check_equivalence(boards):
+  rng = random.Random(0)
+  overhangs = 0
+  for _ in range(boards):
+    field = random_field(rng)
+    board = Board.from_field(field)
+    assert board.to_field() == field
+    assert board.heights == field_heights(field)
+    assert board.holes() == field_holes(field)
+    assert board.bumpiness() == field_bumpiness(field)
+    overhangs += check_drops(board, field, rng)
+    for _ in range(8):
+      tiles = random_tiles(rng)
+      assert board.collides(tiles) == field_cannot_move(field, tiles), tiles
+    assert board.clear_full_rows() == field_complete_lines(field)
+    assert board.hash == board.copy().rehash()
+    assert board == Board.from_field(field)
+    assert board.to_field() == field
+    # heights are updated by the line clear, the board after it is checked again
+    assert board.heights == field_heights(field)
+    assert board.holes() == field_holes(field)
+    assert board.bumpiness() == field_bumpiness(field)
+  return overhangs
+
+
+def timeit(label, func, fields, repeat=5):
+  best = min(_measure(func, fields) for _ in range(repeat))
+  print(f"{label:<32} {best / len(fields) * 1e6:8.2f} us/op")
+  return best
+
+
+def _measure(func, items):
+  started = time.perf_counter()
+  for item in items:
+    func(item)
+  return time.perf_counter() - started
+
+
+def main(boards=2000):
+  overhangs = check_equivalence(boards)
+  print(f"equivalence: ok ({boards} boards, {overhangs} drops under an overhang)")
+
+  rng = random.Random(1)
+  fields = [random_field(rng) for _ in range(boards)]
+  tiles = [random_tiles(rng) for _ in range(boards)]
+
+  print("line completion")
+  old = timeit("  list-of-lists", lambda field: field_complete_lines([column[:] for column in field]), fields)
+  new = timeit("  bitboard", lambda board: board.copy().clear_full_rows(), [Board.from_field(f) for f in fields])
+  # copy cost is included in both
+  copy_old = timeit("  list-of-lists copy only", lambda field: [column[:] for column in field], fields)
+  copy_new = timeit("  bitboard copy only", lambda board: board.copy(), [Board.from_field(f) for f in fields])
+  print(f"  speedup (without copy): {(old - copy_old) / max(new - copy_new, 1e-9):.1f}x")
+
+  print("collision")
+  pairs = list(zip(fields, tiles))
+  old = timeit("  list-of-lists", lambda pair: field_cannot_move(*pair), pairs)
+  pairs = [(Board.from_field(f), t) for f, t in pairs]
+  new = timeit("  bitboard", lambda pair: pair[0].collides(pair[1]), pairs)
+  print(f"  speedup: {old / new:.1f}x")
+
+
+if __name__ == '__main__':
+  main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,97 @@
+"""Games per second of the headless engine
+
+  python benchmarks/bench_engine.py [games]
+
+Random inputs, gravity fast enough that a figure falls one tile every step.
+Checks first that looking ahead with FigureQueue.preview() and taking a Game.state() do not change
+the pieces dealt, and that a game restored from a snapshot plays on the same.
+"""
+import os
+import sys
+import time
+import random
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+import snapshot
+from engine import Game, BASIC_ACTIONS, FALLING_TRIGGER
+from figure import FigureQueue, RANDOMIZERS
+from shape import Shape
+
+ACTIONS = BASIC_ACTIONS
+
+
+def play(game: Game, seed: int):
+  game.reset(seed)
+  rng = random.Random(seed)
+  steps = 0
+  while not game.over:
+    game.step(rng.choice(ACTIONS))
+    steps += 1
+  return steps
+
+
+def dealt(queue: FigureQueue, depth: int, pieces=200):
+  """Pieces in the order they fall, previewing depth ahead and adding bars and random pieces in between"""
+  result = []
+  for i in range(pieces):
+    queue.preview(depth)
+    if i % 5 == 0:
+      queue.add(3, Shape.BAR)
+    elif i % 7 == 0:
+      queue.add(1)
+    figure = queue.current_figure
+    result.append((figure.shape, figure.color, figure.item))
+    queue.next()
+  return result
+
+
+def check_preview():
+  for randomizer in RANDOMIZERS:
+    for seed in range(5):
+      expected = dealt(FigureQueue(0.5, rng=random.Random(seed), randomizer=randomizer), 0)
+      for depth in (1, 2, 5, 14):
+        assert dealt(FigureQueue(0.5, rng=random.Random(seed), randomizer=randomizer), depth) == expected, (randomizer, depth)
+
+
+def trace(game: Game, actions, state_every=0):
+  """(shape, color, score) after each of the actions, taking a state() every state_every steps"""
+  result = []
+  for i, action in enumerate(actions):
+    if state_every and i % state_every == 0:
+      game.state()
+    game.step(action)
+    figure = game.figures.current_figure
+    result.append((figure.shape, figure.color, game.score))
+  return result
+
+
+def check_state(seeds=20, steps=1500):
+  for randomizer in RANDOMIZERS:
+    for seed in range(seeds):
+      rng = random.Random(seed)
+      actions = [rng.choice(ACTIONS) for _ in range(steps)]
+      expected = trace(Game(seed=seed, randomizer=randomizer), actions)
+      assert trace(Game(seed=seed, randomizer=randomizer), actions, 1 + seed % 7) == expected, (randomizer, seed)
+      game = Game(seed=seed, randomizer=randomizer)
+      played = trace(game, actions[:steps // 2])
+      assert not game.state().figures.lookahead, "state() dealt pieces"
+      restored = Game.from_state(snapshot.decode(snapshot.encode(game.state())))
+      assert played + trace(restored, actions[steps // 2:]) == expected, (randomizer, seed)
+
+
+def main(games=200):
+  check_preview()
+  check_state()
+  print("preview and state: ok")
+  steps = 0
+  game = Game(falling_speed_initial=FALLING_TRIGGER + 1)
+  started = time.perf_counter()
+  for seed in range(games):
+    steps += play(game, seed)
+  elapsed = time.perf_counter() - started
+  print(f"games: {games}  steps: {steps}  elapsed: {elapsed:.2f}s")
+  print(f"{games / elapsed:,.1f} games/sec  {steps / elapsed:,.0f} steps/sec")
+
+
+if __name__ == '__main__':
+  main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,30 @@
+"""Scaling of evaluate.py across worker processes
+
+  python benchmarks/bench_evaluate.py [games] [max workers]
+
+Same seeded games for every worker count, gravity fast enough that figures
+fall one tile every step. Efficiency is speedup / workers.
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from evaluate import evaluate
+from engine import FALLING_TRIGGER
+
+
+def main(games=2000, max_workers=None):
+  max_workers = max_workers or os.cpu_count()
+  baseline = None
+  for workers in range(1, max_workers + 1):
+    started = time.perf_counter()
+    results = evaluate(games, workers, seed=0, falling_speed=FALLING_TRIGGER + 1)
+    games_per_sec = games / (time.perf_counter() - started)
+    baseline = baseline or games_per_sec
+    speedup = games_per_sec / baseline
+    print(f"workers {workers:3d}  {games_per_sec:10,.1f} games/sec  speedup {speedup:5.2f}x  efficiency {speedup / workers:5.0%}  (mean score {results['score'].mean():.2f})")
+
+
+if __name__ == '__main__':
+  main(*[int(arg) for arg in sys.argv[1:]])
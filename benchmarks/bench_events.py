@@ -0,0 +1,77 @@
+"""Cost of the event stream sinks against the old print-heavy path
+
+  python benchmarks/bench_events.py [games]
+
+Games/sec of random play with no sink, a RingSink, a JsonlSink and a sink that
+prints what the engine used to print (5 debug lines per figure, item and
+colored score lines), with stdout going to a file as when piped.
+"""
+import os
+import sys
+import time
+import random
+import tempfile
+from contextlib import redirect_stdout
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from engine import Game, BASIC_ACTIONS, Event, FALLING_TRIGGER, DEFAULT_ITEM_PRESENCE_RATIO
+from eventlog import RingSink, JsonlSink
+
+ACTIONS = BASIC_ACTIONS
+
+
+class PrintSink:
+  """The stdout output of the engine before the event stream"""
+
+  def emit(self, seed, tick, event, data):
+    if event == Event.SPAWNED:
+      print("shape: ", data.shape)
+      print("self.__default_item_presence_ratio ", DEFAULT_ITEM_PRESENCE_RATIO)
+      print("random() ", random.random())
+      print("item, ", data.item)
+      print("QUEUE: ", data.shape.ljust(6, ' '))
+    elif event == Event.ITEM:
+      print(f"ITEM: {data}")
+    elif event == Event.COMPLETED:
+      print(f"\x1b[31mSCORE: {str(data['score']).ljust(5, ' ')}\x1b[0m"
+            f"\x1b[33m +{data['completed_bonus']} Pts\x1b[0m\x1b[35m\x1b[0m\x1b[32m\x1b[0m")
+
+  def close(self):
+    pass
+
+
+def measure(sink, games):
+  game = Game(falling_speed_initial=FALLING_TRIGGER + 1)
+  game.sink = sink
+  steps = 0
+  started = time.perf_counter()
+  for seed in range(games):
+    game.reset(seed)
+    rng = random.Random(seed)
+    while not game.over:
+      game.step(rng.choice(ACTIONS))
+      steps += 1
+  if sink:
+    sink.close()
+  return games / (time.perf_counter() - started), steps
+
+
+def main(games=300):
+  with tempfile.TemporaryDirectory() as tmp:
+    with open(os.path.join(tmp, 'stdout.txt'), 'w') as out, redirect_stdout(out):
+      printed, _ = measure(PrintSink(), games)
+    ring = RingSink()
+    results = [
+      ("print (old)", printed),
+      ("none", measure(None, games)[0]),
+      ("ring buffer", measure(ring, games)[0]),
+      ("jsonl", measure(JsonlSink(os.path.join(tmp, 'events.jsonl')), games)[0]),
+    ]
+    lines = sum(1 for _ in open(os.path.join(tmp, 'events.jsonl')))
+  for label, games_per_sec in results:
+    print(f"{label:<12} {games_per_sec:8,.1f} games/sec  {games_per_sec / printed:5.2f}x")
+  print(f"jsonl: {lines} events, ring buffer keeps the last {len(ring.events)}")
+
+
+if __name__ == '__main__':
+  main(*[int(arg) for arg in sys.argv[1:]])
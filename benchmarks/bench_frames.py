@@ -0,0 +1,81 @@
+"""Frame latency histogram of main.py's loop with non-blocking effects
+
+  python benchmarks/bench_frames.py [frames]
+
+Runs the game, the Scheduler and the Renderer like main.py does, under the SDL
+dummy video driver, with random inputs. A line clear effect of four lines is
+started every two seconds on top of the ones the game produces, and game over
+plays the flash effect before restarting. Time is advanced by one frame budget
+per frame instead of sleeping, so only the work of each frame is measured.
+"""
+import os
+import sys
+import time
+import random
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+ROOT = os.path.join(os.path.dirname(__file__), '..')
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+import pygame
+from engine import Game, Action, Event, W, H
+from renderer import Renderer, SCREEN_RES
+from animation import Scheduler, LineClearEffect, GameOverEffect, LINE_CLEAR_MS
+
+FPS = 60
+BUDGET = 1000 / FPS
+BUCKETS = [0.5, 1, 2, 4, 8, BUDGET]
+
+
+def run(frames, seed=0):
+  rng = random.Random(seed)
+  renderer = Renderer(pygame.display.get_surface())
+  scheduler = Scheduler()
+  game = Game(falling_speed_initial=200, seed=seed)
+  state = {"game_over_effect": None}
+
+  def restart():
+    game.reset()
+    state["game_over_effect"] = None
+
+  times = []
+  now = 0.0
+  for frame in range(frames):
+    started = time.perf_counter()
+    game.apply(rng.choice([Action.NONE] * 6 + [Action.LEFT, Action.RIGHT, Action.ROTATE]))
+    lines = []
+    for kind, data in game.step():
+      if kind == Event.COMPLETED:
+        lines += data["lines"]
+    if frame % (FPS * 2) == 0:
+      lines += [H - 1, H - 2, H - 3, H - 4]
+    for i, height in enumerate(lines):
+      scheduler.add(LineClearEffect(height, W, H, delay=i * LINE_CLEAR_MS))
+    if game.over and not state["game_over_effect"]:
+      state["game_over_effect"] = scheduler.add(GameOverEffect(W, H, on_done=restart))
+    scheduler.update(int(now))
+    renderer.draw(game.field, game.figures.current_figure, game.figures.next_figure, game.score, 0, scheduler.overlay())
+    times.append((time.perf_counter() - started) * 1000)
+    now += BUDGET
+  return times
+
+
+def main(frames=3600):
+  pygame.init()
+  pygame.display.set_mode(SCREEN_RES)
+  times = run(frames)
+  times.sort()
+  print(f"frames: {len(times)}  p50 {times[len(times) // 2]:.3f} ms  p99 {times[int(len(times) * 0.99)]:.3f} ms  max {times[-1]:.3f} ms")
+  lower = 0
+  for upper in BUCKETS + [float('inf')]:
+    count = sum(1 for t in times if lower <= t < upper)
+    label = f"{lower:5.1f} - {upper:5.1f} ms" if upper != float('inf') else f"{lower:5.1f} ms -        "
+    print(f"{label}  {count:6d}  {'#' * (count * 50 // len(times))}")
+    lower = upper
+  over = sum(1 for t in times if t >= BUDGET)
+  print(f"frames over budget ({BUDGET:.1f} ms): {over}")
+
+
+if __name__ == '__main__':
+  main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,70 @@
+"""Per-frame cost of drawing item icons
+
+  python benchmarks/bench_icons.py [frames]
+
+A frame draws every item tile of a board where a fifth of the tiles carry an
+item, under the SDL dummy video driver:
+  load:  Item.load_image per tile, what the render loop did before the cache
+  image: cached Item.image subsurface per tile
+  atlas: one area blit per tile from the ItemAtlas sprite sheet
+"""
+import os
+import sys
+import time
+import random
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+ROOT = os.path.join(os.path.dirname(__file__), '..')
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+import pygame
+from item import Item, ItemAtlas
+from renderer import SCREEN_RES, figure_rect
+from engine import W, H
+
+
+def item_tiles(seed=0):
+  rng = random.Random(seed)
+  return [
+    (rng.choice(list(Item)), figure_rect(x, y))
+    for y in range(H // 2, H) for x in range(W)
+    if rng.random() < 0.2
+  ]
+
+
+def measure(draw, frames):
+  started = time.perf_counter()
+  for _ in range(frames):
+    draw()
+  return (time.perf_counter() - started) / frames
+
+
+def main(frames=200):
+  pygame.init()
+  screen = pygame.display.set_mode(SCREEN_RES)
+  tiles = item_tiles()
+
+  def load():
+    for item, rect in tiles:
+      screen.blit(item.load_image(), rect)
+
+  def image():
+    for item, rect in tiles:
+      screen.blit(item.image(), rect)
+
+  atlas = ItemAtlas.get()
+  def area_blit():
+    for item, rect in tiles:
+      atlas.draw(item, rect, screen)
+
+  started = time.perf_counter()
+  ItemAtlas.clear()
+  ItemAtlas.get()
+  print(f"atlas build: {(time.perf_counter() - started) * 1000:.2f} ms, {len(tiles)} item tiles per frame")
+  for label, draw in [("load", load), ("image", image), ("atlas", area_blit)]:
+    print(f"{label:<6} {measure(draw, frames) * 1000:8.3f} ms/frame")
+
+
+if __name__ == '__main__':
+  main(*[int(arg) for arg in sys.argv[1:]])
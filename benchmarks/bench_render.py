@@ -0,0 +1,108 @@
+"""Frame time of the dirty-rectangle Renderer against full redraw
+
+  python benchmarks/bench_render.py [frames]
+
+Runs under the SDL dummy video driver, frames are taken from a headless game
+with random inputs, so the same game states are drawn by both.
+"""
+import os
+import sys
+import time
+import random
+from copy import copy
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+ROOT = os.path.join(os.path.dirname(__file__), '..')
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+import pygame
+from engine import Game, Action, W, H
+from renderer import Renderer, SCREEN_RES, GAME_RES, BOARD_RES, MARGIN, TILE, figure_rect
+
+
+def draw_item(item, rect, screen):
+  # icons were loaded from disk on every draw
+  screen.blit(item.load_image(), rect)
+
+
+class FullRedraw:
+  """main.py's drawing before the Renderer, for comparison"""
+
+  def __init__(self, screen):
+    self.screen = screen
+    self.game_screen = pygame.Surface(GAME_RES)
+    self.bg_screen = pygame.image.load('assets/images/bg_screen.png').convert()
+    self.bg_game = pygame.image.load('assets/images/bg_game.jpg').convert()
+    main_font = pygame.font.Font('assets/font.ttf', 65)
+    self.font = pygame.font.Font('assets/font.ttf', 45)
+    self.text_title = main_font.render('TETRIS', True, pygame.Color('darkorange'))
+    self.text_score = self.font.render(' Score:', True, pygame.Color('green'))
+    self.text_record = self.font.render('Record:', True, pygame.Color('purple'))
+    self.grid = [pygame.Rect(x * TILE, y * TILE, TILE, TILE) for y in range(H) for x in range(W)]
+
+  def draw(self, board, figure, next_figure, score, record):
+    screen, game_screen = self.screen, self.game_screen
+    screen.blit(self.bg_screen, (0, 0))
+    screen.blit(game_screen, (BOARD_RES[0] + MARGIN * 2, MARGIN))
+    game_screen.blit(self.bg_game, (0, 0))
+    [pygame.draw.rect(game_screen, pygame.Color(40, 40, 40), i_rect, 1) for i_rect in self.grid]
+    for x, y, (color, item) in board.filled_tiles():
+      rect = figure_rect(x, y)
+      pygame.draw.rect(game_screen, color, rect)
+      if item:
+        draw_item(item, rect, game_screen)
+    for idx, tile in enumerate(figure.tiles):
+      rect = figure_rect(tile.x, tile.y)
+      pygame.draw.rect(game_screen, figure.color, rect)
+      if figure.item and (idx == 0):
+        draw_item(figure.item, rect, game_screen)
+    screen.blit(self.text_title, (MARGIN + 10, MARGIN + 10))
+    screen.blit(self.text_record, (MARGIN + 40, BOARD_RES[1] - MARGIN - 270))
+    screen.blit(self.font.render(str(record).rjust(6, ' '), True, pygame.Color('yellow')), (MARGIN + 40, BOARD_RES[1] - MARGIN - 200))
+    screen.blit(self.text_score, (MARGIN + 30, BOARD_RES[1] - MARGIN -100))
+    screen.blit(self.font.render(str(score).rjust(6, ' '), True, pygame.Color('white')), (MARGIN + 40, BOARD_RES[1] - MARGIN - 30))
+    for idx, tile in enumerate(next_figure.tiles):
+      rect = figure_rect(tile.x, tile.y)
+      rect.x += BOARD_RES[0] // 2 + MARGIN - W * TILE // 2
+      rect.y += BOARD_RES[1] // 6 + MARGIN
+      pygame.draw.rect(screen, next_figure.color, rect)
+      if next_figure.item and (idx == 0):
+        draw_item(next_figure.item, rect, screen)
+    pygame.display.update()
+
+
+def record_frames(frames, seed=0):
+  """Game states of consecutive frames, (board, figure, next figure, score)"""
+  rng = random.Random(seed)
+  game = Game(falling_speed_initial=100, seed=seed)
+  states = []
+  while len(states) < frames:
+    game.step(rng.choice([Action.NONE] * 6 + [Action.LEFT, Action.RIGHT, Action.ROTATE]))
+    if game.over:
+      game.reset()
+    states.append((game.field.copy(), copy(game.figures.current_figure), copy(game.figures.next_figure), game.score))
+  return states
+
+
+def measure(drawer, states):
+  times = []
+  for board, figure, next_figure, score in states:
+    started = time.perf_counter()
+    drawer.draw(board, figure, next_figure, score, 100)
+    times.append(time.perf_counter() - started)
+  times.sort()
+  return sum(times) / len(times), times[int(len(times) * 0.95)]
+
+
+def main(frames=600):
+  pygame.init()
+  screen = pygame.display.set_mode(SCREEN_RES)
+  states = record_frames(frames)
+  for label, drawer in [("full redraw", FullRedraw(screen)), ("dirty rects", Renderer(screen))]:
+    mean, p95 = measure(drawer, states)
+    print(f"{label:<12} mean {mean * 1000:6.3f} ms  p95 {p95 * 1000:6.3f} ms  ({1 / mean:,.0f} fps)")
+
+
+if __name__ == '__main__':
+  main(*[int(arg) for arg in sys.argv[1:]])
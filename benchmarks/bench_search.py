@@ -0,0 +1,96 @@
+"""Placement enumeration and AutoPlayer speed
+
+  python benchmarks/bench_search.py [games] [max_pieces]
+
+Plays seeded games with the greedy and beam players, checks every placed
+board against the rows predicted by the search and the incremental Zobrist
+hash against a full rehash, that players sharing a transposition table play
+the same as with their own one, and reports placements/sec, pieces/sec, memo
+hit ratio and transposition table counters.
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from board import Board
+from engine import Game
+from search import AutoPlayer, PlacementSearch, TranspositionTable
+
+
+def check(games=3, max_pieces=200):
+  """Rows after Game.place equal the rows predicted by the placement, incremental hash equals a rehash"""
+  player = AutoPlayer(lookahead=False)
+  for seed in range(games):
+    game = Game(seed=seed)
+    for _ in range(max_pieces):
+      if game.over:
+        break
+      placement = player.choose(game)
+      if placement is None:
+        break
+      game.place(placement.rotation, placement.x, placement.y)
+      field = game.field
+      assert tuple(field.rows) == placement.rows, f"seed {seed}: board differs from the search"
+      assert field.hash == Board.from_rows(field.width, field.height, field.rows).hash, f"seed {seed}: stale hash"
+
+
+def poses(player, games, max_pieces):
+  """(rotation, x, y) of every piece the player placed in seeded games"""
+  result = []
+  for seed in range(games):
+    game = Game(seed=seed)
+    for _ in range(max_pieces):
+      placement = None if game.over else player.choose(game)
+      if placement is None:
+        break
+      game.place(placement.rotation, placement.x, placement.y)
+      result.append((placement.rotation, placement.x, placement.y))
+  return result
+
+
+def check_shared_table(games=2, max_pieces=100):
+  """Beam players of one table find each other's lookahead values, they must keep playing their own moves"""
+  players = [lambda table: AutoPlayer(lookahead=False, table=table),
+             lambda table: AutoPlayer(beam_width=1, table=table),
+             lambda table: AutoPlayer(beam_width=4, table=table)]
+  expected = [poses(player(TranspositionTable()), games, max_pieces) for player in players]
+  table = TranspositionTable()
+  for _ in range(2):
+    for player, moves in zip(players, expected):
+      assert poses(player(table), games, max_pieces) == moves, "shared table changed the moves"
+
+
+def measure(player, games, max_pieces):
+  pieces, score = 0, 0
+  started = time.perf_counter()
+  for seed in range(games):
+    game = Game(seed=seed)
+    player.play(game, max_pieces)
+    scores = game.scores
+    pieces += scores["pieces"]
+    score += scores["score"]
+  elapsed = time.perf_counter() - started
+  search = player.search
+  hit_ratio = search.hits / max(search.hits + search.misses, 1)
+  return player.placements / elapsed, pieces / elapsed, score / games, hit_ratio, player.table.stats()
+
+
+def main(games=5, max_pieces=500):
+  check()
+  check_shared_table()
+  print("search agrees with the engine, players share a table")
+  for name, player in (
+    ('greedy', AutoPlayer(lookahead=False, search=PlacementSearch())),
+    ('beam', AutoPlayer(beam_width=4, search=PlacementSearch())),
+    ('beam 1MB', AutoPlayer(beam_width=4, search=PlacementSearch(), table=TranspositionTable(1024 * 1024))),
+  ):
+    placements, pieces, score, hit_ratio, table = measure(player, games, max_pieces)
+    print(f"{name:<8} {placements:10,.0f} placements/sec  {pieces:8,.1f} pieces/sec"
+          f"  mean score {score:8.1f}  memo hits {hit_ratio:5.1%}")
+    print(f"{'':<8} table: {table['entries']} entries {table['memory'] / 1024:,.0f} KiB"
+          f"  hits {table['hits']}  misses {table['misses']}  evictions {table['evictions']}")
+
+
+if __name__ == '__main__':
+  main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,103 @@
+"""Load test of server.py over localhost sockets
+
+  python benchmarks/bench_server.py [seconds per level]
+
+For each level, a server process hosts versus games of random bots and this
+process connects spectators spread over them. Every SLOW_EVERY th spectator
+never reads, the server keeps ticking and drops its deltas once the socket
+buffers are full (dropped and resyncs stay 0 until then, a few hundred kB).
+The server reports its CPU time, the games and spectators per core are the
+load divided by the share of a core it used, at the largest level it still
+ticked in real time (sustained >= SUSTAINED).
+"""
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+import server
+
+# (games, spectators)
+LEVELS = [(16, 64), (64, 256), (128, 512), (256, 1024)]
+SLOW_EVERY = 10
+SUSTAINED = 0.98   # ticks done / ticks due
+
+
+def free_port():
+  with socket.socket() as s:
+    s.bind(('localhost', 0))
+    return s.getsockname()[1]
+
+
+async def spectator(port, index, slow, received, stop):
+  try:
+    reader, writer = await server.connect('localhost', port, server.SPECTATE, index)
+  except OSError:
+    return
+  try:
+    if slow:
+      await stop.wait()
+      return
+    while not stop.is_set():
+      data = await reader.read(65536)
+      if not data:
+        break
+      received[0] += len(data)
+  except ConnectionError:
+    pass
+  finally:
+    writer.close()
+
+
+async def level(games, spectators, seconds):
+  port = free_port()
+  process = await asyncio.create_subprocess_exec(
+    sys.executable, 'server.py', '--port', str(port), '--games', str(games), '--versus',
+    '--duration', str(seconds), '--report', stdout=subprocess.PIPE)
+  # wait for the listener
+  for _ in range(100):
+    try:
+      _, writer = await asyncio.open_connection('localhost', port)
+      writer.close()
+      break
+    except OSError:
+      await asyncio.sleep(0.05)
+  received, stop = [0], asyncio.Event()
+  tasks = [
+    asyncio.create_task(spectator(port, i % games, i % SLOW_EVERY == SLOW_EVERY - 1, received, stop))
+    for i in range(spectators)
+  ]
+  output, _ = await process.communicate()
+  stop.set()
+  await asyncio.gather(*tasks)
+  report = json.loads(output)
+  report["received"] = received[0]
+  return report
+
+
+def main(seconds=5.0):
+  print(f"{'games':>6} {'specs':>6} {'sustained':>9} {'cpu':>6} {'frames/s':>9} {'MB/s':>6} {'dropped':>8} {'resyncs':>8}")
+  best = None
+  for games, spectators in LEVELS:
+    report = asyncio.run(level(games, spectators, seconds))
+    cpu = report["cpu seconds"] / report["seconds"]
+    print(f"{games:>6} {report['spectators']:>6} {report['sustained']:>9.3f} {cpu:>6.0%} "
+          f"{report['frames'] / report['seconds']:>9,.0f} {report['bytes'] / report['seconds'] / 2 ** 20:>6.2f} "
+          f"{report['dropped']:>8} {report['resyncs']:>8}")
+    if report["sustained"] >= SUSTAINED:
+      best = (games, report["spectators"], cpu)
+  if best is None:
+    print("no level was sustained in real time")
+    return
+  games, spectators, cpu = best
+  print(f"\nper core, at {games} games: {games / cpu:,.0f} games and {spectators / cpu:,.0f} spectators")
+
+
+if __name__ == '__main__':
+  main(*[float(arg) for arg in sys.argv[1:]])
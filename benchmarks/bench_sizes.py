@@ -0,0 +1,112 @@
+"""Cost per piece, per frame and per snapshot as the field grows
+
+  python benchmarks/bench_sizes.py [pieces]
+
+Fields of 10x20, 40x80 and 100x200, the lower half filled with garbage lines:
+  place:     Game.place() of a random pose at its landing row, lock, line clear and game over check
+  frame:     Renderer.draw() of the falling figure one row further down, under the SDL dummy driver
+  save/load: snapshot.encode() and snapshot.load() of the mapped file
+  replay:    replaying the inputs of the same game up to the same tick instead, for comparison
+Per piece and per frame costs should barely grow with the area, only snapshots copy the whole board.
+"""
+import os
+import sys
+import time
+import random
+import tempfile
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+ROOT = os.path.join(os.path.dirname(__file__), '..')
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+import pygame
+import snapshot
+from engine import Game, BASIC_ACTIONS
+from replay import Recorder
+from renderer import Renderer, Layout
+
+SIZES = [(10, 20), (40, 80), (100, 200)]
+WINDOW = (1920, 1080)
+
+
+def filled_game(width, height, seed=0):
+  game = Game(width, height, seed=seed)
+  game.add_garbage(height // 2, hole=width // 2)
+  return game
+
+
+def random_pose(game, rng):
+  figure = game.figures.current_figure
+  rotation = rng.randrange(len(figure.rotations))
+  pose = figure.rotations[rotation]
+  x = rng.randrange(-pose.left, game.width - pose.right)
+  return rotation, x, game.field.drop_y(pose, x, figure.y)
+
+
+def time_place(width, height, pieces):
+  rng = random.Random(0)
+  game, elapsed = filled_game(width, height), 0.0
+  for _ in range(pieces):
+    if game.over:
+      game = filled_game(width, height, rng.randrange(1000))
+    rotation, x, y = random_pose(game, rng)
+    if game.field.hits(game.figures.current_figure.rotations[rotation], x, y):
+      game = filled_game(width, height, rng.randrange(1000))
+      continue
+    started = time.perf_counter()
+    game.place(rotation, x, y)
+    elapsed += time.perf_counter() - started
+  return elapsed / pieces
+
+
+def time_frames(width, height, frames):
+  layout = Layout(width, height, WINDOW)
+  renderer = Renderer(pygame.display.set_mode(layout.screen_res), layout=layout)
+  game = filled_game(width, height)
+  figure = game.figures.current_figure
+  renderer.draw(game.field, figure, game.figures.next_figure, game.score, 0)
+  started = time.perf_counter()
+  for i in range(frames):
+    figure.y = 1 + i % (height // 2 - 3)
+    renderer.draw(game.field, figure, game.figures.next_figure, game.score, 0)
+  return (time.perf_counter() - started) / frames, layout.tile
+
+
+def time_snapshot(width, height, number=20):
+  """(save, load, replay seconds, bytes) of a game played by a random bot until the field is half full"""
+  rng = random.Random(1)
+  game = Game(width, height, seed=1, falling_speed_initial=500)
+  recorder = Recorder(game)
+  while game.field.count < width * height // 4 and not game.over:
+    recorder.apply(rng.choice(BASIC_ACTIONS))
+    game.step()
+  replay = recorder.finish()
+  path = os.path.join(tempfile.mkdtemp(), 'bench.tts')
+  snapshot.save(game, path)
+  started = time.perf_counter()
+  for _ in range(number):
+    snapshot.encode(game.state())
+  save = (time.perf_counter() - started) / number
+  started = time.perf_counter()
+  for _ in range(number):
+    snapshot.load(path)
+  load = (time.perf_counter() - started) / number
+  started = time.perf_counter()
+  replay.play()
+  return save, load, time.perf_counter() - started, os.path.getsize(path)
+
+
+def main(pieces=2000):
+  pygame.init()
+  print(f"{'field':>8} {'tile':>5} {'place':>10} {'frame':>10} {'save':>9} {'load':>9} {'replay':>9} {'bytes':>8}")
+  for width, height in SIZES:
+    place = time_place(width, height, pieces)
+    frame, tile = time_frames(width, height, 300)
+    save, load, replayed, size = time_snapshot(width, height)
+    print(f"{width:>4}x{height:<3} {tile:>4}px {place * 1e6:>7.1f} us {frame * 1e3:>7.3f} ms "
+          f"{save * 1e3:>6.2f} ms {load * 1e3:>6.2f} ms {replayed * 1e3:>6.1f} ms {size:>8,}")
+
+
+if __name__ == '__main__':
+  main(*[int(arg) for arg in sys.argv[1:]])
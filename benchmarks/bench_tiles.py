@@ -0,0 +1,75 @@
+"""Per-frame cost of drawing a full field of tiles
+
+  python benchmarks/bench_tiles.py [frames]
+
+Every cell of the field is filled, a fifth of them carry an item, colors are
+jittered like Figure's (100 of them, the looks fit in the cache). Runs under the SDL dummy video driver, on the 10x20
+field of the game and on an enlarged 40x80 one with smaller tiles:
+  rects:  pygame.draw.rect per tile with a new Rect each, plus the item icon blit
+  blits:  pre-rendered TileCache surfaces, one Surface.blits call with preallocated rects
+"""
+import os
+import sys
+import time
+import random
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+ROOT = os.path.join(os.path.dirname(__file__), '..')
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+import pygame
+from item import Item, ItemAtlas, ICON_SIZE
+from figure import COLORS
+from renderer import TileCache, SCREEN_RES, TILE
+
+# (width, height, tile pixels)
+FIELDS = [(10, 20, TILE), (40, 80, 12)]
+
+
+def full_field(width, height, seed=0):
+  """{(x, y): (color, item)} of every cell, colors of 100 figures"""
+  rng = random.Random(seed)
+  colors = [
+    tuple(min(max(c + rng.randint(-100, 100), 0), 255) for c in rng.choice(list(COLORS.values())))
+    for _ in range(100)
+  ]
+  return {
+    (x, y): (rng.choice(colors), rng.choice(list(Item)) if rng.random() < 0.2 else None)
+    for y in range(height) for x in range(width)
+  }
+
+
+def draw_rects(surface, cells, tile):
+  atlas = ItemAtlas.get((min(tile - 2, ICON_SIZE[0]), min(tile - 2, ICON_SIZE[1])))
+  for (x, y), (color, item) in cells.items():
+    rect = pygame.Rect(x * tile + 1, y * tile + 1, tile - 2, tile - 2)
+    pygame.draw.rect(surface, color, rect)
+    if item:
+      atlas.draw(item, rect, surface)
+
+
+def main(frames=100):
+  pygame.init()
+  pygame.display.set_mode(SCREEN_RES)
+  for width, height, tile in FIELDS:
+    surface = pygame.Surface((width * tile, height * tile)).convert()
+    cells = full_field(width, height)
+    tiles = TileCache((tile - 2, tile - 2))
+    rects = {(x, y): pygame.Rect(x * tile + 1, y * tile + 1, tile - 2, tile - 2) for x, y in cells}
+
+    def draw_blits():
+      surface.blits([(tiles.get(color, item), rects[position]) for position, (color, item) in cells.items()], doreturn=False)
+
+    draw_blits()  # fill the cache, it is warm after the first frames of a game
+    print(f"{width}x{height} field, {tile} px tiles, {len(cells)} cells, {len(tiles)} cached looks")
+    for label, draw in [("rects", lambda: draw_rects(surface, cells, tile)), ("blits", draw_blits)]:
+      started = time.perf_counter()
+      for _ in range(frames):
+        draw()
+      elapsed = (time.perf_counter() - started) / frames
+      print(f"  {label:<6} {elapsed * 1000:7.3f} ms/frame  ({1 / elapsed:,.0f} fps)")
+
+
+if __name__ == '__main__':
+  main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,333 @@
+"""Benchmark suite with a stored baseline
+
+  python benchmarks/suite.py                      # run and compare with benchmarks/baseline.json
+  python benchmarks/suite.py --save-baseline      # run and store the results as the new baseline
+  python benchmarks/suite.py --only board queue   # names containing any of the words
+  python benchmarks/suite.py --out results.json --threshold 0.25
+
+Every benchmark uses fixed seeds and reports the median time per operation of
+--repeat samples after a warm up run. A sample repeats the benchmark until it
+took at least MIN_SAMPLE seconds, so microsecond operations are not timed alone.
+The medians are compared with the baseline, exits with 1 when one is slower by
+more than the threshold (0.25 = 25 %) plus the spread of both, the interquartile
+range of the samples relative to their median. Slower ones are measured again
+up to CONFIRM times first and fail only if no measurement is within the limit,
+a busy moment of the machine slows down every sample of a run.
+Pygame ones run under the SDL dummy video driver, startup is a fresh
+`python main.py` until its first frame.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from collections import OrderedDict
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+from board import Board
+from engine import W, H
+from figure import Figure, FigureQueue, Direction, FIGURE_SHAPES
+from item import Item
+
+BASELINE = os.path.join(ROOT, 'benchmarks', 'baseline.json')
+THRESHOLD = 0.25
+REPEAT = 11
+MIN_SAMPLE = 0.02  # seconds of one sample, fast benchmarks run several times per sample
+CONFIRM = 2        # measurements again of a benchmark slower than the baseline before it fails
+
+# name -> (function(number) -> elapsed seconds, number of operations per run)
+BENCHMARKS = OrderedDict()
+
+
+def benchmark(name, number):
+  def register(fn):
+    BENCHMARKS[name] = (fn, number)
+    return fn
+  return register
+
+
+def random_board(seed, full_rows, fill=0.6):
+  """Lower half filled at random, full_rows of them complete"""
+  rng = random.Random(seed)
+  board = Board(W, H)
+  rows = rng.sample(range(H // 2, H), full_rows)
+  for y in range(H // 2, H):
+    board.cells[y] = board.cells[y][:]
+    for x in range(W):
+      if y in rows or rng.random() < fill:
+        board.rows[y] |= 1 << x
+        board.cells[y][x] = ((200, 100, 50), rng.choice(list(Item)) if rng.random() < 0.2 else None)
+  board.rehash()
+  return board
+
+
+def near_full_board(seed):
+  """Every row but the top four full, one hole in each, then four complete rows at the bottom"""
+  rng = random.Random(seed)
+  board = Board(W, H)
+  for y in range(4, H):
+    hole = -1 if y >= H - 4 else rng.randrange(W)
+    board.cells[y] = board.cells[y][:]
+    for x in range(W):
+      if x != hole:
+        board.rows[y] |= 1 << x
+        board.cells[y][x] = ((100, 200, 50), None)
+  board.rehash()
+  return board
+
+
+################################### Engine
+
+@benchmark('figure move/rotate', 10000)
+def figure_move_rotate(number):
+  board = random_board(0, 0, fill=0.3)
+  rng = random.Random(0)
+  figures = [Figure(definition, (W // 2, 1), rng=rng) for definition in FIGURE_SHAPES]
+  moves = [rng.choice((-1, 1, 0)) for _ in range(number)]
+  started = time.perf_counter()
+  for i, move in enumerate(moves):
+    figure = figures[i % len(figures)]
+    if move:
+      figure.move(Direction.X, move, board)
+    else:
+      figure.rotate(board)
+  return time.perf_counter() - started
+
+
+def clear_rows(boards):
+  started = time.perf_counter()
+  for board in boards:
+    board.clear_full_rows()
+  return time.perf_counter() - started
+
+
+@benchmark('line clear random', 2000)
+def line_clear_random(number):
+  boards = [random_board(seed % 50, seed % 4).copy() for seed in range(number)]
+  return clear_rows(boards)
+
+
+@benchmark('line clear near full', 2000)
+def line_clear_near_full(number):
+  boards = [near_full_board(seed % 50).copy() for seed in range(number)]
+  return clear_rows(boards)
+
+
+@benchmark('queue add/next', 2000)
+def queue_add_next(number):
+  queue = FigureQueue(0.2, (W // 2, 1), rng=random.Random(0))
+  started = time.perf_counter()
+  for i in range(number):
+    if i % 4 == 0:
+      queue.add(2)
+    queue.next()
+  return time.perf_counter() - started
+
+
+################################### Rendering
+
+_screen = None
+
+
+def screen():
+  global _screen
+  if _screen is None:
+    import pygame
+    from renderer import SCREEN_RES
+    pygame.init()
+    _screen = pygame.display.set_mode(SCREEN_RES)
+  return _screen
+
+
+def frames(number, seed=0):
+  """(board, figure, next figure, score) of consecutive frames of a seeded game"""
+  from engine import Game, BASIC_ACTIONS, FALLING_TRIGGER
+  rng = random.Random(seed)
+  game = Game(falling_speed_initial=FALLING_TRIGGER // 4, seed=seed)
+  result = []
+  for _ in range(number):
+    if game.over:
+      game.reset(seed)
+    game.step(rng.choice(BASIC_ACTIONS))
+    figures = game.figures
+    result.append((game.field.copy(), figures.current_figure, figures.next_figure, game.score))
+  return result
+
+
+@benchmark('draw field full', 100)
+def draw_field_full(number):
+  from renderer import Renderer
+  renderer = Renderer(screen())
+  states = frames(number)
+  started = time.perf_counter()
+  for board, figure, next_figure, score in states:
+    renderer.invalidate()
+    renderer.draw(board, figure, next_figure, score, 0)
+  return time.perf_counter() - started
+
+
+@benchmark('draw field frame', 1000)
+def draw_field_frame(number):
+  from renderer import Renderer
+  renderer = Renderer(screen())
+  states = frames(number)
+  started = time.perf_counter()
+  for board, figure, next_figure, score in states:
+    renderer.draw(board, figure, next_figure, score, 0)
+  return time.perf_counter() - started
+
+
+@benchmark('item image', 50000)
+def item_image(number):
+  screen()
+  items = [random.Random(i).choice(list(Item)) for i in range(number)]
+  started = time.perf_counter()
+  for item in items:
+    item.image()
+  return time.perf_counter() - started
+
+
+################################### Startup
+
+# main.py in a fresh interpreter, exits at the first frame
+STARTUP = """
+import os, sys, runpy
+sys.path.insert(0, os.getcwd())
+import renderer
+draw = renderer.Renderer.draw
+def first_frame(self, *args, **kwargs):
+  draw(self, *args, **kwargs)
+  os._exit(0)
+renderer.Renderer.draw = first_frame
+sys.argv = ['main.py', '--stats', sys.argv[1]]
+runpy.run_path('main.py', run_name='__main__')
+"""
+
+
+@benchmark('startup to first frame', 1)
+def startup(number):
+  with tempfile.TemporaryDirectory() as tmp:
+    stats = os.path.join(tmp, 'stats.db')
+    started = time.perf_counter()
+    for _ in range(number):
+      subprocess.run([sys.executable, '-c', STARTUP, stats], check=True,
+                     stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return time.perf_counter() - started
+
+
+################################### Runner
+
+def sample(fn, number):
+  """Seconds per operation of runs of fn(number) taking at least MIN_SAMPLE together"""
+  elapsed, operations = 0.0, 0
+  while elapsed < MIN_SAMPLE:
+    elapsed += fn(number)
+    operations += number
+  return elapsed / operations
+
+
+def run(names, repeat):
+  results = OrderedDict()
+  for name in names:
+    fn, number = BENCHMARKS[name]
+    fn(number)  # warm up caches, imports and the allocator
+    times = sorted(sample(fn, number) for _ in range(repeat))
+    median = times[len(times) // 2]
+    spread = (times[len(times) * 3 // 4] - times[len(times) // 4]) / median
+    results[name] = {"seconds": median, "min": times[0], "spread": spread, "number": number, "repeat": repeat}
+    print(f"{name:<24} {format_time(median):>10}/op  (min {format_time(times[0])}, spread {spread:.0%})")
+  return results
+
+
+def format_time(seconds):
+  for unit, scale in (("s", 1), ("ms", 1e-3), ("us", 1e-6)):
+    if seconds >= scale:
+      return f"{seconds / scale:.2f} {unit}"
+  return f"{seconds / 1e-9:.0f} ns"
+
+
+def slower(result, baseline, threshold):
+  """(ratio of the medians, allowed ratio), a noisy machine widens the allowed slowdown"""
+  allowed = 1 + threshold + result["spread"] + baseline.get("spread", 0)
+  return result["seconds"] / baseline["seconds"], allowed
+
+
+def confirm(results, baseline, threshold, repeat):
+  """Measure benchmarks slower than allowed again, keeps the fastest measurement of each"""
+  for _ in range(CONFIRM):
+    names = []
+    for name, result in results.items():
+      if name in baseline:
+        ratio, allowed = slower(result, baseline[name], threshold)
+        if ratio > allowed:
+          names.append(name)
+    if not names:
+      return
+    print(f"\nmeasuring again: {', '.join(names)}")
+    for name, result in run(names, repeat).items():
+      if result["seconds"] < results[name]["seconds"]:
+        results[name] = result
+
+
+def compare(results, baseline, threshold):
+  """Print the ratio to the baseline, returns the names slower than threshold plus the spreads"""
+  regressions = []
+  print(f"\ncompared with the baseline, threshold +{threshold:.0%} plus the spread of both")
+  for name, result in results.items():
+    if name not in baseline:
+      print(f"{name:<24} (not in the baseline)")
+      continue
+    ratio, allowed = slower(result, baseline[name], threshold)
+    regressed = ratio > allowed
+    if regressed:
+      regressions.append(name)
+    print(f"{name:<24} {ratio:6.2f}x  (allowed {allowed:.2f}x)  {'REGRESSION' if regressed else 'ok'}")
+  return regressions
+
+
+def main():
+  parser = argparse.ArgumentParser(description="Run the benchmark suite and compare with the baseline")
+  parser.add_argument('--only', nargs='+', metavar='WORD', help="run benchmarks whose name contains any word")
+  parser.add_argument('--repeat', type=int, default=REPEAT)
+  parser.add_argument('--out', metavar='PATH', help="save the results as JSON")
+  parser.add_argument('--baseline', metavar='PATH', default=BASELINE)
+  parser.add_argument('--save-baseline', action='store_true', help="store the results as the baseline")
+  parser.add_argument('--threshold', type=float, default=THRESHOLD, help="allowed slowdown, 0.25 = 25 %%")
+  args = parser.parse_args()
+
+  names = [name for name in BENCHMARKS if not args.only or any(word in name for word in args.only)]
+  results = run(names, args.repeat)
+  document = {
+    "python": platform.python_version(),
+    "platform": platform.platform(),
+    "benchmarks": results,
+  }
+  if args.out:
+    with open(args.out, 'w') as f:
+      json.dump(document, f, indent=2)
+  if args.save_baseline:
+    with open(args.baseline, 'w') as f:
+      json.dump(document, f, indent=2)
+    print(f"\nsaved baseline {args.baseline}")
+    return
+  if not os.path.exists(args.baseline):
+    print(f"\nno baseline at {args.baseline}, run with --save-baseline")
+    return
+  with open(args.baseline) as f:
+    baseline = json.load(f)["benchmarks"]
+  confirm(results, baseline, args.threshold, args.repeat)
+  if compare(results, baseline, args.threshold):
+    sys.exit(1)
+
+
+if __name__ == '__main__':
+  main()
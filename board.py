@@ -0,0 +1,342 @@
+from random import Random
+
+ZOBRIST_SEED = 0x7e7215  # fixed, hashes are the same in every process
+CHUNK_BITS = 8           # row_hash() looks up the keys of this many columns at once, tables of 2 ** 8 keys
+WIDE = 16                # boards wider than this use WIDE_CHUNK_BITS
+WIDE_CHUNK_BITS = 4      # tables of 2 ** 4 keys, 3 MB of tables for a filled 100x200 board instead of 27 MB
+_zobrist_keys = {}
+_zobrist_chunks = {}
+
+
+def zobrist_keys(width: int, height: int):
+  """64 bit random key per tile, keys[y][x], shared by boards of the same size"""
+  keys = _zobrist_keys.get((width, height))
+  if keys is None:
+    rng = Random(ZOBRIST_SEED)
+    keys = _zobrist_keys[(width, height)] = [[rng.getrandbits(64) for _ in range(width)] for _ in range(height)]
+  return keys
+
+
+def zobrist_chunks(width: int, height: int):
+  """chunks[y] of the boards of the size, None until a row is hashed, see chunk_tables()"""
+  chunks = _zobrist_chunks.get((width, height))
+  if chunks is None:
+    chunks = _zobrist_chunks[(width, height)] = [None] * height
+  return chunks
+
+
+def chunk_tables(keys, bits):
+  """Tables of a row of keys, tables[c][mask] is the XOR of the keys of the set bits of the mask
+  of columns c * bits onwards
+  """
+  tables = []
+  for start in range(0, len(keys), bits):
+    chunk_keys = keys[start:start + bits]
+    table = [0] * (1 << len(chunk_keys))
+    for mask in range(1, len(table)):
+      low = mask & -mask
+      table[mask] = table[mask ^ low] ^ chunk_keys[low.bit_length() - 1]
+    tables.append(table)
+  return tables
+
+
+class Board:
+  """Board
+  Field of fallen tiles as bitboard.
+  Each row is an integer bit mask (bit x is set when tile (x, y) is filled),
+  colors and items are kept in a parallel list of rows.
+  hash is the Zobrist hash of filled tiles (colors and items are not part of it),
+  heights the column height map (0 for an empty column) and count the number of filled tiles,
+  all three updated incrementally by lock() and clear_full_rows().
+  touched are the rows locked into since the last clear_full_rows(), the only ones that can be
+  full, None when unknown (rows were written directly). Copies share the cell lists of rows
+  and the empty rows of a board share one list, lock() copies a row before writing into it,
+  so a row written directly must be replaced by a copy first (cells[y] = cells[y][:]).
+
+  Args:
+      width, height: count of tiles
+  """
+
+  def __init__(self, width: int, height: int):
+    self.width, self.height = width, height
+    self.full = (1 << width) - 1
+    self.rows = [0] * height
+    self.cells = [[None] * width] * height
+    self.keys = zobrist_keys(width, height)
+    self.chunks = zobrist_chunks(width, height)
+    self.chunk_bits = CHUNK_BITS if width <= WIDE else WIDE_CHUNK_BITS
+    self.hash = 0
+    self.heights = [0] * width
+    self.count = 0
+    self.touched = set()
+
+  def copy(self):
+    """O(height), the cell lists of rows are shared until lock() writes into them"""
+    board = Board.__new__(Board)
+    board.width, board.height, board.full = self.width, self.height, self.full
+    board.keys, board.chunks, board.chunk_bits, board.hash = self.keys, self.chunks, self.chunk_bits, self.hash
+    board.heights, board.count = self.heights[:], self.count
+    board.rows = self.rows[:]
+    board.cells = self.cells[:]
+    board.touched = None if self.touched is None else set(self.touched)
+    return board
+
+  def __eq__(self, other):
+    return isinstance(other, Board) and self.rows == other.rows and self.cells == other.cells
+
+  ######################## query
+
+  def get(self, x, y):
+    """False or (color, item), same as a cell of the list-of-lists field"""
+    if self.rows[y] >> x & 1:
+      return self.cells[y][x]
+    return False
+
+  def filled(self, x, y):
+    return bool(self.rows[y] >> x & 1)
+
+  def filled_tiles(self):
+    """Iterate (x, y, (color, item)) of filled tiles, set bits only, sparse wide rows are cheap"""
+    for y, mask in enumerate(self.rows):
+      if mask:
+        row = self.cells[y]
+        while mask:
+          low = mask & -mask
+          x = low.bit_length() - 1
+          yield x, y, row[x]
+          mask ^= low
+
+  def collides(self, tiles):
+    """True if any tile is outside of the left, right, bottom border or on a filled tile.
+    Tiles above the top border are free.
+    """
+    rows, width, height = self.rows, self.width, self.height
+    for tile in tiles:
+      x, y = tile.x, tile.y
+      if x < 0 or x >= width or y >= height:
+        return True
+      if y >= 0 and rows[y] >> x & 1:
+        return True
+    return False
+
+  def hits(self, rotation, x, y):
+    """Same as collides, with a precomputed figure Rotation (row_masks, left, right) at (x, y)
+    One shift-and-test per row of the figure.
+    """
+    left = x + rotation.left
+    if left < 0 or x + rotation.right >= self.width:
+      return True
+    rows, height = self.rows, self.height
+    for dy, mask in rotation.row_masks:
+      row_y = y + dy
+      if row_y >= height:
+        return True
+      if row_y >= 0 and rows[row_y] & (mask << left):
+        return True
+    return False
+
+  def topped_out(self):
+    return self.rows[0] != 0
+
+  def drop_y(self, rotation, x, y):
+    """y where a figure Rotation at (x, y) lands when dropped straight down
+    O(tiles) from the column heights while the figure is above its columns,
+    row by row when it slid under an overhang.
+    """
+    heights, height = self.heights, self.height
+    landing = height
+    for dx, dy in rotation.bottoms:
+      landing = min(landing, height - heights[x + dx] - 1 - dy)
+    if landing >= y:
+      return landing
+    while not self.hits(rotation, x, y + 1):
+      y += 1
+    return y
+
+  def holes(self):
+    """Empty tiles below the top of their column"""
+    return sum(self.heights) - self.count
+
+  def bumpiness(self):
+    """Sum of height differences of neighbour columns"""
+    heights = self.heights
+    return sum(abs(heights[x] - heights[x + 1]) for x in range(self.width - 1))
+
+  def row_hash(self, y, mask):
+    """Zobrist hash of the filled tiles of mask on row y, one table lookup per chunk_bits columns
+    row_hash(y, a) ^ row_hash(y, b) == row_hash(y, a ^ b)
+    """
+    if not mask:
+      return 0
+    value, bits = 0, self.chunk_bits
+    low_bits = (1 << bits) - 1
+    for table in self.chunks[y] or self.chunk_row(y):
+      if not mask:
+        break
+      value ^= table[mask & low_bits]
+      mask >>= bits
+    return value
+
+  def chunk_row(self, y):
+    """Key tables of row y, built on first use and shared by the boards of the size,
+    rows never filled cost nothing
+    """
+    tables = self.chunks[y] = chunk_tables(self.keys[y], self.chunk_bits)
+    return tables
+
+  ######################## update
+
+  def lock(self, tiles, color, item=None):
+    """Fill tiles with color, the item is put on the first tile
+
+    Returns:
+        False if a tile was above the top border and could not be locked
+    """
+    locked = True
+    touched = set()
+    for idx, tile in enumerate(tiles):
+      x, y = tile.x, tile.y
+      if y < 0:
+        locked = False
+        continue
+      if not self.rows[y] >> x & 1:
+        self.hash ^= self.keys[y][x]
+        self.count += 1
+        if self.height - y > self.heights[x]:
+          self.heights[x] = self.height - y
+      if y not in touched:
+        # copy on write, the list may be shared with copies of the board
+        touched.add(y)
+        self.cells[y] = self.cells[y][:]
+      self.rows[y] |= 1 << x
+      self.cells[y][x] = (color, item if idx == 0 else None)
+    if self.touched is not None:
+      self.touched |= touched
+    return locked
+
+  def clear_full_rows(self):
+    """Remove completed rows and shift the rows above down
+    Only the touched rows are checked, the rows of the stack above the lowest
+    completed one are rehashed, nothing scales with the empty part of the board.
+
+    Returns:
+        list of (y, items) of completed rows, from bottom to top
+    """
+    rows, cells, full = self.rows, self.cells, self.full
+    candidates = range(self.height) if self.touched is None else self.touched
+    self.touched = set()
+    lines = sorted((y for y in candidates if rows[y] == full), reverse=True)
+    if not lines:
+      return []
+    completed = [(y, [item for _, item in cells[y] if item]) for y in lines]
+    cleared = len(completed)
+    # rows above the stack are empty before and after, only [top, lowest] change
+    top, lowest = self.height - max(self.heights), lines[0]
+    before = rows[top:lowest + 1]
+    for y in lines:
+      # bottom first, the indices of the rows above are unchanged
+      del rows[y], cells[y]
+    rows[0:0] = [0] * cleared
+    cells[0:0] = [[None] * self.width] * cleared
+    # Zobrist hashes are XORs of keys, a row is rehashed by the tiles that changed, one lookup per chunk
+    value, chunks, bits = self.hash, self.chunks, self.chunk_bits
+    low_bits = (1 << bits) - 1
+    for y, mask in enumerate(before, top):
+      changed = mask ^ rows[y]
+      if not changed:
+        continue
+      for table in chunks[y] or self.chunk_row(y):
+        if not changed:
+          break
+        value ^= table[changed & low_bits]
+        changed >>= bits
+    self.hash = value
+    self.count -= cleared * self.width
+    # every column reaches the highest completed row, columns above it just shift down,
+    # columns whose top was that row are scanned for their new top, all of them at once per row
+    highest, heights, pending = completed[-1][0], self.heights, 0
+    for x in range(self.width):
+      if self.height - heights[x] < highest:
+        heights[x] -= cleared
+      else:
+        heights[x] = 0
+        pending |= 1 << x
+    for y in range(highest + 1, self.height):
+      if not pending:
+        break
+      found = rows[y] & pending
+      pending ^= found
+      while found:
+        low = found & -found
+        heights[low.bit_length() - 1] = self.height - y
+        found ^= low
+    return completed
+
+  def add_garbage(self, count, hole, color):
+    """Push every row up by count and fill the count bottom rows except the hole column
+
+    Returns:
+        False if filled tiles were pushed above the top border
+    """
+    pushed_out = any(self.rows[:count])
+    garbage = self.full & ~(1 << hole)
+    self.rows = self.rows[count:] + [garbage] * count
+    self.cells = self.cells[count:] + [
+      [None if x == hole else (color, None) for x in range(self.width)] for _ in range(count)
+    ]
+    touched = self.touched
+    # every row moved, no cheaper than from scratch
+    self.rehash()
+    # garbage rows have a hole, the touched ones moved up
+    if touched is not None:
+      self.touched = {y - count for y in touched if y >= count}
+    return not pushed_out
+
+  def rehash(self):
+    """Compute hash, heights and count from scratch, after rows were replaced directly"""
+    self.hash, self.count = 0, 0
+    self.touched = None
+    self.heights = [0] * self.width
+    seen = 0
+    for y, mask in enumerate(self.rows):
+      self.hash ^= self.row_hash(y, mask)
+      self.count += bin(mask).count('1')
+      new = mask & ~seen
+      while new:
+        low = new & -new
+        self.heights[low.bit_length() - 1] = self.height - y
+        new ^= low
+      seen |= mask
+    return self.hash
+
+  ######################## conversion
+
+  @classmethod
+  def from_rows(cls, width, height, rows):
+    """Board of row masks only, cells have no color nor item"""
+    board = cls(width, height)
+    board.rows = list(rows)
+    for y, mask in enumerate(board.rows):
+      if mask:
+        board.cells[y] = [(None, None) if mask >> x & 1 else None for x in range(width)]
+    board.rehash()
+    return board
+
+  @classmethod
+  def from_field(cls, field):
+    """Board from list-of-lists field[x][y] of False or (color, item)"""
+    board = cls(len(field), len(field[0]))
+    board.cells = [[None] * board.width for _ in range(board.height)]
+    for x, column in enumerate(field):
+      for y, tile in enumerate(column):
+        if tile:
+          board.rows[y] |= 1 << x
+          board.cells[y][x] = tile
+    board.rehash()
+    return board
+
+  def to_field(self):
+    field = [[False for _ in range(self.height)] for _ in range(self.width)]
+    for x, y, tile in self.filled_tiles():
+      field[x][y] = tile
+    return field
@@ -0,0 +1,108 @@
+import time
+from collections import deque
+from engine import Action, W
+from profiler import percentile
+
+DAS_TICKS = 10   # held LEFT / RIGHT starts repeating after this many ticks (delayed auto shift)
+ARR_TICKS = 2    # then moves once every this many ticks (auto repeat rate), 0 slides to the wall at once
+LATENCY_WINDOW = 600  # latency samples kept
+
+# pygame key name -> (action on press, action on release)
+KEYMAP = {
+  'left': (Action.LEFT, None),
+  'right': (Action.RIGHT, None),
+  'up': (Action.ROTATE, None),
+  'down': (Action.FAST_ON, Action.FAST_OFF),
+  'space': (Action.HARD_DROP, None),
+}
+SHIFTS = (Action.LEFT, Action.RIGHT)
+
+
+class InputHandler:
+
+  def __init__(self, das=DAS_TICKS, arr=ARR_TICKS, keymap=KEYMAP):
+    """InputHandler
+    Turns key events into actions applied on simulation ticks instead of render frames.
+    Presses are timestamped and queued by handle(), tick() hands them out with the
+    auto repeat of held LEFT / RIGHT, presented() measures input to display latency.
+
+    Args:
+        das, arr: delayed auto shift and auto repeat rate in ticks
+        keymap: pygame key name -> (action on press, action on release)
+    """
+    import pygame
+    self.das, self.arr = das, arr
+    self.__keys = {pygame.key.key_code(name): actions for name, actions in keymap.items()}
+    self.__queue = deque()     # (action, pressed at) waiting for a tick
+    self.__held = None         # shift action being held, the last pressed one wins
+    self.__held_ticks = 0
+    self.__applied = []        # press times of actions applied since the last presented frame
+    self.latencies = deque(maxlen=LATENCY_WINDOW)   # seconds
+
+  def handle(self, event, now=None):
+    """Queue the action of a pygame key event, other events are ignored
+
+    Returns:
+        True if the event was an input
+    """
+    import pygame
+    if event.type not in (pygame.KEYDOWN, pygame.KEYUP):
+      return False
+    actions = self.__keys.get(event.key)
+    if actions is None:
+      return False
+    now = time.perf_counter() if now is None else now
+    pressed, released = actions
+    if event.type == pygame.KEYDOWN:
+      self.__queue.append((pressed, now))
+      if pressed in SHIFTS:
+        self.__held, self.__held_ticks = pressed, 0
+    else:
+      if released:
+        self.__queue.append((released, now))
+      if pressed == self.__held:
+        self.__held = None
+    return True
+
+  def tick(self, width=W):
+    """Actions to apply before the next simulation step, width is that of the field"""
+    actions = []
+    while self.__queue:
+      action, pressed = self.__queue.popleft()
+      actions.append(action)
+      self.__applied.append(pressed)
+    if self.__held:
+      self.__held_ticks += 1
+      repeat = self.__held_ticks - self.das
+      if repeat >= 0 and (self.arr == 0 or repeat % self.arr == 0):
+        # ARR 0 moves to the wall from anywhere in the field, the game ignores blocked moves
+        actions += [self.__held] * (1 if self.arr else width - 1)
+    return actions
+
+  def release_all(self):
+    """Forget held keys and queued presses, e.g. on restart"""
+    self.__queue.clear()
+    self.__held = None
+
+  def presented(self, now=None):
+    """Call after the frame showing the applied inputs is on the display
+
+    Returns:
+        latencies in seconds of the inputs shown first by this frame
+    """
+    if not self.__applied:
+      return []
+    now = time.perf_counter() if now is None else now
+    samples = [now - pressed for pressed in self.__applied]
+    self.latencies.extend(samples)
+    self.__applied = []
+    return samples
+
+  def latency(self):
+    """{count, p50, p95, p99, max} of input to display latency in milliseconds"""
+    ordered = sorted(self.latencies)
+    stats = {"count": len(ordered)}
+    for p in (50, 95, 99):
+      stats[f"p{p}"] = percentile(ordered, p) * 1000
+    stats["max"] = ordered[-1] * 1000 if ordered else 0.0
+    return stats
@@ -0,0 +1,392 @@
+from random import Random
+from enum import Enum
+from collections import namedtuple
+from figure import FigureQueue, Direction, RANDOMIZERS, MIN_WIDTH
+from shape import Shape, DifficultShape
+from item import Item
+from board import Board
+from profiler import NULL_PROFILER
+
+# Field size
+W, H = 10, 20 # count of tiles
+
+# Game Configs
+TICK_RATE = 60  # simulation steps per sec, independent of the frame rate
+FALLING_SPEED_INITIAL = 10
+FALLING_SPEED_INCREASE = 1
+FALLING_SPEED_ACCELERATED = 500 # when key down
+FALLING_TRIGGER = 1000          # falling_count reaches this, fall one unit
+DEFAULT_ITEM_PRESENCE_RATIO = 0.2               # item presence in every n figures
+LOCK_DELAY = 0        # ticks a landed figure can still move before it locks, 0 locks at once
+LOCK_RESETS = 15      # moves that restart the lock delay, at most, per figure
+GARBAGE_COLOR = (110, 110, 110)  # rows pushed up by an opponent in versus play
+
+# Player inputs, applied before gravity of a step
+Action = Enum('Action', ['NONE', 'LEFT', 'RIGHT', 'ROTATE', 'FAST_ON', 'FAST_OFF', 'HARD_DROP'])
+# inputs of the original controls, random players pick from these so their games stay comparable
+BASIC_ACTIONS = [Action.NONE, Action.LEFT, Action.RIGHT, Action.ROTATE, Action.FAST_ON, Action.FAST_OFF]
+
+# What happened during a step, as (Event, data) tuples
+#   LOCKED:    data is the locked figure
+#   COMPLETED: data is a dict of completed rows and bonuses
+#   ITEM:      data is the triggered item
+#   GAME_OVER: data is the final score
+#   SPAWNED:   data is the new current figure, also emitted by reset()
+#   GARBAGE:   data is a dict of lines and hole column, emitted by add_garbage()
+Event = Enum('Event', ['LOCKED', 'COMPLETED', 'ITEM', 'GAME_OVER', 'SPAWNED', 'GARBAGE'])
+
+# Everything Game.from_state() needs to continue a game mid-play, see Game.state() and snapshot.py
+#   configs of the constructor, then the progress of the game,
+#   rng: state of the game's random.Random, figures: figure.QueueState, field: Board
+GameState = namedtuple('GameState', [
+  'width', 'height', 'item_presence_ratio', 'falling_speed_initial', 'lock_delay', 'randomizer',
+  'seed', 'ticks', 'falling_speed', 'falling_count', 'fast_falling', 'lock_timer', 'lock_resets', 'hard_dropped',
+  'scores', 'over', 'rng', 'figures', 'field'
+])
+
+
+def new_scores():
+  return {
+    "previously_completed_lines": 0,   # storage for remember previous completion
+    "combo": 0,   # continously completed
+    "score": 0,   # total score
+    "total_lines": 0,  # total completed lines
+    "max_combo": 0,   # longest combo of the game
+    "pieces": 0,  # locked figures
+    "items": 0    # triggered items
+  }
+
+
+class Game:
+
+  def __init__(self, width=W, height=H, item_presence_ratio=DEFAULT_ITEM_PRESENCE_RATIO,
+               falling_speed_initial=FALLING_SPEED_INITIAL, seed=None, sink=None, lock_delay=LOCK_DELAY,
+               randomizer='uniform'):
+    """Game
+    Headless tetris simulation, no pygame required.
+    One `step()` is one simulation tick, TICK_RATE ticks make a second of game time.
+
+    Args:
+        width, height: count of tiles of the field
+        item_presence_ratio: probability of a figure carrying an item
+        falling_speed_initial: falling_count added per step
+        seed: seed of the game's random.Random, None picks a new one (see `seed`)
+        sink: receives every event with sink.emit(seed, tick, event, data), see eventlog.py
+        lock_delay: ticks a landed figure waits before it locks, moves and rotations restart it
+        randomizer: sequence of the random figures, a name in figure.RANDOMIZERS
+    """
+    if randomizer not in RANDOMIZERS:
+      raise ValueError(f"unknown randomizer {randomizer!r}, one of {', '.join(RANDOMIZERS)}")
+    if width < MIN_WIDTH:
+      raise ValueError(f"width {width} is narrower than the figures spawn in, at least {MIN_WIDTH}")
+    self.width, self.height = width, height
+    self.sink = sink
+    self.profiler = NULL_PROFILER  # times lock and line clear, see profiler.py
+    self.__item_presence_ratio = item_presence_ratio
+    self.__falling_speed_initial = falling_speed_initial
+    self.__lock_delay = lock_delay
+    self.__randomizer = randomizer
+    self.reset(seed)
+
+  def reset(self, seed=None):
+    # every random choice of a game comes from its own seeded generator
+    self.__seed = seed if seed is not None else Random().randrange(2 ** 32)
+    self.__rng = Random(self.__seed)
+    self.__ticks = 0
+    self.__falling_speed = self.__falling_speed_initial
+    self.__falling_count, self.__fast_falling = 0, False
+    self.__lock_timer, self.__lock_resets, self.__hard_dropped = None, 0, False
+    # Create figure at the position of (center x, 2nd line from the top)
+    # pieces have their own generator, looking ahead does not change the rest of the game
+    self.__figures = FigureQueue(self.__item_presence_ratio, initial_pos=(self.width // 2, 1),
+                                 rng=Random(self.__rng.getrandbits(64)), randomizer=self.__randomizer)
+    self.__field = Board(self.width, self.height)
+    self.__scores = new_scores()
+    self.__over = False
+    self.__events = []
+    self.__emit(Event.SPAWNED, self.__figures.current_figure)
+
+  @classmethod
+  def from_state(cls, state: GameState, sink=None):
+    """Game continuing from a state(), it plays on the same as the game the state was taken of"""
+    game = cls(state.width, state.height, state.item_presence_ratio, state.falling_speed_initial, seed=state.seed,
+               lock_delay=state.lock_delay, randomizer=state.randomizer)
+    game.__restore(state)
+    game.sink = sink
+    return game
+
+  def state(self):
+    """GameState of the game between two steps, O(height) for the copy of the field"""
+    return GameState(
+      self.width, self.height, self.__item_presence_ratio, self.__falling_speed_initial, self.__lock_delay,
+      self.__randomizer, self.__seed, self.__ticks, self.__falling_speed, self.__falling_count, self.__fast_falling,
+      self.__lock_timer, self.__lock_resets, self.__hard_dropped, dict(self.__scores), self.__over,
+      self.__rng.getstate(), self.__figures.state(), self.__field.copy())
+
+  def __restore(self, state: GameState):
+    self.__seed, self.__ticks = state.seed, state.ticks
+    self.__falling_speed, self.__falling_count, self.__fast_falling = state.falling_speed, state.falling_count, state.fast_falling
+    self.__lock_timer, self.__lock_resets, self.__hard_dropped = state.lock_timer, state.lock_resets, state.hard_dropped
+    self.__scores = dict(state.scores)
+    self.__over = state.over
+    self.__rng.setstate(state.rng)
+    self.__figures.restore(state.figures)
+    self.__field = state.field.copy()
+    self.__events = []
+
+  ######################## read-only state
+
+  @property
+  def seed(self):
+    """seed of the current game, reset(seed) replays it"""
+    return self.__seed
+
+  @property
+  def ticks(self):
+    """count of steps since reset"""
+    return self.__ticks
+
+  @property
+  def item_presence_ratio(self):
+    return self.__item_presence_ratio
+
+  @property
+  def falling_speed_initial(self):
+    return self.__falling_speed_initial
+
+  @property
+  def lock_delay(self):
+    return self.__lock_delay
+
+  @property
+  def randomizer(self):
+    return self.__randomizer
+
+  @property
+  def field(self):
+    """Board of fallen tiles, do not modify"""
+    return self.__field
+
+  @property
+  def figures(self):
+    return self.__figures
+
+  @property
+  def scores(self):
+    return dict(self.__scores)
+
+  @property
+  def score(self):
+    return self.__scores["score"]
+
+  @property
+  def falling_speed(self):
+    return self.__falling_speed
+
+  @property
+  def over(self):
+    return self.__over
+
+  @property
+  def events(self):
+    """events of the last step"""
+    return self.__events
+
+  ######################## control
+
+  def apply(self, action: Action):
+    """Apply a player input to the current figure immediately"""
+    if self.__over:
+      return
+    figure = self.__figures.current_figure
+    pose = figure.rotation, figure.x
+    if action == Action.LEFT:
+      figure.move(Direction.X, -1, self.__field)
+    elif action == Action.RIGHT:
+      figure.move(Direction.X, 1, self.__field)
+    elif action == Action.ROTATE:
+      # rotate 90 degrees (clock wise)
+      figure.rotate(self.__field)
+    elif action == Action.FAST_ON:
+      self.__fast_falling = True
+    elif action == Action.FAST_OFF:
+      self.__fast_falling = False
+    elif action == Action.HARD_DROP:
+      # all the way down, locks on the next step without delay
+      figure.y = figure.landing_y(self.__field)
+      figure.fallen = True
+      self.__hard_dropped = True
+    # moving a landed figure restarts its lock delay, a limited number of times
+    if self.__lock_timer is not None and pose != (figure.rotation, figure.x) and self.__lock_resets < LOCK_RESETS:
+      self.__lock_resets += 1
+      self.__lock_timer = self.__lock_delay
+
+  def step(self, action: Action = Action.NONE):
+    """Advance one tick: apply action, gravity, lock, line completion and game over
+
+    Returns:
+        list of (Event, data) happened in this step
+    """
+    self.__events = []
+    if self.__over:
+      return self.__events
+    self.__ticks += 1
+    self.apply(action)
+
+    # move y
+    self.__falling_count += FALLING_SPEED_ACCELERATED if self.__fast_falling else self.__falling_speed
+    if self.__falling_count > FALLING_TRIGGER:
+      self.__falling_count = 0
+      self.__figures.current_figure.move(Direction.Y, 1, self.__field)
+
+    # hit the ground
+    if self.__figures.current_figure.fallen and self.__lock_delayed():
+      return self.__events
+    if self.__figures.current_figure.fallen:
+      with self.profiler.section('lock'):
+        self.__lock()
+      with self.profiler.section('line clear'):
+        self.__complete_lines()
+      self.__check_game_over()
+
+    return self.__events
+
+  def place(self, rotation: int, x: int, y: int):
+    """Put the current figure at (rotation, x, y) and lock it there, one tick for the whole move.
+    For search based players, the pose is not checked to be reachable.
+
+    Returns:
+        list of (Event, data) happened in this step
+    """
+    self.__events = []
+    if self.__over:
+      return self.__events
+    figure = self.__figures.current_figure
+    if self.__field.hits(figure.rotations[rotation], x, y):
+      raise ValueError(f"figure does not fit at rotation {rotation} ({x}, {y})")
+    self.__ticks += 1
+    figure.rotation, figure.x, figure.y = rotation, x, y
+    figure.fallen = True
+    self.__falling_count = 0
+    self.__lock()
+    self.__complete_lines()
+    self.__check_game_over()
+    return self.__events
+
+  def add_garbage(self, lines: int, hole: int = None):
+    """Push lines of garbage up from the bottom, sent by an opponent in versus play.
+    The hole column is drawn from the game's generator by default.
+    The events are added to those of the last step.
+    """
+    if self.__over or lines <= 0:
+      return
+    if hole is None:
+      hole = self.__rng.randrange(self.width)
+    if not self.__field.add_garbage(lines, hole, GARBAGE_COLOR):
+      self.__over = True
+    # the falling figure is pushed up with the rows it would overlap
+    figure = self.__figures.current_figure
+    while self.__field.hits(figure.rotations[figure.rotation], figure.x, figure.y):
+      figure.y -= 1
+    self.__emit(Event.GARBAGE, {"lines": lines, "hole": hole})
+    self.__check_game_over()
+
+  ######################## rules
+
+  def __lock_delayed(self):
+    """True while a landed figure waits for its lock delay"""
+    if not self.__lock_delay or self.__hard_dropped:
+      return False
+    figure = self.__figures.current_figure
+    if not self.__field.hits(figure.rotations[figure.rotation], figure.x, figure.y + 1):
+      # moved off the edge, falls again
+      figure.fallen = False
+      self.__lock_timer = None
+      return True
+    if self.__lock_timer is None:
+      self.__lock_timer = self.__lock_delay
+    self.__lock_timer -= 1
+    return self.__lock_timer > 0
+
+  def __emit(self, event: Event, data=None):
+    self.__events.append((event, data))
+    if self.sink is not None:
+      self.sink.emit(self.__seed, self.__ticks, event, data)
+
+  def __lock(self):
+    figure = self.__figures.current_figure
+    self.__scores["score"] += 1
+    self.__scores["pieces"] += 1
+    # update field
+    if not self.__field.lock(figure.tiles, figure.color, figure.item):
+      # locked above the top border
+      self.__over = True
+    # create new figure and reset
+    self.__figures.next()
+    self.__lock_timer, self.__lock_resets, self.__hard_dropped = None, 0, False
+    if not self.__scores["previously_completed_lines"]:
+      self.__scores["combo"] = 0
+    self.__scores["previously_completed_lines"] = 0
+    self.__emit(Event.LOCKED, figure)
+    self.__emit(Event.SPAWNED, self.__figures.current_figure)
+
+  def __complete_lines(self):
+    # check completed lines, rows above are shifted down
+    completed_lines = []
+    for source_y, items in self.__field.clear_full_rows():
+      completed_lines.append(source_y)
+      self.__falling_speed = min(self.__falling_speed + FALLING_SPEED_INCREASE, FALLING_SPEED_ACCELERATED)
+      self.__deal_with_items(items)
+
+    completed = len(completed_lines)
+    if completed == 0:
+      return
+
+    combo_bonus, completed_bonus, multi_bonus = 0, 0, 0
+
+    # combo bonus
+    combo = self.__scores["combo"] + 1
+    if combo > 1:
+      combo_bonus = combo * 10
+
+    # complete bonus
+    completed_bonus = completed * 2
+
+    # multiple complete bonus
+    if completed > 1:
+      multi_bonus = self.__rng.randint(1, completed) * self.__rng.randint(completed, 5) * completed
+
+    score = self.__scores["score"] + completed_bonus + multi_bonus + combo_bonus
+
+    # update
+    self.__scores["combo"] = combo
+    self.__scores["max_combo"] = max(self.__scores["max_combo"], combo)
+    self.__scores["previously_completed_lines"] = completed
+    self.__scores["score"] = score
+    self.__scores["total_lines"] += completed
+
+    self.__emit(Event.COMPLETED, {
+      "lines": completed_lines,
+      "completed": completed,
+      "combo": combo,
+      "completed_bonus": completed_bonus,
+      "multi_bonus": multi_bonus,
+      "combo_bonus": combo_bonus,
+      "score": score
+    })
+
+  def __deal_with_items(self, items: list[Item]):
+    for item in items:
+      if item == Item.DOLLAR:
+        self.__scores["score"] += 100
+      elif item == Item.BOLT:
+        self.__figures.add(1, DifficultShape.random(self.__rng))
+      elif item == Item.STAR:
+        self.__figures.add(3, Shape.BAR)
+      self.__scores["items"] += 1
+      self.__emit(Event.ITEM, item)
+
+  def __check_game_over(self):
+    if self.__over or self.__field.topped_out():
+      self.__over = True
+      self.__emit(Event.GAME_OVER, self.__scores["score"])
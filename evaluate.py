@@ -0,0 +1,137 @@
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from random import Random
+import numpy as np
+from engine import Game, W, H, FALLING_SPEED_INITIAL, BASIC_ACTIONS
+from figure import RANDOMIZERS
+from search import AutoPlayer
+from stats import StatsStore
+from util import parse_count
+
+# One row per game in the shared memory buffer
+RESULT_DTYPE = np.dtype([
+  ('seed', np.int64),
+  ('score', np.int64),
+  ('total_lines', np.int64),
+  ('max_combo', np.int32),
+  ('pieces', np.int32),
+  ('items', np.int32),
+  ('ticks', np.int64),
+])
+
+CHUNKS_PER_WORKER = 4  # smaller chunks balance long and short games across workers
+
+
+################################### Policies, (game, rng) -> Action, or a factory of an AutoPlayer
+
+ACTIONS = BASIC_ACTIONS
+
+def random_policy(game: Game, rng: Random):
+  return rng.choice(ACTIONS)
+
+POLICIES = {
+  'random': random_policy,
+  'greedy': lambda: AutoPlayer(lookahead=False),
+  'beam': lambda: AutoPlayer(beam_width=4),
+}
+
+
+################################### Workers
+
+def play(game: Game, seed: int, policy, max_ticks: int):
+  game.reset(seed)
+  if isinstance(policy, AutoPlayer):
+    # one tick per piece, the player places it directly
+    while not game.over and game.ticks < max_ticks:
+      policy.step(game)
+    return game
+  rng = Random(seed)
+  while not game.over and game.ticks < max_ticks:
+    game.step(policy(game, rng))
+  return game
+
+
+def play_chunk(shm_name: str, games: int, start: int, stop: int, base_seed: int, policy_name: str,
+               falling_speed: int, max_ticks: int, stats_path: str = None, randomizer: str = 'uniform'):
+  """Play games [start, stop) and write their stats into the shared buffer, nothing is pickled back
+  With stats_path, every game is also stored there, each worker writes the file on its own.
+  """
+  shm = shared_memory.SharedMemory(name=shm_name)
+  stats = StatsStore(stats_path) if stats_path else None
+  try:
+    results = np.ndarray((games,), dtype=RESULT_DTYPE, buffer=shm.buf)
+    policy = POLICIES[policy_name]
+    if policy_name != 'random':
+      policy = policy()
+    game = Game(W, H, falling_speed_initial=falling_speed, randomizer=randomizer)
+    for i in range(start, stop):
+      play(game, base_seed + i, policy, max_ticks)
+      scores = game.scores
+      results[i] = (game.seed, scores["score"], scores["total_lines"], scores["max_combo"],
+                    scores["pieces"], scores["items"], game.ticks)
+      if stats:
+        stats.add(game, mode=policy_name)
+    del results
+  finally:
+    if stats:
+      stats.close()
+    shm.close()
+  return stop - start
+
+
+def evaluate(games, workers=None, seed=0, policy='random', falling_speed=FALLING_SPEED_INITIAL, max_ticks=10 ** 7,
+             stats_path=None, randomizer='uniform'):
+  """Play seeded games across a process pool
+
+  Returns:
+      numpy structured array of RESULT_DTYPE, one row per game, seed order
+  """
+  workers = workers or os.cpu_count()
+  shm = shared_memory.SharedMemory(create=True, size=max(games, 1) * RESULT_DTYPE.itemsize)
+  try:
+    chunk = max(1, -(-games // (workers * CHUNKS_PER_WORKER)))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+      futures = [
+        pool.submit(play_chunk, shm.name, games, start, min(start + chunk, games), seed, policy, falling_speed, max_ticks,
+                    stats_path, randomizer)
+        for start in range(0, games, chunk)
+      ]
+      for future in futures:
+        future.result()
+    return np.ndarray((games,), dtype=RESULT_DTYPE, buffer=shm.buf).copy()
+  finally:
+    shm.close()
+    shm.unlink()
+
+
+def main():
+  parser = argparse.ArgumentParser(description="Evaluate a policy over many seeded headless games")
+  parser.add_argument('--games', type=parse_count, default=1000)
+  parser.add_argument('--workers', type=parse_count, default=None, help="processes, cpu count by default")
+  parser.add_argument('--seed', type=int, default=0, help="game i is played with seed + i")
+  parser.add_argument('--policy', choices=list(POLICIES), default='random')
+  parser.add_argument('--falling-speed', type=int, default=FALLING_SPEED_INITIAL, help="initial falling speed")
+  parser.add_argument('--randomizer', choices=list(RANDOMIZERS), default='uniform', help="sequence of the random figures")
+  parser.add_argument('--max-ticks', type=int, default=10 ** 7, help="stop a game after this many ticks")
+  parser.add_argument('--out', metavar='PATH', help="save the results as .npy")
+  parser.add_argument('--stats', metavar='PATH', help="also store every game in this SQLite stats file")
+  args = parser.parse_args()
+
+  started = time.perf_counter()
+  results = evaluate(args.games, args.workers, args.seed, args.policy, args.falling_speed, args.max_ticks, args.stats,
+                     args.randomizer)
+  elapsed = time.perf_counter() - started
+
+  print(f"games: {args.games}  workers: {args.workers or os.cpu_count()}  policy: {args.policy}  {args.games / elapsed:,.1f} games/sec")
+  for name in RESULT_DTYPE.names[1:]:
+    column = results[name]
+    print(f"  {name:<12} mean {column.mean():10.2f}  std {column.std():10.2f}  max {column.max():8d}")
+  if args.out:
+    np.save(args.out, results)
+
+
+if __name__ == '__main__':
+  main()
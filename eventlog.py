@@ -0,0 +1,78 @@
+import json
+from collections import deque
+
+# Sinks of the game event stream, set with Game(sink=...) or game.sink = ...
+# Game calls sink.emit(seed, tick, event, data) for every event, nothing at all when the sink is None.
+#   RingSink:  last events in memory as dicts
+#   JsonlSink: one JSON object per line, written in batches
+JSONL_BUFFER = 1024  # lines kept before writing to the file
+
+
+def to_record(seed, tick, event, data):
+  """JSON friendly dict of an event"""
+  record = {"game": seed, "tick": tick, "event": event.name.lower()}
+  if isinstance(data, dict):
+    record.update(data)
+  elif hasattr(data, "shape"):
+    # figure of SPAWNED and LOCKED
+    record.update(shape=data.shape, rotation=data.rotation, x=data.x, y=data.y, item=data.item)
+  elif event.name == "ITEM":
+    record["item"] = data
+  elif data is not None:
+    record["score"] = data
+  return record
+
+
+class RingSink:
+
+  def __init__(self, capacity: int = 10000):
+    """RingSink
+    Keeps the last capacity events, older ones are dropped.
+    """
+    self.events = deque(maxlen=capacity)
+
+  def emit(self, seed, tick, event, data):
+    # converted now, figures keep moving after the event
+    self.events.append(to_record(seed, tick, event, data))
+
+  def records(self):
+    return list(self.events)
+
+  def clear(self):
+    self.events.clear()
+
+  def close(self):
+    pass
+
+
+class JsonlSink:
+
+  def __init__(self, path, buffer_size: int = JSONL_BUFFER):
+    """JsonlSink
+    Appends events as JSON lines to path, buffer_size lines per write.
+    """
+    self.file = open(path, "a", encoding="utf-8")
+    self.buffer_size = buffer_size
+    self.buffer = []
+
+  def emit(self, seed, tick, event, data):
+    self.buffer.append(json.dumps(to_record(seed, tick, event, data)))
+    if len(self.buffer) >= self.buffer_size:
+      self.flush()
+
+  def flush(self):
+    if self.buffer:
+      self.file.write("\n".join(self.buffer) + "\n")
+      self.buffer.clear()
+    self.file.flush()
+
+  def close(self):
+    if not self.file.closed:
+      self.flush()
+      self.file.close()
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *exc):
+    self.close()
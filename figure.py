@@ -1,11 +1,10 @@
-import pygame
-from random import choice, randint, random
-from copy import deepcopy
-import math
-import numpy as np
+import random
+from collections import namedtuple, deque
+from itertools import islice
 from item import Item
 from enum import Enum
 from shape import *
+from board import Board
 
 Direction = Enum('Direction', ['X', 'Y'])
 
@@ -25,180 +24,339 @@ DIFFICULT_FIGURE_SHAPES = [
   (DifficultShape.U, 'white', [(0, 0), (0, 1), (2, 1), (2, 0), (2, -1), (1, -1), (0, -1)], (1, 0))
 ]
 
-CLOCK_WISE_90 = -math.pi / 2.0
+# RGB of base colors, figures jitter around these
+COLORS = {
+  'red': (255, 0, 0),
+  'blue': (0, 0, 255),
+  'green': (0, 255, 0),
+  'yellow': (255, 255, 0),
+  'orange': (255, 165, 0),
+  'magenta': (255, 0, 255),
+  'cyan': (0, 255, 255),
+  'white': (255, 255, 255)
+}
 
-def rotation_matrix(angle=CLOCK_WISE_90):
-  return np.array([
-    [math.cos(angle), -math.sin(angle)],
-    [math.sin(angle), math.cos(angle)]
-  ])
+def rotate_positions(positions, center):
+  """Rotate positions 90 degrees (clock wise on screen) around the center"""
+  center_x, center_y = center
+  # (x, y) @ [[cos, -sin], [sin, cos]] with angle of 90 degrees, rounded to the tile
+  return [
+    (int(round(y - center_y + center_x)), int(round(center_x - x + center_y)))
+    for x, y in positions
+  ]
+
+
+# One rotation state of a shape, precomputed at import
+#   offsets:   (dx, dy) of tiles from the figure position, the first tile carries the item
+#   row_masks: (dy, mask) per row, bit 0 of mask is the column `left`
+#   left, right: min and max of dx, used for wall kick
+#   bottoms:   (dx, dy) of the lowest tile per column, for the landing row from column heights
+Rotation = namedtuple('Rotation', ['offsets', 'row_masks', 'left', 'right', 'bottoms'])
+
+
+def rotation_table(positions, center):
+  rotations = []
+  for _ in range(4):
+    left = min(x for x, _ in positions)
+    right = max(x for x, _ in positions)
+    masks, bottoms = {}, {}
+    for x, y in positions:
+      masks[y] = masks.get(y, 0) | 1 << (x - left)
+      bottoms[x] = max(bottoms.get(x, y), y)
+    rotations.append(Rotation(tuple(positions), tuple(sorted(masks.items())), left, right, tuple(sorted(bottoms.items()))))
+    positions = rotate_positions(positions, center)
+  return tuple(rotations)
+
+
+# shape -> (definition, four rotations)
+SHAPE_TABLE = {
+  definition[0]: (definition, rotation_table(definition[2], definition[3]))
+  for definition in FIGURE_SHAPES + DIFFICULT_FIGURE_SHAPES
+}
+
+
+def spawn_fits(width: int):
+  """True if every shape spawned at x = width // 2 in its first rotation is inside a field this wide"""
+  return all(0 <= width // 2 + rotations[0].left and width // 2 + rotations[0].right < width
+             for _, rotations in SHAPE_TABLE.values())
+
+
+# narrowest field every figure spawns inside of, 5 for the 3 wide difficult shapes spawned right of the center
+MIN_WIDTH = next(width for width in range(1, 64) if spawn_fits(width))
+
+
+# Upcoming figure before it is made a Figure, colors and items are drawn when the piece is generated
+Piece = namedtuple('Piece', ['shape', 'color', 'item'])
+
+# Everything FigureQueue.restore() needs to continue a queue, see FigureQueue.state()
+#   rng:     state of the queue's random.Random, at the start of the current bag for BAG_SIZES randomizers
+#   added:   state of the random.Random of the pieces of add(shape)
+#   recent:  shapes dealt last by the randomizer before that, oldest first
+#   since:   pieces generated after that, generated again by restore()
+#   current: Piece of the falling figure, pose its (rotation, x, y, fallen)
+#   next:    Piece of the next figure
+#   queue, lookahead: Pieces of add() and of preview(), in the order they are dealt
+QueueState = namedtuple('QueueState', ['rng', 'added', 'recent', 'since', 'current', 'pose', 'next', 'queue', 'lookahead'])
+
+NORMAL_SHAPES = [definition[0] for definition in FIGURE_SHAPES]
+HISTORY_SIZE = 4    # history randomizer avoids the shapes of the last this many pieces
+HISTORY_TRIES = 4   # rerolls at most this many times, then takes the shape anyway
+RECENT_SIZE = 7     # shapes dealt last, kept by FigureQueue to resume a randomizer
+
+
+def jitter(color_name: str, rng=random):
+  """RGB of a figure, the base color of the name randomized by +-100 per channel"""
+  return tuple(min(max(c + rng.randint(-100, 100), 0), 255) for c in COLORS[color_name])
+
+
+################################### Randomizers, generators of the shapes of random pieces
+# recent are the shapes dealt before, to resume a randomizer with the rng in the same state
+
+def uniform(rng, recent=()):
+  """Every shape with the same probability, independent of the previous ones"""
+  while True:
+    yield rng.choice(NORMAL_SHAPES)
+
+
+def seven_bag(rng, recent=()):
+  """Each shape once in a shuffled bag of seven, then the next bag
+  The shuffled bag is not in recent, it resumes at the start of a bag only (see BAG_SIZES).
+  """
+  while True:
+    bag = NORMAL_SHAPES[:]
+    rng.shuffle(bag)
+    yield from bag
+
+
+def history(rng, recent=(), size=HISTORY_SIZE, tries=HISTORY_TRIES):
+  """Uniform, rerolled while the shape is one of the last size ones"""
+  recent = deque(recent, maxlen=size)
+  while True:
+    for _ in range(tries):
+      shape = rng.choice(NORMAL_SHAPES)
+      if shape not in recent:
+        break
+    recent.append(shape)
+    yield shape
+
+
+RANDOMIZERS = {'uniform': uniform, '7-bag': seven_bag, 'history': history}
+BAG_SIZES = {'7-bag': len(NORMAL_SHAPES)}   # randomizers that resume after a multiple of this many shapes only,
+                                            # FigureQueue keeps the state at the start of the bag
+
+
+class Tile:
+  """Position of a tile in field coordinates (pygame free replacement of Rect)"""
+  __slots__ = ('x', 'y')
+
+  def __init__(self, x, y):
+    self.x = int(x)
+    self.y = int(y)
+
+  def __repr__(self):
+    return f"Tile({self.x}, {self.y})"
 
 
 class Figure:
   
-  def __init__(self, definition: tuple[Shape or DifficultShape, str, list[tuple[int, int]]], initial_pos=(0, 0), item: Item=None):
+  def __init__(self, definition: tuple[Shape or DifficultShape, str, list[tuple[int, int]]], initial_pos=(0, 0), item: Item=None, rng=random, color=None):
     """Figure
     Generate Normalized Figure with initial position, the center of x and top of y.
+    A figure is (shape, rotation index, x, y), tiles are looked up in SHAPE_TABLE.
 
     Args:
         definition: (shape, color, positions, center)
           positions: (array of positions): upper left postions of tiles, length should be 4
           center: rotational center position
-        field_width_and_height (tuple[int, int]): right edge of border and bottom edge of border (width and height of field)
+        initial_pos (tuple[int, int]): position of the figure in the field
+        rng: random.Random of the game for the color jitter, the random module by default
+        color: RGB drawn beforehand, no jitter is drawn from rng then
     """
-    self.shape, base_color_name, positions, (center_x, center_y) = definition
+    self.shape, base_color_name, _, _ = definition
     self.fallen = False
-    print("shape: ", self.shape)
 
     # Initial Position
     (init_x, init_y) = initial_pos
     if not isinstance(self.shape, Shape):
       init_y += 1
+    self.x, self.y = init_x, init_y
 
-    # tiles
-    w, h = 1, 1
-    self.tiles = [pygame.Rect(init_x + x, init_y + y, w, h) for x, y in positions]
-    
-    # rotation center as numpy array, because pygameRect can only deal with integers
-    self.center = np.array([init_x + center_x, init_y + center_y])
+    # rotation
+    self.rotations = SHAPE_TABLE[self.shape][1]
+    self.rotation = 0
 
     # Color
-    color = pygame.Color(base_color_name)
-    color.r = min(max(color.r + randint(-100, 100), 0), 255)
-    color.g = min(max(color.g + randint(-100, 100), 0), 255)
-    color.b = min(max(color.b + randint(-100, 100), 0), 255)
-    self.color = color
+    self.color = color if color is not None else jitter(base_color_name, rng)
     
     # Item
     self.item = item
-  
-  def move(self, direction: Direction, distance: int, field: list[list[int]]):
-    old_tiles = deepcopy(self.tiles)
-    old_center = deepcopy(self.center)
-    
+
+  @property
+  def offsets(self):
+    return self.rotations[self.rotation].offsets
+
+  @property
+  def tiles(self):
+    """Tiles in field coordinates, for drawing"""
+    return [Tile(self.x + dx, self.y + dy) for dx, dy in self.offsets]
+
+  def landing_y(self, field: Board):
+    """y the figure lands at when dropped from its current pose, for hard drop and the ghost"""
+    return field.drop_y(self.rotations[self.rotation], self.x, self.y)
+
+  def move(self, direction: Direction, distance: int, field: Board):
+    rotation = self.rotations[self.rotation]
+
     # move x
     if direction == Direction.X:
-      for tile in self.tiles:
-        tile.x += distance
-      self.center += [distance, 0]
-      if self.__cannot_move(field):
-        self.tiles = deepcopy(old_tiles)
-        self.center = old_center
+      if not field.hits(rotation, self.x + distance, self.y):
+        self.x += distance
 
     # move y
     elif direction == Direction.Y:
-      for tile in self.tiles:
-        tile.y += distance
-      self.center += [0, distance]
-      if self.__cannot_move(field):
-        if self.__fallen(field):
-          self.fallen = True
-        self.tiles = deepcopy(old_tiles)
-        self.center = old_center
-
-  def rotate(self, field):
-    # prepare np.array vectors for calculation
-    vectors = np.array([[tile.x, tile.y] for tile in self.tiles])
-    
-    # rotate
-    rotated = np.round((vectors - self.center) @ rotation_matrix(-CLOCK_WISE_90) + self.center, decimals=0)
-
-    # 一旦回す
-    old_tiles = deepcopy(self.tiles)
-    self.tiles = [pygame.Rect(x, y, 1, 1) for x, y in list(rotated)]
-
-    # 左にはみ出たら
-    x_coordinates = rotated[:, 0]
-    while x_coordinates[x_coordinates < 0].size > 0:
-      # 内側に移動
-      rotated = rotated + [1, 0]
-      x_coordinates = rotated[:, 0]
-      self.tiles = [pygame.Rect(x, y, 1, 1) for x, y in list(rotated)]
-      # ぶつかったら回転自体をやめる
-      if self.__hit_other_figure(field):
-        self.tiles = old_tiles
-        return
-
-    # 右にはみ出たら
-    border_right = len(field) - 1
-    while x_coordinates[x_coordinates > border_right].size > 0:
-      # 内側に移動
-      rotated = rotated + [-1, 0]
-      x_coordinates = rotated[:, 0]
-      self.tiles = [pygame.Rect(x, y, 1, 1) for x, y in list(rotated)]
-      # 内側に戻して、ぶつかったら回転自体をやめる
-      if self.__hit_other_figure(field):
-        self.tiles = old_tiles
-        return
+      if field.hits(rotation, self.x, self.y + distance):
+        # x did not change, so blocked means landed
+        self.fallen = True
+      else:
+        self.y += distance
+
+  def rotate(self, field: Board):
+    next_rotation = (self.rotation + 1) % len(self.rotations)
+    rotation = self.rotations[next_rotation]
+
+    # 左右にはみ出たら内側に移動 (wall kick)
+    x = self.x
+    if x + rotation.left < 0:
+      x = -rotation.left
+    elif x + rotation.right > field.width - 1:
+      x = field.width - 1 - rotation.right
 
     # 回せない場合はやめる
-    if self.__cannot_move(field):
-      self.tiles = old_tiles
+    if field.hits(rotation, x, self.y):
       return
+    self.rotation, self.x = next_rotation, x
 
-  def __cannot_move(self, field):
-    border_right = len(field) - 1
-    border_bottom = len(field[0]) - 1
-    outside_of_x = any([tile.x < 0 or tile.x > border_right for tile in self.tiles])
-    outside_of_y = any([tile.y > border_bottom for tile in self.tiles])
-    return outside_of_x or outside_of_y or self.__hit_other_figure(field)
 
-  def __hit_other_figure(self, field):
-    border_right = len(field) - 1
-    border_bottom = len(field[0]) - 1
-    return any([field[min(tile.x, border_right)][min(tile.y, border_bottom)] for tile in self.tiles])
-
-  def __fallen(self, field):
-    border_bottom = len(field[0]) - 1
-    outside_of_y = any([tile.y > border_bottom for tile in self.tiles])
-    return outside_of_y or self.__hit_other_figure(field)
+class FigureQueue:
 
+  def __init__(self, default_item_presence_ratio: float, initial_pos=(0, 1), rng=random, randomizer='uniform'):
+    """FigureQueue
+    Current and next figure, then the upcoming pieces.
+    Pieces wait as light Piece tuples in deques, only the next figure is made a Figure.
+    Pieces added by add() come before the generated ones, preview() generates as deep as asked.
 
-class FigureQueue:
-  def __init__(self, default_item_presence_ratio: float, initial_pos=(0, 1)):
+    Args:
+        rng: random.Random of the generated pieces, shapes, colors and items,
+          pieces of add(shape) draw from a generator seeded from it, so preview() depth does not change them
+        randomizer: name in RANDOMIZERS
+    """
     self.__default_item_presence_ratio = default_item_presence_ratio
     self.__initial_pos = initial_pos
-    self.__queue:list[Figure] = []
-    self.add(2)
-    
+    self.__rng = rng
+    self.__added_rng = random.Random(rng.getrandbits(64))
+    self.__randomizer = randomizer
+    self.__shapes = RANDOMIZERS[randomizer](rng)
+    self.__recent = deque(maxlen=RECENT_SIZE)  # shapes dealt last, to resume the randomizer
+    self.__dealt = 0
+    self.__bag = BAG_SIZES.get(randomizer)
+    self.__checkpoint = None    # (rng state, recent) at the start of the current bag
+    self.__since = 0            # pieces generated since the checkpoint
+    self.__queue = deque()      # Pieces of add(), played before the generated ones
+    self.__lookahead = deque()  # generated Pieces, already seen by preview()
+
     # figure
     self.previous_figure = None
-    self.current_figure = self.__queue[0]
-    self.next_figure = self.__queue[1]
+    self.current_figure = self.__figure(self.__pop())
+    self.next_figure = self.__figure(self.__pop())
 
   def next(self, num: int = None):
-    number_of_current_figures = len(self.__queue)
-    self.previous_figure = None if number_of_current_figures == 0 else self.__queue.pop(0)
     if num:
-      self.add( max(2 - number_of_current_figures, num) )
-    elif number_of_current_figures <= 2:
-      self.add( max(2 - number_of_current_figures, 1) )
-    self.current_figure = self.__queue[0]
-    self.next_figure = self.__queue[1]
+      self.add(num)
+    self.previous_figure = self.current_figure
+    self.current_figure = self.next_figure
+    self.next_figure = self.__figure(self.__pop())
 
   def size(self):
-    return len(self.__queue)
+    return 2 + len(self.__queue)
 
-  # create new figure and add to queue
-  def add(self, num: int = 1, shape:Shape or DifficultShape = None):
+  # add pieces to the queue, random ones or of the shape
+  def add(self, num: int = 1, shape: Shape or DifficultShape = None):
     for _ in range(num):
-      # shape
-      definition = None
-      if isinstance(shape, Shape):
-        definition = list(filter(lambda s: s[0] == shape, FIGURE_SHAPES))[0]
-      elif isinstance(shape, DifficultShape):
-        definition = list(filter(lambda s: s[0] == shape, DIFFICULT_FIGURE_SHAPES))[0]
+      if shape is not None:
+        self.__queue.append(self.__piece(shape, self.__added_rng))
       else:
-        definition = choice(FIGURE_SHAPES)
-
-      item = Item.random() if self.__default_item_presence_ratio > random() else None
-      print("self.__default_item_presence_ratio ",  self.__default_item_presence_ratio)
-      print("random() ",  random())
-      print("item, ", item)
-      figure = Figure(definition, self.__initial_pos, item)
-      self.__queue.append(figure)
-    
-    self.__inspect()
+        self.__queue.append(self.__lookahead.popleft() if self.__lookahead else self.__generate())
+
+  def preview(self, depth: int):
+    """Pieces of the next depth figures, starting with the next figure"""
+    if depth <= 0:
+      return []
+    figure = self.next_figure
+    pieces = [Piece(figure.shape, figure.color, figure.item)]
+    pieces += islice(self.__queue, depth - 1)
+    missing = depth - len(pieces)
+    while len(self.__lookahead) < missing:
+      self.__lookahead.append(self.__generate())
+    pieces += islice(self.__lookahead, missing)
+    return pieces
+
+  def state(self):
+    """QueueState to continue this queue with restore(), the same pieces come in the same order
+    Changes nothing, the rest of a bag is only known to its generator, so the state is the one at the
+    start of the bag and restore() generates the pieces since again.
+    """
+    if self.__bag:
+      (rng, recent), since = self.__checkpoint, self.__since
+    else:
+      rng, recent, since = self.__rng.getstate(), tuple(self.__recent), 0
+    figure, next_figure = self.current_figure, self.next_figure
+    return QueueState(
+      rng, self.__added_rng.getstate(), recent, since,
+      Piece(figure.shape, figure.color, figure.item), (figure.rotation, figure.x, figure.y, figure.fallen),
+      Piece(next_figure.shape, next_figure.color, next_figure.item),
+      tuple(self.__queue), tuple(self.__lookahead))
+
+  def restore(self, state: QueueState):
+    """Continue from a state() of a queue of the same randomizer, the previous figure is lost"""
+    self.__rng.setstate(state.rng)
+    self.__added_rng.setstate(state.added)
+    self.__recent = deque(state.recent, maxlen=RECENT_SIZE)
+    self.__dealt = 0
+    self.__shapes = RANDOMIZERS[self.__randomizer](self.__rng, state.recent)
+    for _ in range(state.since):
+      self.__generate()
+    self.__queue = deque(state.queue)
+    self.__lookahead = deque(state.lookahead)
+    self.previous_figure = None
+    self.current_figure = self.__figure(state.current)
+    figure = self.current_figure
+    figure.rotation, figure.x, figure.y, figure.fallen = state.pose
+    self.next_figure = self.__figure(state.next)
+
+  def __deal(self):
+    shape = next(self.__shapes)
+    self.__recent.append(shape)
+    self.__dealt += 1
+    return shape
+
+  def __generate(self):
+    """Next Piece of the randomizer, the only user of the queue's Random"""
+    if self.__bag and self.__dealt % self.__bag == 0:
+      self.__checkpoint, self.__since = (self.__rng.getstate(), tuple(self.__recent)), 0
+    self.__since += 1
+    return self.__piece(self.__deal())
+
+  def __piece(self, shape, rng=None):
+    rng = rng or self.__rng
+    item = Item.random(rng) if self.__default_item_presence_ratio > rng.random() else None
+    return Piece(shape, jitter(SHAPE_TABLE[shape][0][1], rng), item)
+
+  def __pop(self):
+    if self.__queue:
+      return self.__queue.popleft()
+    if self.__lookahead:
+      return self.__lookahead.popleft()
+    return self.__generate()
 
-  def __inspect(self):
-    print("QUEUE: ", ' '.join([fig.shape.ljust(6, ' ') for fig in self.__queue]))
+  def __figure(self, piece: Piece):
+    return Figure(SHAPE_TABLE[piece.shape][0], self.__initial_pos, piece.item, color=piece.color)
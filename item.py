@@ -1,7 +1,10 @@
-from pygame import image, transform
 from strenum import LowercaseStrEnum
 from enum import auto
-from random import choice
+import random
+from collections import OrderedDict
+
+ICON_SIZE = (40, 40)
+ATLAS_CACHE_SIZE = 4  # count of icon sizes kept in memory
 
 # ITEM = Enum('ITEM', ['bolt', 'stop', 'fire', 'bug', 'clock', 'eye', 'dollar', 'star'])
 
@@ -16,12 +19,66 @@ class Item(LowercaseStrEnum):
     return [member.name.lower() for member in cls]
 
   @classmethod
-  def random(cls):
-    random_item_name = choice(Item.all())
+  def random(cls, rng=random):
+    random_item_name = rng.choice(Item.all())
     return Item(random_item_name)
 
-  def image(self, size:tuple[int, int] = (40, 40)):
-    icon_image = image.load(f"assets/icons/{self.name}.png").convert()
+  def load_image(self, size:tuple[int, int] = ICON_SIZE):
+    """Load and scale the icon from disk, use image() in the render loop"""
+    from pygame import image, transform
+    icon_image = image.load(f"assets/icons/{self.value}.png").convert()
     icon_image = icon_image.convert_alpha()
     # return icon_image
-    return transform.smoothscale(icon_image, size)
\ No newline at end of file
+    return transform.smoothscale(icon_image, size)
+
+  def image(self, size:tuple[int, int] = ICON_SIZE):
+    """Cached icon, a subsurface of the sprite sheet of the size"""
+    return ItemAtlas.get(size).image(self)
+
+
+class ItemAtlas:
+  __atlases = OrderedDict()  # size -> ItemAtlas, least recently used first
+
+  def __init__(self, size: tuple[int, int] = ICON_SIZE):
+    """ItemAtlas
+    All item icons of a size packed side by side into a single sprite sheet surface.
+    Requires the display mode to be set, same as Item.load_image.
+
+    Args:
+        size: width and height of an icon
+    """
+    from pygame import Surface, Rect, SRCALPHA
+    width, height = size
+    self.size = size
+    self.surface = Surface((width * len(Item), height), SRCALPHA).convert_alpha()
+    self.areas = {}
+    self.__images = {}
+    for idx, item in enumerate(Item):
+      area = Rect(idx * width, 0, width, height)
+      self.surface.blit(item.load_image(size), area)
+      self.areas[item] = area
+      self.__images[item] = self.surface.subsurface(area)
+
+  @classmethod
+  def get(cls, size: tuple[int, int] = ICON_SIZE):
+    """Atlas of the size, built on first use, at most ATLAS_CACHE_SIZE sizes are kept"""
+    size = tuple(size)
+    atlas = cls.__atlases.get(size)
+    if atlas is None:
+      atlas = cls.__atlases[size] = cls(size)
+      while len(cls.__atlases) > ATLAS_CACHE_SIZE:
+        cls.__atlases.popitem(last=False)
+    else:
+      cls.__atlases.move_to_end(size)
+    return atlas
+
+  @classmethod
+  def clear(cls):
+    cls.__atlases.clear()
+
+  def image(self, item: Item):
+    return self.__images[item]
+
+  def draw(self, item: Item, position, screen):
+    """Blit the icon with a single area blit from the sprite sheet"""
+    return screen.blit(self.surface, position, self.areas[item])
\ No newline at end of file
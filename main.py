@@ -1,334 +1,371 @@
-import pygame
-from figure import FigureQueue, Direction
-from shape import Shape, DifficultShape
-from random import choice, randint
-from copy import deepcopy
-from termcolor import colored
+import argparse
+import os
+import time
+from random import Random
+from engine import Game, Event, W, H, TICK_RATE, BASIC_ACTIONS
+from figure import RANDOMIZERS
 from util import *
-from item import Item
-
-# Screen Configs
-W, H = 10, 20 # count of tiles
-TILE = 45     # pixels for width and height for each tile
-MARGIN = 20
-GAME_W, GAME_H = W * TILE, H * TILE # screen pixel size
-GAME_RES = GAME_W, GAME_H
-BOARD_RES = GAME_W * 3 // 5, GAME_H
-SCREEN_RES = GAME_W + BOARD_RES[0] + MARGIN * 3, GAME_H + MARGIN * 2
-FPS = 60      # frame per sec
-
-# Game Configs
-FALLING_SPEED_INITIAL = 10
-FALLING_SPEED_INCREASE = 1
-FALLING_SPEED_ACCELERATED = 500 # when key down
-FALLING_TRIGGER = 1000          # falling_count reaches this, fall one unit
-DEFAULT_ITEM_PRESENCE_RATIO = 0.2               # item presence in every n figures
+from assets import convert_icons
+from audio import Audio
+from stats import StatsStore, STATS_PATH
+from replay import Replay, Recorder
+from eventlog import JsonlSink
+from profiler import Profiler, NULL_PROFILER
+import snapshot
 
-# Grid borders
-GRID = [
-  pygame.Rect(x * TILE, y * TILE, TILE, TILE)
-  for y in range(H)
-  for x in range(W)
-]
-
-def figure_rect(x = 0, y = 0):
-  return pygame.Rect(x * TILE + 1, y * TILE + 1, TILE - 2, TILE - 2)
+FPS = 60      # frame per sec
+TICK_MS = 1000 / TICK_RATE  # milliseconds of game time per simulation tick
+MAX_TICKS_PER_FRAME = 10    # catch up at most this many ticks per frame, drop the rest
+PROFILE_REFRESH = 30        # frames between updates of the profiler overlay
+WINDOW_LOCK_DELAY = 30      # ticks a landed figure can still slide or rotate when playing by hand
+WINDOW_CHROME = 80          # pixels of the desktop height left to title bar and task bar
+SNAPSHOT_PATH = '.snapshot.tts'  # F5 saves the game in play, F9 restores it
+
+################################### Max speed mode
+
+def run_headless(games, seed=None, sink=None, stats=None, randomizer='uniform', size=(W, H)):
+  """Play games with random inputs without window and sound, as fast as the CPU allows"""
+  if seed is None:
+    seed = Random().randrange(2 ** 31)
+  rng = Random(seed)
+  actions = BASIC_ACTIONS
+  game = Game(*size, randomizer=randomizer)
+  game.sink = sink  # from the first reset(), not the unseeded game of the constructor
+  scores, ticks = [], 0
+  started = time.perf_counter()
+  for i in range(games):
+    game.reset(seed + i)
+    while not game.over:
+      game.step(rng.choice(actions))
+      ticks += 1
+    scores.append(game.score)
+    if stats:
+      stats.add(game, mode='headless')
+  elapsed = time.perf_counter() - started
+  print(f"games: {games}  seed: {seed}  best: {max(scores)}  mean: {sum(scores) / games:.1f}")
+  print(f"{games / elapsed:,.1f} games/sec  {ticks / elapsed:,.0f} ticks/sec ({ticks / elapsed / TICK_RATE:,.0f}x real time)")
+
+def run_replay(path):
+  """Replay a recorded game at full speed without window and sound"""
+  replay = Replay.load(path)
+  started = time.perf_counter()
+  game = replay.play()
+  elapsed = time.perf_counter() - started
+  print(f"replay: {path}  seed: {replay.seed}  ticks: {game.ticks}  inputs: {len(replay.inputs)}  score: {game.score}")
+  print(f"{game.ticks / elapsed:,.0f} ticks/sec ({game.ticks / elapsed / TICK_RATE:,.0f}x real time)")
+  if replay.score is not None and replay.score != game.score:
+    print(f"MISMATCH: recorded score {replay.score}, replayed {game.score}")
+    exit(1)
+
+def numbered(path, number):
+  """replay.ttr, replay-2.ttr, replay-3.ttr ..."""
+  if number == 1:
+    return path
+  root, ext = os.path.splitext(path)
+  return f"{root}-{number}{ext}"
 
 ################################### Game start
 
-pygame.init()
-pygame.display.set_caption("Tetris, YusungKim")
-pygame.display.set_icon(pygame.image.load('assets/images/meteor.png'))
-screen = pygame.display.set_mode(SCREEN_RES)
-game_screen = pygame.Surface(GAME_RES)
-bg_screen = pygame.image.load('assets/images/bg_screen.png').convert()
-bg_game = pygame.image.load('assets/images/bg_game.jpg').convert()
-main_font = pygame.font.Font('assets/font.ttf', 65)
-font = pygame.font.Font('assets/font.ttf', 45)
-text_title = main_font.render('TETRIS', True, pygame.Color('darkorange'))
-text_score = font.render(' Score:', True, pygame.Color('green'))
-text_record = font.render('Record:', True, pygame.Color('purple'))
-sound_completed = pygame.mixer.Sound('assets/sounds/Interference_06_SP.wav')
-sound_falled = pygame.mixer.Sound('assets/sounds/WhipFoley_02_644.wav')
-sound_multiple = pygame.mixer.Sound('assets/sounds/PlasticSheetWhipFoley_02_609.wav')
-sound_combo = pygame.mixer.Sound('assets/sounds/25_MediumSnare_SP_356_99.wav')
-sound_gameover = pygame.mixer.Sound('assets/sounds/HeavyWhooshes_39_342.wav')
-bgms = [pygame.mixer.Sound(filepath) for filepath in filenames('assets/music/*.wav')]
-clock = pygame.time.Clock()
-
-effects = []
-
-scores = {
-  "previously_completed_lines": 0,   # storage for remember previous completion
-  "combo": 0,   # continously completed
-  "score": 0,   # total score
-  "total_lines": 0  # total completed lines
-}
-
-# convert svg to png
-try:
-  svg_icons = [path[:-4] for path in filenames('assets/icons/*.svg')]
-  png_icons = [path[:-4] for path in filenames('assets/icons/*.png')]
-  [svg2png(path) for path in svg_icons if path not in png_icons]
-except:
-  print("Effor: cannot convert svg2png")
-
-def enque_for_drawing_completion_effect(height):
-  global effects
-
-  r = randint(30, 200)
-  for x in range(W):
-    target_tile_rect = GRID[height * W + x]
-    target_tile_rect.x += 1
-    target_tile_rect.y += 1
-    target_tile_rect.size = (target_tile_rect.width - 2, target_tile_rect.height - 2)
-    g = int((H - height) / H * 200)
-    b = int((W - x) / H * 200)
-    effects.append([(r, g, b), target_tile_rect])
-
-def draw_item(item, rect, screen):
-  screen.blit(item.image(), rect)
-
-def draw_field(field):
-  for x, column in enumerate(field):
-    for y, tile in enumerate(column):
-      if tile:
-        rect = figure_rect(x, y)
-        color, item = tile
-        pygame.draw.rect(game_screen, color, rect)
-        if item:
-          draw_item(item, rect, game_screen)
-
-
-def draw_figure(figure):
-  for idx, tile in enumerate(figure.tiles):
-    # rect
-    rect = figure_rect(tile.x, tile.y)
-    pygame.draw.rect(game_screen, figure.color, rect)
-    # # mark center tile
-    # if figure.name != 'Square' and (idx == 0):
-    #   pygame.draw.circle(game_screen, pygame.Color('orange'), rect.center, radius=rect.width // 6)
-    # item
-    if figure.item and (idx == 0):
-      draw_item(figure.item, rect, game_screen)
-
-def deal_with_items(items: list[Item]):
-  global scores
-  for item in items:
-    if item == Item.DOLLAR:
-      scores["score"] += 100
-      print("ITEM: Money")
-    elif item == Item.BOLT:
-      print("ITEM: Thunder bolt, Add Difficult Figure")
-      figures.add(1, DifficultShape.random())
-    elif item == Item.STAR:
-      print("ITEM: star, add three bar figure")
-      figures.add(3, Shape.BAR)
-    elif item == Item.EYE:
-      print("ITEM: eye, show next of next figure")
-    else:
-      print(item)
-  pass
-
-# initialize new game
-falling_speed = FALLING_SPEED_INITIAL
-falling_count, fast_falling = 0, False
-# Create figure at the position of (center x, 2nd line from the top)
-figures = FigureQueue(DEFAULT_ITEM_PRESENCE_RATIO, initial_pos=(W // 2, 1))
-field = [[False for i in range(H)] for j in range(W)]
-previous_field = deepcopy(field)
-record = get_record()
-
-# Background music
-bgm = choice(bgms)
-bgm.set_volume(0.5)
-pygame.mixer.Sound.play(bgm, loops=-1)
-
-while True:
-  dx, dy = 0, 1
-  screen.blit(bg_screen, (0, 0))
-  screen.blit(game_screen, (BOARD_RES[0] + MARGIN * 2, MARGIN))
-  game_screen.blit(bg_game, (0, 0))
-
-  ################ Control
-  for event in pygame.event.get():
-    if event.type == pygame.QUIT:
-      exit()
-    if event.type == pygame.KEYDOWN:
-      if event.key == pygame.K_LEFT:
-        dx = -1
-      elif event.key == pygame.K_RIGHT:
-        dx = 1
-      elif event.key == pygame.K_DOWN:
-        fast_falling = True
-      elif event.key == pygame.K_UP:
-        # rotate 90 degrees (clock wise)
-        figures.current_figure.rotate(field)
-
-    if event.type == pygame.KEYUP:
-      fast_falling = False
-
-    # move x
-    figures.current_figure.move(Direction.X, dx, field)
-
-  # move y
-  falling_count +=  FALLING_SPEED_ACCELERATED if fast_falling else falling_speed
-  if falling_count > FALLING_TRIGGER:
-    falling_count = 0
-    figures.current_figure.move(Direction.Y, dy, field)
-  
-  # hit the ground
-  if figures.current_figure.fallen:
-    previous_field = deepcopy(field)
-    scores["score"] +=1
-    pygame.mixer.Sound.play(sound_falled)
-    # update field
-    for idx, tile in enumerate(figures.current_figure.tiles):
-      field[tile.x][tile.y] = (figures.current_figure.color, figures.current_figure.item if idx == 0 else None)
-    # create new figure and reset
-    figures.next()
-    if not scores["previously_completed_lines"]:
-      scores["combo"] = 0
-    scores["previously_completed_lines"] = 0
-
-  # check completed lines
-  # if completed, rewrite that line with above line
-  completed = 0
-  rewrite_y = H - 1
-  for source_y in range(H - 1, -1, -1):
-    filled_count = 0
-    items = []
-    for x in range(W):
-      tile_filled = field[x][source_y]
-      if tile_filled:
-        filled_count += 1
-        _, item = tile_filled
-        if item:
-          items.append(item)
-      field[x][rewrite_y] = tile_filled
-      
-    if filled_count == W:
-      completed += 1
-      falling_speed = min(falling_speed + FALLING_SPEED_INCREASE, FALLING_SPEED_ACCELERATED)
-      # draw completion effect
-      enque_for_drawing_completion_effect(source_y)
-      deal_with_items(items)
-    else:
-      rewrite_y -= 1
-
-  # score
-  if completed > 0:
-    pygame.mixer.Sound.play(sound_completed)
-
-    combo_msg, completed_msg, multi_msg = '', '', ''
-    combo_bonus, completed_bonus, multi_bonus = 0, 0, 0
-
-    # combo bonus
-    combo = scores["combo"] + 1
-    if combo > 1:
-      pygame.mixer.Sound.play(sound_combo)
-      combo_bonus = combo * 10
-      combo_msg = f" +{combo_bonus} Pts ({combo} Combo!)"
-
-    # complete bonus
-    completed_bonus = completed * 2
-    completed_msg = f" +{completed_bonus} Pts"
-
-    # multiple complete bonus
-    if completed > 1:
-      pygame.mixer.Sound.play(sound_multiple)
-      multi_bonus = randint(1, completed) * randint(completed, 5) * completed
-      multi_msg = f" +{multi_bonus} Pts ({completed} Multi!)"
-      
-    score = scores["score"] + completed_bonus + multi_bonus + combo_bonus
-
-    print(
-      colored(f"SCORE: {str(score).ljust(5, ' ')}", 'red') \
-      + colored(completed_msg, 'yellow') \
-      + colored(multi_msg, 'magenta') \
-      + colored(combo_msg, 'green')
-    )
-
-    # delay for completed lines
-    for i in range(completed):
-      pygame.time.wait(200)
-
-    # update
-    scores["combo"] = combo
-    scores["previously_completed_lines"] = completed
-    scores["score"] = score
-    scores["total_lines"] += completed
-
-    # update title
-    pygame.display.set_caption(f"Tetris, YusungKim   {score} Points")
-
-  ########################################## Draw
-
-  ######################## GAME SCREEN
-  # draw grid
-  [pygame.draw.rect(game_screen, pygame.Color(40, 40, 40), i_rect, 1) for i_rect in GRID]
-
-  # draw field(fallen figures) and figure
-  if len(effects) > 0:
-    draw_field(previous_field)
-    draw_figure(figures.previous_figure)
-
-    # draw effects
-    effect = effects.pop(0)
-    pygame.draw.rect(game_screen, effect[0], effect[1])
-    screen.blit(game_screen, (BOARD_RES[0] + MARGIN * 2, MARGIN))
-    pygame.display.flip()
-    clock.tick(1000)
-
+def desktop_window():
+  """(width, height) pixels a window can take on the desktop, None if unknown.
+  Call after pygame.init() and before the first set_mode()
+  """
+  import pygame
+  info = pygame.display.Info()
+  if info.current_w <= 0 or info.current_h <= 0:
+    return None
+  return info.current_w, info.current_h - WINDOW_CHROME
+
+def open_screen(width, height, window, profiler=NULL_PROFILER, resized=False):
+  """(screen, renderer) of a resizable window for a field of width x height, the tiles fit into window"""
+  import pygame
+  from renderer import Renderer, Layout
+  layout = Layout(width, height, window)
+  size = layout.screen_res
+  if resized:
+    # keep the size the window was dragged to, unless the field does not fit with the smallest tiles
+    size = max(window[0], size[0]), max(window[1], size[1])
+  screen = pygame.display.set_mode(size, pygame.RESIZABLE)
+  return screen, Renderer(screen, profiler, layout=layout)
+
+def run_window(seed=None, record_path=None, sink=None, profile_path=None, stats_path=STATS_PATH, randomizer='uniform',
+               size=(W, H), window=None, snapshot_path=SNAPSHOT_PATH):
+  import pygame
+  from animation import Scheduler, LineClearEffect, GameOverEffect, LINE_CLEAR_MS
+  from controls import InputHandler
+
+  pygame.init()
+  pygame.display.set_caption("Tetris, YusungKim")
+  pygame.display.set_icon(pygame.image.load('assets/images/meteor.png'))
+  window = window or desktop_window()
+  audio = Audio()   # effects are loaded on first play, music is streamed
+  clock = pygame.time.Clock()
+
+  # convert changed svg icons to png
+  try:
+    convert_icons()
+  except Exception:
+    print("Effor: cannot convert svg2png")
+
+  def save_replay():
+    if recorder:
+      recorder.finish().save(numbered(record_path, games))
+      print(f"Saved replay {numbered(record_path, games)}")
+
+  def shutdown():
+    save_replay()
+    stats.close()
+    if sink:
+      sink.close()
+    if profile_path:
+      profiler.export(profile_path)
+      print(f"Saved profile {profile_path}")
+    latency = inputs.latency()
+    if latency["count"]:
+      print(f"input latency: {latency['count']} inputs  p50 {latency['p50']:.1f} ms  p95 {latency['p95']:.1f} ms  "
+            f"p99 {latency['p99']:.1f} ms  max {latency['max']:.1f} ms")
+    report = audio.report()
+    print(f"audio: {report['effects loaded']} effects resident {report['effect bytes'] / 2 ** 20:.1f} MB  "
+          f"played {report['played']}  stolen {report['stolen']}  dropped {report['dropped']}")
+    exit()
+
+  def restore():
+    nonlocal game, controls, recorder, game_over_effect, screen, renderer
+    restored = snapshot.load(snapshot_path, sink)
+    restored.profiler = profiler
+    if recorder:
+      # replays start from the seed, the restored game did not
+      save_replay()
+      recorder = None
+      print("Recording stopped, a restored game cannot be replayed")
+    if (restored.width, restored.height) != (game.width, game.height):
+      screen, renderer = open_screen(restored.width, restored.height, window, profiler)
+    game = controls = restored
+    game_over_effect = None
+    scheduler.clear()
+    inputs.release_all()
+    print(f"Restored snapshot {snapshot_path}, tick {game.ticks} score {game.score}")
+
+  def restart():
+    nonlocal record, game_over_effect, recorder, controls, games
+    # initialize new game
+    game.reset()
+    record = stats.record()
+    game_over_effect = None
+    games += 1
+    if recorder:
+      recorder = controls = Recorder(game)
+    inputs.release_all()
+    audio.stop_effects()
+
+  # instrumentation, F3 toggles the overlay
+  if profile_path is not None:
+    profiler = Profiler(cprofile=profile_path.endswith(('.prof', '.pstats')))
+  else:
+    profiler = NULL_PROFILER
+  show_profile = profile_path is not None
+  profile_lines, frames = None, 0
+
+  # initialize new game
+  scheduler = Scheduler()
+  game = Game(*size, seed=seed, sink=sink, lock_delay=WINDOW_LOCK_DELAY, randomizer=randomizer)
+  game.profiler = profiler
+  # tiles as large as the field allows on the desktop, the window can be resized
+  screen, renderer = open_screen(game.width, game.height, window, profiler)
+  stats = StatsStore(stats_path)   # written by a background thread, the record is read from memory
+  record = stats.record()
+  game_over_effect = None
+  games = 1
+  # inputs go through the recorder when recording
+  recorder = Recorder(game) if record_path else None
+  controls = recorder or game
+  # key events are timestamped and queued, applied on the next simulation tick
+  inputs = InputHandler()
+
+  # Background music
+  audio.play_music()
+
+  accumulator = 0.0   # game time not simulated yet
+  while True:
+    frame_started = time.perf_counter()
+    ################ Control
+    with profiler.section('events'):
+      for event in pygame.event.get():
+        if event.type == pygame.QUIT:
+          shutdown()
+        if inputs.handle(event):
+          continue
+        if event.type == pygame.VIDEORESIZE:
+          window = event.size
+          screen, renderer = open_screen(game.width, game.height, window, profiler, resized=True)
+        elif event.type == pygame.KEYDOWN and event.key == pygame.K_F3 and profile_path is not None:
+          show_profile = not show_profile
+        elif event.type == pygame.KEYDOWN and event.key == pygame.K_F5:
+          snapshot.save(game, snapshot_path)
+          print(f"Saved snapshot {snapshot_path}, tick {game.ticks} score {game.score}")
+        elif event.type == pygame.KEYDOWN and event.key == pygame.K_F9 and os.path.exists(snapshot_path):
+          restore()
+
+    ################ Simulation
+    # fixed timestep, as many ticks as the elapsed time, independent of the frame rate
+    with profiler.section('simulation'):
+      ticks = 0
+      while accumulator >= TICK_MS:
+        if ticks == MAX_TICKS_PER_FRAME:
+          # too far behind (e.g. window dragged), drop the rest instead of spiraling
+          accumulator = 0.0
+          break
+        accumulator -= TICK_MS
+        ticks += 1
+        for action in inputs.tick(game.width):
+          controls.apply(action)
+        for kind, data in game.step():
+          if kind == Event.LOCKED:
+            audio.play('falled')
+          elif kind == Event.COMPLETED:
+            audio.play('completed')
+            if data["combo"] > 1:
+              audio.play('combo')
+            if data["completed"] > 1:
+              audio.play('multiple')
+            # draw completion effect, one line after another
+            for i, height in enumerate(data["lines"]):
+              scheduler.add(LineClearEffect(height, game.width, game.height, delay=i * LINE_CLEAR_MS))
+
+            # update title
+            pygame.display.set_caption(f"Tetris, YusungKim   {data['score']} Points")
+
+    # game over, flash the field and restart when done
+    if game.over and not game_over_effect:
+      audio.play('gameover')
+      audio.crossfade()
+      stats.add(game)
+      save_replay()
+      game_over_effect = scheduler.add(GameOverEffect(game.width, game.height, on_done=restart))
+
+    ########################################## Draw
+    with profiler.section('effects'):
+      scheduler.update(pygame.time.get_ticks())
+      audio.update()
+
+    # overlay text changes every PROFILE_REFRESH frames only, the renderer skips the same list
+    frames += 1
+    if not show_profile:
+      profile_lines = None
+    elif profile_lines is None or frames % PROFILE_REFRESH == 0:
+      profile_lines = profiler.lines()
+
+    # draw field(fallen figures), figure and effects on top
+    with profiler.section('draw'):
+      renderer.draw(game.field, game.figures.current_figure, game.figures.next_figure, game.score, record,
+                    scheduler.overlay(), profile_lines)
+
+    # the dummy and most real drivers present in draw(), inputs applied this frame are now visible
+    presented = time.perf_counter()
+    for latency in inputs.presented(presented):
+      profiler.add('input latency', latency)
+    profiler.add('frame', presented - frame_started)
+    accumulator += clock.tick(FPS)
+
+################################### Remote game
+
+def run_client(address, index=0, play=False):
+  """Window of a game served by server.py, with play the keys control it"""
+  import asyncio
+  asyncio.run(client_loop(address, index, play))
+
+async def client_loop(address, index, play):
+  import asyncio
+  import pygame
+  import server
+  from renderer import SCREEN_RES
+  from controls import InputHandler
+
+  host, _, port = address.rpartition(':')
+  reader, writer = await server.connect(host or 'localhost', int(port or server.PORT),
+                                        server.PLAY if play else server.SPECTATE, index)
+  remote = server.RemoteGame()
+
+  async def receive():
+    try:
+      while True:
+        remote.apply(*await server.read_message(reader))
+    except (asyncio.IncompleteReadError, ConnectionError):
+      pass
+
+  receiving = asyncio.create_task(receive())
+  pygame.init()
+  pygame.display.set_caption(f"Tetris, YusungKim   {'playing' if play else 'watching'} game {index}")
+  window = desktop_window()
+  # the field size comes with the first full frame
+  screen, renderer, resized = pygame.display.set_mode(SCREEN_RES), None, False
+  inputs = InputHandler()
+  try:
+    while not receiving.done():
+      frame_started = time.perf_counter()
+      for event in pygame.event.get():
+        if event.type == pygame.QUIT:
+          return
+        if event.type == pygame.VIDEORESIZE:
+          window, renderer, resized = event.size, None, True
+        inputs.handle(event)
+      # one tick of inputs per frame, the server applies them on its next tick
+      for action in inputs.tick(remote.board.width if remote.board else W):
+        if play:
+          server.send_input(writer, action)
+      if remote.board is not None:
+        board = remote.board
+        if renderer is None or (renderer.layout.width, renderer.layout.height) != (board.width, board.height):
+          screen, renderer = open_screen(board.width, board.height, window, resized=resized)
+        # the falling figure is part of the remote board
+        renderer.draw(board, None, remote.next_figure, remote.score, 0)
+      await asyncio.sleep(max(0.0, 1 / FPS - (time.perf_counter() - frame_started)))
+    print(f"disconnected from {address}")
+  finally:
+    receiving.cancel()
+    writer.close()
+
+
+def main():
+  parser = argparse.ArgumentParser(description="Tetris")
+  parser.add_argument('--headless', action='store_true', help="max speed mode: no window, random inputs, as fast as possible")
+  parser.add_argument('--games', type=parse_count, default=100, help="count of games in max speed mode")
+  parser.add_argument('--seed', type=int, default=None, help="random seed of the (first) game")
+  parser.add_argument('--record', metavar='PATH', help="record games to replay files PATH, PATH-2 ...")
+  parser.add_argument('--replay', metavar='PATH', help="replay a recorded game at full speed, no window")
+  parser.add_argument('--randomizer', choices=list(RANDOMIZERS), default='uniform', help="sequence of the random figures")
+  parser.add_argument('--size', type=parse_size, default=(W, H), metavar='WxH', help=f"field size, {W}x{H} by default")
+  parser.add_argument('--window', type=parse_size, metavar='WxH',
+                      help="pixels the window fits the field into, the desktop by default")
+  parser.add_argument('--snapshot', metavar='PATH', default=SNAPSHOT_PATH,
+                      help=f"file F5 saves the game in play to and F9 restores it from, {SNAPSHOT_PATH} by default")
+  parser.add_argument('--log', metavar='PATH', help="append game events to PATH as JSON lines")
+  parser.add_argument('--stats', metavar='PATH', help=f"SQLite file of game results, {STATS_PATH} by default, "
+                                                      "headless games are only stored when given")
+  parser.add_argument('--connect', metavar='HOST:PORT', help="watch a game of server.py, --play to control it")
+  parser.add_argument('--game', type=int, default=0, help="index of the served game with --connect")
+  parser.add_argument('--play', action='store_true', help="take the seat of the served game instead of its bot")
+  parser.add_argument('--profile', metavar='PATH', nargs='?', const='',
+                      help="time the parts of each frame, F3 toggles the overlay. "
+                           "PATH saves them at exit as .csv, .json or cProfile stats (.prof)")
+  args = parser.parse_args()
+
+  sink = JsonlSink(args.log) if args.log else None
+  if args.connect:
+    run_client(args.connect, args.game, args.play)
+  elif args.replay:
+    run_replay(args.replay)
+  elif args.headless:
+    stats = StatsStore(args.stats) if args.stats else None
+    run_headless(args.games, args.seed, sink, stats, args.randomizer, args.size)
+    if stats:
+      stats.close()
   else:
-    draw_field(field)
-    draw_figure(figures.current_figure)
-  
-  ######################## BOARD SCREEN
-  screen.blit(text_title, (MARGIN + 10, MARGIN + 10))
-  screen.blit(text_record, (MARGIN + 40, BOARD_RES[1] - MARGIN - 270))
-  screen.blit(font.render(str(record).rjust(6, ' '), True, pygame.Color('yellow')), (MARGIN + 40, BOARD_RES[1] - MARGIN - 200))
-  screen.blit(text_score, (MARGIN + 30, BOARD_RES[1] - MARGIN -100))
-  screen.blit(font.render(str(scores["score"]).rjust(6, ' '), True, pygame.Color('white')), (MARGIN + 40, BOARD_RES[1] - MARGIN - 30))
-  
-  # draw next figure
-  next_figure = figures.next_figure
-  for idx, tile in enumerate(next_figure.tiles):
-    # rect
-    rect = figure_rect(tile.x, tile.y)
-    rect.x += BOARD_RES[0] // 2 + MARGIN - W * TILE // 2
-    rect.y += BOARD_RES[1] // 6 + MARGIN
-    pygame.draw.rect(screen, next_figure.color, rect)
-    if next_figure.item and (idx == 0):
-      draw_item(next_figure.item, rect, screen)
-
-  # game over
-  for x in range(W):
-    if field[x][0]:
-      pygame.mixer.Sound.play(sound_gameover)
-      set_record(record, scores["score"])
-      # initialize new game
-      falling_speed = FALLING_SPEED_INITIAL
-      falling_count, fast_falling = 0, False
-      figures = FigureQueue(DEFAULT_ITEM_PRESENCE_RATIO, initial_pos=(W // 2, 1))
-      field = [[False for i in range(H)] for j in range(W)]
-      scores = {
-        "previously_completed_lines": 0,   # storage for remember previous completion
-        "combo": 0,   # continously completed
-        "score": 0,   # total score
-        "total_lines": 0  # total completed lines
-      }
-      record = get_record()
-      for rect in GRID:
-        pygame.draw.rect(game_screen, (randint(30, 255), randint(30, 255), randint(30, 255)), rect)
-        screen.blit(game_screen, (BOARD_RES[0] + MARGIN * 2, MARGIN))
-        pygame.display.flip()
-        clock.tick(100)
-      pygame.mixer.pause()
-      bgm = choice(bgms)
-      bgm.set_volume(0.5)
-      pygame.mixer.Sound.play(bgm, loops=-1)
-      break
-
-  pygame.display.update() # display Surface全体を更新して画面に描写します
-  clock.tick(FPS)
\ No newline at end of file
+    run_window(args.seed, args.record, sink, args.profile, args.stats or STATS_PATH, args.randomizer, args.size,
+               args.window, args.snapshot)
+  if sink:
+    sink.close()
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,135 @@
+import csv
+import json
+import time
+from collections import OrderedDict, deque
+
+PROFILE_WINDOW = 600  # samples kept per section, 10 sec at 60 fps
+PERCENTILES = (50, 95, 99)
+
+
+class Section:
+  """Times the block of a with statement into the profiler, one per section name"""
+  __slots__ = ('samples', 'started')
+
+  def __init__(self, samples: deque):
+    self.samples = samples
+    self.started = 0.0
+
+  def __enter__(self):
+    self.started = time.perf_counter()
+    return self
+
+  def __exit__(self, *exc):
+    self.samples.append(time.perf_counter() - self.started)
+
+
+class NullSection:
+  __slots__ = ()
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *exc):
+    pass
+
+
+NULL_SECTION = NullSection()
+
+
+def percentile(ordered, p):
+  """p th percentile of sorted samples, nearest rank"""
+  if not ordered:
+    return 0.0
+  return ordered[min(len(ordered) - 1, len(ordered) * p // 100)]
+
+
+class Profiler:
+
+  def __init__(self, window: int = PROFILE_WINDOW, cprofile: bool = False):
+    """Profiler
+    Named timing sections with the last `window` samples each, for rolling percentiles.
+
+        with profiler.section('draw'):
+          ...
+
+    Args:
+        cprofile: also run cProfile for the whole session, exported as pstats
+    """
+    self.window = window
+    self.__sections = OrderedDict()   # name -> Section, in the order of the first use
+    self.__cprofile = None
+    if cprofile:
+      import cProfile
+      self.__cprofile = cProfile.Profile()
+      self.__cprofile.enable()
+
+  def section(self, name: str):
+    section = self.__sections.get(name)
+    if section is None:
+      section = self.__sections[name] = Section(deque(maxlen=self.window))
+    return section
+
+  def add(self, name: str, seconds: float):
+    self.section(name).samples.append(seconds)
+
+  def summary(self):
+    """{name: {count, mean, p50, p95, p99, max}} in milliseconds over the window"""
+    result = OrderedDict()
+    for name, section in self.__sections.items():
+      ordered = sorted(section.samples)
+      stats = {"count": len(ordered), "mean": sum(ordered) / len(ordered) * 1000 if ordered else 0.0}
+      for p in PERCENTILES:
+        stats[f"p{p}"] = percentile(ordered, p) * 1000
+      stats["max"] = ordered[-1] * 1000 if ordered else 0.0
+      result[name] = stats
+    return result
+
+  def lines(self):
+    """Text lines of the summary, for the overlay"""
+    lines = [f"{'section':<12}{'p50':>6}{'p95':>6}{'p99':>6}"]
+    for name, stats in self.summary().items():
+      lines.append(f"{name[:12]:<12}{stats['p50']:6.2f}{stats['p95']:6.2f}{stats['p99']:6.2f}")
+    return lines
+
+  ######################## export
+
+  def export(self, path: str):
+    """Write the summary as .csv or .json, or the cProfile stats as .prof / .pstats"""
+    if path.endswith(('.prof', '.pstats')):
+      if self.__cprofile is None:
+        raise ValueError("cProfile was not enabled, create the Profiler with cprofile=True")
+      self.__cprofile.disable()
+      self.__cprofile.dump_stats(path)
+      return
+    summary = self.summary()
+    if path.endswith('.json'):
+      with open(path, 'w') as f:
+        json.dump(summary, f, indent=2)
+    elif path.endswith('.csv'):
+      with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        columns = ["count", "mean"] + [f"p{p}" for p in PERCENTILES] + ["max"]
+        writer.writerow(["section"] + columns)
+        for name, stats in summary.items():
+          writer.writerow([name] + [round(stats[column], 4) for column in columns])
+    else:
+      raise ValueError(f"unknown profile format: {path}, use .csv, .json, .prof or .pstats")
+
+
+class NullProfiler:
+  """Disabled profiler, every section is the same no-op"""
+
+  def section(self, name: str):
+    return NULL_SECTION
+
+  def add(self, name: str, seconds: float):
+    pass
+
+  def summary(self):
+    return OrderedDict()
+
+  def lines(self):
+    return []
+
+
+NULL_PROFILER = NullProfiler()
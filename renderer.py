@@ -0,0 +1,327 @@
+import pygame
+from engine import W, H
+from item import ItemAtlas, ICON_SIZE
+from profiler import NULL_PROFILER
+
+# Screen Configs, of the default field at full tile size, Layout for other fields and windows
+TILE = 45     # pixels for width and height for each tile, at most
+MIN_TILE = 4  # fields that do not fit the window with tiles this small make the window larger
+MARGIN = 20
+GAME_W, GAME_H = W * TILE, H * TILE # screen pixel size
+GAME_RES = GAME_W, GAME_H
+BOARD_RES = GAME_W * 3 // 5, GAME_H
+PANEL_MIN_H = 500   # the board panel is as high as the game screen, at least this
+SCREEN_RES = GAME_W + BOARD_RES[0] + MARGIN * 3, GAME_H + MARGIN * 2
+GRID_COLOR = (40, 40, 40)
+PROFILE_LINE = 18   # pixels per line of the overlay
+PREVIEW_ROWS = 20   # the preview tile is the panel height divided by this, TILE at most
+GHOST_SHADE = 0.3   # landing preview of the falling figure, its color scaled by this
+TILE_CACHE_SIZE = 512  # pre-rendered tile looks kept, figure colors are jittered so there are a few hundred
+BEVEL = 3           # pixels of the light and dark edges of a tile
+
+
+def figure_rect(x = 0, y = 0):
+  return pygame.Rect(x * TILE + 1, y * TILE + 1, TILE - 2, TILE - 2)
+
+
+def cover(surface: pygame.Surface, size):
+  """surface scaled up to cover size, if it is smaller, the part beyond size is cut off when drawn"""
+  width, height = surface.get_size()
+  scale = max(size[0] / width, size[1] / height)
+  if scale <= 1:
+    return surface
+  return pygame.transform.smoothscale(surface, (int(width * scale + 0.5), int(height * scale + 0.5)))
+
+
+class Layout:
+
+  def __init__(self, width=W, height=H, window=None):
+    """Layout
+    Pixel geometry of the screen for a field of width x height tiles, the board panel
+    on the left and the game screen on the right. The tile is the largest one up to TILE
+    with which both fit into the window, TILE without a window, MIN_TILE at least.
+    The default field without a window is the same as the module constants.
+
+    Args:
+        width, height: count of tiles of the field
+        window: (width, height) pixels the screen should fit in
+    """
+    panel_w = BOARD_RES[0]
+    tile = TILE
+    if window:
+      tile = min(TILE, (window[0] - panel_w - MARGIN * 3) // width, (window[1] - MARGIN * 2) // height)
+    self.width, self.height = width, height
+    self.tile = max(tile, MIN_TILE)
+    self.game_res = width * self.tile, height * self.tile
+    self.board_res = panel_w, max(self.game_res[1], PANEL_MIN_H)
+    self.screen_res = self.game_res[0] + panel_w + MARGIN * 3, self.board_res[1] + MARGIN * 2
+    self.game_pos = panel_w + MARGIN * 2, MARGIN  # top left of the game screen
+    # the next figure is drawn around its position tile, same as the figure at the top of the field
+    self.preview_tile = min(TILE, self.board_res[1] // PREVIEW_ROWS)
+    self.preview_pos = panel_w // 2 + MARGIN, self.board_res[1] // 6 + MARGIN + self.preview_tile
+    self.profile_pos = MARGIN + 10, self.board_res[1] // 2 - 40  # profiler overlay, between the preview and the record
+
+  def grid_rect(self, x = 0, y = 0):
+    """Tile cell including the grid border, in screen coordinates"""
+    tile = self.tile
+    return pygame.Rect(self.game_pos[0] + x * tile, self.game_pos[1] + y * tile, tile, tile)
+
+  def preview_rect(self, dx = 0, dy = 0):
+    """Tile of the next figure at (dx, dy) from its position, without the grid border"""
+    tile = self.preview_tile
+    return pygame.Rect(self.preview_pos[0] + dx * tile + 1, self.preview_pos[1] + dy * tile + 1, tile - 2, tile - 2)
+
+
+class TileCache:
+
+  def __init__(self, size=(TILE - 2, TILE - 2), capacity=TILE_CACHE_SIZE):
+    """TileCache
+    Shaded tile surfaces keyed by (color, item), rendered on first use.
+    The oldest ones are dropped beyond capacity, a hit is a single dict lookup
+    (no LRU bookkeeping, rendering a dropped tile again is cheap).
+    Requires the display mode to be set.
+
+    Args:
+        size: width and height of a tile without the grid border
+    """
+    self.size = tuple(size)
+    self.capacity = capacity
+    self.__tiles = {}
+    self.misses = 0
+
+  def __len__(self):
+    return len(self.__tiles)
+
+  def get(self, color, item=None):
+    surface = self.__tiles.get((color, item))
+    if surface is None:
+      self.misses += 1
+      if len(self.__tiles) >= self.capacity:
+        del self.__tiles[next(iter(self.__tiles))]
+      surface = self.__tiles[(color, item)] = self.render(color, item)
+    return surface
+
+  def render(self, color, item=None):
+    width, height = self.size
+    # small tiles of large fields keep some of their face
+    bevel = min(BEVEL, min(width, height) // 4)
+    color = pygame.Color(color)
+    light = pygame.Color(min(color.r + 60, 255), min(color.g + 60, 255), min(color.b + 60, 255))
+    dark = pygame.Color(color.r * 2 // 3, color.g * 2 // 3, color.b * 2 // 3)
+    surface = pygame.Surface(self.size).convert()
+    surface.fill(light)
+    pygame.draw.polygon(surface, dark, [(width, 0), (width, height), (0, height)])
+    surface.fill(color, (bevel, bevel, width - bevel * 2, height - bevel * 2))
+    if item:
+      ItemAtlas.get((min(width, ICON_SIZE[0]), min(height, ICON_SIZE[1]))).draw(item, (0, 0), surface)
+    return surface
+
+  def clear(self):
+    self.__tiles.clear()
+
+
+class Renderer:
+
+  def __init__(self, screen: pygame.Surface, profiler=NULL_PROFILER, ghost=True, layout: Layout = None):
+    """Renderer
+    Retained mode renderer of the game screen and the board panel.
+    Backgrounds, grid and labels are drawn once into a static layer, then each frame
+    only tiles and texts that changed since the last frame are redrawn and passed
+    to `pygame.display.update(rects)`. Board rows are compared by mask and cell list,
+    a frame costs the height of the field plus the changed rows, not the filled tiles.
+
+    Args:
+        screen: display surface of layout.screen_res, or larger
+        profiler: times the parts of a frame, see profiler.py
+        ghost: draw where the falling figure would land
+        layout: geometry of the field on the screen, the default field with TILE by default
+    """
+    self.screen = screen
+    self.profiler = profiler
+    self.ghost = ghost
+    self.layout = layout = layout or Layout()
+    self.tiles = TileCache((layout.tile - 2, layout.tile - 2))
+    if layout.preview_tile == layout.tile:
+      self.preview_tiles = self.tiles
+    else:
+      self.preview_tiles = TileCache((layout.preview_tile - 2, layout.preview_tile - 2))
+    main_font = pygame.font.Font('assets/font.ttf', 65)
+    self.font = pygame.font.Font('assets/font.ttf', 45)
+    self.small_font = pygame.font.Font(None, 22)
+
+    # static layer, backgrounds are scaled when the screen or the game screen are larger than them
+    self.__background = pygame.Surface(screen.get_size()).convert()
+    self.__background.blit(cover(pygame.image.load('assets/images/bg_screen.png').convert(), screen.get_size()), (0, 0))
+    game = pygame.image.load('assets/images/bg_game.jpg').convert()
+    if game.get_size() != layout.game_res:
+      game = pygame.transform.smoothscale(game, layout.game_res)
+    self.__background.blit(game, layout.game_pos)
+    positions = [(x, y) for y in range(layout.height) for x in range(layout.width)]
+    for position in positions:
+      pygame.draw.rect(self.__background, GRID_COLOR, layout.grid_rect(*position), 1)
+    # destination rects and background of every cell, allocated once, a frame is a single blits()
+    self.__grid_rects = {position: layout.grid_rect(*position) for position in positions}
+    self.__tile_rects = {position: rect.inflate(-2, -2) for position, rect in self.__grid_rects.items()}
+    self.__grid_backgrounds = {position: self.__background.subsurface(rect) for position, rect in self.__grid_rects.items()}
+    panel_h = layout.board_res[1]
+    self.__record_pos = MARGIN + 40, panel_h - MARGIN - 200
+    self.__score_pos = MARGIN + 40, panel_h - MARGIN - 30
+    self.__background.blit(main_font.render('TETRIS', True, pygame.Color('darkorange')), (MARGIN + 10, MARGIN + 10))
+    self.__background.blit(self.font.render('Record:', True, pygame.Color('purple')), (MARGIN + 40, panel_h - MARGIN - 270))
+    self.__background.blit(self.font.render(' Score:', True, pygame.Color('green')), (MARGIN + 30, panel_h - MARGIN - 100))
+
+    self.invalidate()
+
+  def invalidate(self):
+    """Redraw everything on the next frame"""
+    self.__full = True
+    self.__cells = {}    # (x, y) -> (color, item) on the screen
+    self.__rows = [], []  # board row masks and cell lists on the screen
+    self.__transient = ()  # positions of the figure, ghost and overlay on the screen
+    self.__texts = {}    # name -> (text, rect) on the screen
+    self.__preview = None, []  # (key, rects) of the next figure on the screen
+    self.__profile, self.__profile_lines = [], None   # rects and lines of the profiler overlay on the screen
+
+  def draw(self, board, figure, next_figure, score, record, overlay=None, profile=None):
+    """Draw a frame and update the changed part of the display
+
+    Args:
+        board: Board of fallen tiles, of the layout's size
+        figure: falling figure
+        next_figure: figure shown in the board panel
+        score, record: numbers shown in the board panel
+        overlay: {(x, y): color} drawn on top of tiles, e.g. effects
+        profile: text lines of the profiler overlay, None hides it, the same list is not redrawn
+
+    Returns:
+        list of updated rects
+    """
+    profiler = self.profiler
+    if self.__full:
+      self.screen.blit(self.__background, (0, 0))
+
+    with profiler.section('cells'):
+      # drawn on top of the board
+      transient = {}
+      if figure:
+        if self.ghost and not figure.fallen:
+          landing = figure.landing_y(board)
+          if landing > figure.y:
+            shade = tuple(int(c * GHOST_SHADE) for c in figure.color)
+            for dx, dy in figure.offsets:
+              if landing + dy >= 0:
+                transient[(figure.x + dx, landing + dy)] = (shade, None)
+        for idx, tile in enumerate(figure.tiles):
+          if tile.y >= 0:
+            transient[(tile.x, tile.y)] = (figure.color, figure.item if idx == 0 else None)
+      if overlay:
+        for position, color in overlay.items():
+          transient[position] = (color, None)
+      dirty = self.__draw_cells(board, transient)
+    with profiler.section('text'):
+      dirty += self.__draw_text('record', str(record).rjust(6, ' '), 'yellow', self.__record_pos)
+      dirty += self.__draw_text('score', str(score).rjust(6, ' '), 'white', self.__score_pos)
+      dirty += self.__draw_profile(profile)
+    with profiler.section('preview'):
+      dirty += self.__draw_preview(next_figure)
+
+    with profiler.section('display'):
+      if self.__full:
+        self.__full = False
+        pygame.display.update()
+        return [self.screen.get_rect()]
+      if dirty:
+        pygame.display.update(dirty)
+    return dirty
+
+  ######################## parts
+
+  def __restore(self, rect):
+    self.screen.blit(self.__background, rect, rect)
+
+  def __draw_cells(self, board, transient):
+    looks, full = self.__cells, self.__full
+    rows, cells = board.rows, board.cells
+    if full:
+      looks.clear()
+      changed = {(x, y) for x, y, _ in board.filled_tiles()}
+    else:
+      # a row changed when its mask or its cell list did, lock() and line clears replace the list,
+      # its tiles on the screen and in the board are compared
+      masks, cell_rows = self.__rows
+      changed = set(self.__transient)
+      for y in range(board.height):
+        if rows[y] != masks[y] or cells[y] is not cell_rows[y]:
+          mask = rows[y] | masks[y]
+          while mask:
+            low = mask & -mask
+            changed.add((low.bit_length() - 1, y))
+            mask ^= low
+    changed.update(transient)
+
+    # cells do not overlap, the background of one and the tile of another can go in any order
+    dirty, blits, tiles = [], [], self.tiles
+    for position in changed:
+      look = transient.get(position)
+      if look is None:
+        x, y = position
+        if rows[y] >> x & 1:
+          look = cells[y][x]
+      if look == looks.get(position) and not (full and look):
+        continue
+      rect = self.__grid_rects[position]
+      if not full:
+        blits.append((self.__grid_backgrounds[position], rect))
+      if look:
+        blits.append((tiles.get(*look), self.__tile_rects[position]))
+        looks[position] = look
+      else:
+        del looks[position]
+      dirty.append(rect)
+    self.screen.blits(blits, doreturn=False)
+    self.__rows = rows[:], cells[:]
+    self.__transient = tuple(transient)
+    return dirty
+
+  def __draw_text(self, name, text, color, position):
+    previous = self.__texts.get(name)
+    if previous and previous[0] == text:
+      return []
+    surface = self.font.render(text, True, pygame.Color(color))
+    rect = surface.get_rect(topleft=position)
+    dirty = [rect]
+    if previous:
+      self.__restore(previous[1])
+      dirty.append(previous[1])
+    self.screen.blit(surface, rect)
+    self.__texts[name] = (text, rect)
+    return dirty
+
+  def __draw_profile(self, lines):
+    if self.__profile and lines is self.__profile_lines:
+      return []
+    dirty = self.__profile
+    for rect in dirty:
+      self.__restore(rect)
+    self.__profile, self.__profile_lines = [], lines
+    for i, line in enumerate(lines or []):
+      surface = self.small_font.render(line, True, pygame.Color('white'))
+      rect = self.screen.blit(surface, (self.layout.profile_pos[0], self.layout.profile_pos[1] + i * PROFILE_LINE))
+      self.__profile.append(rect)
+    return dirty + self.__profile
+
+  def __draw_preview(self, figure):
+    key = (figure.shape, figure.rotation, figure.color, figure.item)
+    previous_key, previous_rects = self.__preview
+    if key == previous_key:
+      return []
+    for rect in previous_rects:
+      self.__restore(rect)
+    rects, blits = [], []
+    for idx, (dx, dy) in enumerate(figure.offsets):
+      rect = self.layout.preview_rect(dx, dy)
+      blits.append((self.preview_tiles.get(figure.color, figure.item if idx == 0 else None), rect))
+      rects.append(rect)
+    self.screen.blits(blits, doreturn=False)
+    self.__preview = key, rects
+    return previous_rects + rects
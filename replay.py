@@ -0,0 +1,167 @@
+from engine import Game, Action, W, H, FALLING_SPEED_INITIAL, DEFAULT_ITEM_PRESENCE_RATIO, LOCK_DELAY
+from figure import RANDOMIZERS
+
+# Binary replay format, every number is an unsigned LEB128 varint
+#   MAGIC
+#   zigzag encoded seed, width, height, falling_speed_initial, item presence ratio in permille, lock delay,
+#   randomizer index in figure.RANDOMIZERS
+#   per input:  ticks since the previous input, Action value (never 0)
+#   end:        ticks since the last input, 0
+#   final score + 1 (0 when unknown)
+MAGIC = b'TTR\x06'  # 02: figure queue no longer draws an extra random() per figure, 03: lock delay,
+                    # 04: randomizer, pieces from their own generator, 05: added pieces from their own generator,
+                    # 06: seed zigzag encoded, negative seeds
+RANDOMIZER_NAMES = list(RANDOMIZERS)
+
+
+def zigzag(value: int):
+  """Non-negative int of a signed one for write_varint(), small magnitudes stay small"""
+  return value * 2 if value >= 0 else -value * 2 - 1
+
+
+def unzigzag(value: int):
+  return value >> 1 if not value & 1 else -(value >> 1) - 1
+
+
+def write_varint(out: bytearray, value: int):
+  if value < 0:
+    # the shifts below never reach 0 for a negative value
+    raise ValueError(f"varint of a negative value {value}, zigzag() it")
+  while True:
+    byte = value & 0x7f
+    value >>= 7
+    if value:
+      out.append(byte | 0x80)
+    else:
+      out.append(byte)
+      return
+
+
+def read_varint(data: bytes, pos: int):
+  """Returns (value, position after the varint)"""
+  value, shift = 0, 0
+  while True:
+    byte = data[pos]
+    pos += 1
+    value |= (byte & 0x7f) << shift
+    if not byte & 0x80:
+      return value, pos
+    shift += 7
+
+
+class Replay:
+
+  def __init__(self, seed: int, width=W, height=H, falling_speed_initial=FALLING_SPEED_INITIAL,
+               item_presence_ratio=DEFAULT_ITEM_PRESENCE_RATIO, inputs=None, ticks=0, score=None, lock_delay=LOCK_DELAY,
+               randomizer='uniform'):
+    """Replay
+    Seed and game configs plus every input with the tick it was applied at.
+    Inputs of tick n are applied right before the n+1 th step, same as game.apply() between steps.
+
+    Args:
+        inputs: list of (tick, Action)
+        ticks: count of steps of the whole game
+        score: final score, checked by play()
+    """
+    self.seed = seed
+    self.width, self.height = width, height
+    self.falling_speed_initial = falling_speed_initial
+    self.item_presence_ratio = item_presence_ratio
+    self.lock_delay = lock_delay
+    self.randomizer = randomizer
+    self.inputs = inputs if inputs is not None else []
+    self.ticks = ticks
+    self.score = score
+
+  def game(self):
+    return Game(self.width, self.height, self.item_presence_ratio, self.falling_speed_initial, seed=self.seed,
+                lock_delay=self.lock_delay, randomizer=self.randomizer)
+
+  def play(self, game: Game = None):
+    """Replay at full speed without rendering
+
+    Returns:
+        Game at the end of the replay
+    """
+    if game is None:
+      game = self.game()
+    else:
+      game.reset(self.seed)
+    inputs = iter(self.inputs)
+    next_input = next(inputs, None)
+    while game.ticks < self.ticks and not game.over:
+      while next_input and next_input[0] == game.ticks:
+        game.apply(next_input[1])
+        next_input = next(inputs, None)
+      game.step()
+    return game
+
+  ######################## binary format
+
+  def encode(self):
+    out = bytearray(MAGIC)
+    for value in (zigzag(self.seed), self.width, self.height, self.falling_speed_initial, round(self.item_presence_ratio * 1000),
+                  self.lock_delay, RANDOMIZER_NAMES.index(self.randomizer)):
+      write_varint(out, value)
+    previous = 0
+    for tick, action in self.inputs:
+      write_varint(out, tick - previous)
+      write_varint(out, action.value)
+      previous = tick
+    write_varint(out, self.ticks - previous)
+    write_varint(out, 0)
+    write_varint(out, 0 if self.score is None else self.score + 1)
+    return bytes(out)
+
+  @classmethod
+  def decode(cls, data: bytes):
+    if data[:len(MAGIC)] != MAGIC:
+      raise ValueError("not a tetris replay")
+    pos = len(MAGIC)
+    header = []
+    for _ in range(7):
+      value, pos = read_varint(data, pos)
+      header.append(value)
+    seed, width, height, falling_speed_initial, permille, lock_delay, randomizer = header
+    inputs, tick = [], 0
+    while True:
+      delta, pos = read_varint(data, pos)
+      value, pos = read_varint(data, pos)
+      tick += delta
+      if value == 0:
+        break
+      inputs.append((tick, Action(value)))
+    score, pos = read_varint(data, pos)
+    return cls(unzigzag(seed), width, height, falling_speed_initial, permille / 1000, inputs, tick, score - 1 if score else None,
+               lock_delay, RANDOMIZER_NAMES[randomizer])
+
+  def save(self, path):
+    with open(path, 'wb') as f:
+      f.write(self.encode())
+
+  @classmethod
+  def load(cls, path):
+    with open(path, 'rb') as f:
+      return cls.decode(f.read())
+
+
+class Recorder:
+
+  def __init__(self, game: Game):
+    """Recorder
+    Use in place of the game for inputs: apply() records the action with the current tick.
+    """
+    self.game = game
+    self.replay = Replay(game.seed, game.width, game.height, game.falling_speed_initial, game.item_presence_ratio,
+                         lock_delay=game.lock_delay, randomizer=game.randomizer)
+
+  def apply(self, action: Action):
+    if action != Action.NONE and not self.game.over:
+      self.replay.inputs.append((self.game.ticks, action))
+    self.game.apply(action)
+
+  def finish(self):
+    """Replay of the game so far"""
+    self.replay.ticks = self.game.ticks
+    self.replay.score = self.game.score
+    return self.replay
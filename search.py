@@ -0,0 +1,288 @@
+from collections import OrderedDict, deque, namedtuple
+from board import Board
+from figure import Figure, SHAPE_TABLE
+from item import Item
+from engine import Game
+
+MEMO_SIZE = 4096  # reachable placements kept per (board, shape, start)
+TABLE_BYTES = 16 * 1024 * 1024  # default memory cap of a TranspositionTable
+ENTRY_BYTES = 256  # per entry of (hash, shape, shape) -> value, measured with tracemalloc and rounded up
+
+# Heuristic weights of a board after a placement
+WEIGHTS = {
+  "height": -0.510066,   # sum of column heights
+  "lines": 0.760666,     # completed lines
+  "holes": -0.35663,     # empty tiles below the top of their column
+  "bumpiness": -0.184483,  # sum of height differences of neighbour columns
+}
+
+# Final position of a figure and its outcome
+#   rotation, x, y: figure pose where it locks
+#   rows:  row masks of the board after locking and removing completed lines
+#   lines: count of completed lines
+#   items: items on the completed lines, including the figure's own
+#   score: score delta, with the expected value of the random multi bonus
+Placement = namedtuple('Placement', ['rotation', 'x', 'y', 'rows', 'lines', 'items', 'score'])
+
+
+def expected_score(lines: int, items: list, combo: int = 0):
+  """Score of a lock, same rules as Game, combo is the running combo before the lock"""
+  score = 1
+  if lines:
+    score += lines * 2
+    if combo + 1 > 1:
+      score += (combo + 1) * 10
+    if lines > 1:
+      # randint(1, lines) * randint(lines, 5) * lines
+      score += (1 + lines) / 2 * (lines + 5) / 2 * lines
+  return score + 100 * sum(1 for item in items if item == Item.DOLLAR)
+
+
+def reachable(board: Board, shape, rotation: int, x: int, y: int):
+  """Landing poses reachable from (rotation, x, y) by moving left, right, down and rotating
+
+  BFS over (rotation, x, y) with an int bitset of visited states.
+
+  Returns:
+      list of (rotation, x, y) where the figure can not move down anymore, one per distinct set of tiles
+  """
+  rotations = SHAPE_TABLE[shape][1]
+  count = len(rotations)
+  width, height = board.width, board.height
+  # x is in [-right, width - left) and y in [-4, height) for any figure pose in the field
+  x_offset, y_offset = 4, 4
+  x_span, y_span = width + 8, height + 8
+
+  def index(r, x, y):
+    return (r * x_span + x + x_offset) * y_span + y + y_offset
+
+  if board.hits(rotations[rotation], x, y):
+    return []
+  visited = 1 << index(rotation, x, y)
+  queue = deque([(rotation, x, y)])
+  landed, seen_tiles = [], set()
+  while queue:
+    r, x, y = queue.popleft()
+    current = rotations[r]
+    if board.hits(current, x, y + 1):
+      tiles = tuple((y + dy, mask << (x + current.left)) for dy, mask in current.row_masks)
+      if tiles not in seen_tiles:
+        seen_tiles.add(tiles)
+        landed.append((r, x, y))
+    else:
+      bit = 1 << index(r, x, y + 1)
+      if not visited & bit:
+        visited |= bit
+        queue.append((r, x, y + 1))
+    for dx in (-1, 1):
+      bit = 1 << index(r, x + dx, y)
+      if not visited & bit and not board.hits(current, x + dx, y):
+        visited |= bit
+        queue.append((r, x + dx, y))
+    # rotate with wall kick, same as Figure.rotate
+    next_r = (r + 1) % count
+    rotated = rotations[next_r]
+    kicked = x
+    if kicked + rotated.left < 0:
+      kicked = -rotated.left
+    elif kicked + rotated.right > width - 1:
+      kicked = width - 1 - rotated.right
+    bit = 1 << index(next_r, kicked, y)
+    if not visited & bit and not board.hits(rotated, kicked, y):
+      visited |= bit
+      queue.append((next_r, kicked, y))
+  return landed
+
+
+class PlacementSearch:
+
+  def __init__(self, memo_size: int = MEMO_SIZE):
+    """PlacementSearch
+    Enumerates final placements of a figure, BFS results are memoized by (board, shape, start pose).
+    """
+    self.__memo = OrderedDict()
+    self.__memo_size = memo_size
+    self.hits, self.misses = 0, 0
+
+  def reachable(self, board: Board, shape, rotation: int, x: int, y: int):
+    key = (board.hash, shape, rotation, x, y)
+    poses = self.__memo.get(key)
+    if poses is not None:
+      self.hits += 1
+      self.__memo.move_to_end(key)
+      return poses
+    self.misses += 1
+    poses = self.__memo[key] = reachable(board, shape, rotation, x, y)
+    if len(self.__memo) > self.__memo_size:
+      self.__memo.popitem(last=False)
+    return poses
+
+  def placements(self, board: Board, figure: Figure, combo: int = 0):
+    """Every reachable final placement of the figure from its current pose
+
+    Args:
+        combo: running combo before the lock, for the score delta
+    """
+    return [
+      self.place(board, figure, rotation, x, y, combo)
+      for rotation, x, y in self.reachable(board, figure.shape, figure.rotation, figure.x, figure.y)
+    ]
+
+  def place(self, board: Board, figure: Figure, rotation: int, x: int, y: int, combo: int = 0):
+    """Placement of the figure locked at (rotation, x, y)"""
+    pose, item = SHAPE_TABLE[figure.shape][1][rotation], figure.item
+    rows = board.rows[:]
+    left = x + pose.left
+    for dy, mask in pose.row_masks:
+      if y + dy >= 0:
+        rows[y + dy] |= mask << left
+    full = board.full
+    lines, items = 0, []
+    kept = []
+    for row_y, mask in enumerate(rows):
+      if mask == full:
+        lines += 1
+        items += [cell[1] for cell in board.cells[row_y] if cell and cell[1]]
+      else:
+        kept.append(mask)
+    if lines:
+      # the figure's item is on its first tile
+      _, dy = pose.offsets[0]
+      if item and rows[y + dy] == full:
+        items.append(item)
+      rows = [0] * lines + kept
+    return Placement(rotation, x, y, tuple(rows), lines, items, expected_score(lines, items, combo))
+
+
+def evaluate_rows(rows, width: int, lines: int = 0, weights=WEIGHTS):
+  """Heuristic value of a board given by its row masks, higher is better"""
+  height = len(rows)
+  seen, holes = 0, 0
+  heights = [0] * width
+  for y, mask in enumerate(rows):
+    holes += bin(seen & ~mask).count('1')
+    new = mask & ~seen
+    while new:
+      low = new & -new
+      heights[low.bit_length() - 1] = height - y
+      new ^= low
+    seen |= mask
+  bumpiness = sum(abs(heights[x] - heights[x + 1]) for x in range(width - 1))
+  return (
+    weights["height"] * sum(heights)
+    + weights["lines"] * lines
+    + weights["holes"] * holes
+    + weights["bumpiness"] * bumpiness
+  )
+
+
+class TranspositionTable:
+
+  def __init__(self, max_bytes: int = TABLE_BYTES):
+    """TranspositionTable
+    LRU of lookahead values keyed by (board hash, current shape, next shape),
+    a value only depends on its key, so players can share a table.
+    The least recently used entries are evicted once the estimated memory reaches max_bytes.
+    """
+    self.__entries = OrderedDict()
+    self.capacity = max(1, max_bytes // ENTRY_BYTES)
+    self.hits, self.misses, self.evictions = 0, 0, 0
+
+  def __len__(self):
+    return len(self.__entries)
+
+  @property
+  def memory(self):
+    """estimated bytes used by the entries"""
+    return len(self.__entries) * ENTRY_BYTES
+
+  def get(self, board_hash: int, shape, next_shape=None):
+    key = (board_hash, shape, next_shape)
+    value = self.__entries.get(key)
+    if value is None:
+      self.misses += 1
+      return None
+    self.hits += 1
+    self.__entries.move_to_end(key)
+    return value
+
+  def put(self, board_hash: int, shape, next_shape, value):
+    self.__entries[(board_hash, shape, next_shape)] = value
+    if len(self.__entries) > self.capacity:
+      self.__entries.popitem(last=False)
+      self.evictions += 1
+
+  def clear(self):
+    self.__entries.clear()
+
+  def stats(self):
+    return {"entries": len(self.__entries), "memory": self.memory,
+            "hits": self.hits, "misses": self.misses, "evictions": self.evictions}
+
+
+class AutoPlayer:
+
+  def __init__(self, beam_width: int = 1, lookahead: bool = True, search: PlacementSearch = None,
+               table: TranspositionTable = None):
+    """AutoPlayer
+    Picks a placement of the current figure by the board heuristic.
+    With lookahead, the best beam_width placements are expanded with every placement of the next figure.
+    Values of the best next placement on a board are kept in the transposition table.
+    """
+    self.beam_width = beam_width
+    self.lookahead = lookahead
+    self.search = search or PlacementSearch()
+    self.table = TranspositionTable() if table is None else table
+    self.placements = 0   # count of enumerated placements
+
+  def choose(self, game: Game):
+    figures = game.figures
+    board = game.field
+    figure = figures.current_figure
+    scores = game.scores
+    combo = scores["combo"] if scores["previously_completed_lines"] else 0
+
+    candidates = self.search.placements(board, figure, combo)
+    self.placements += len(candidates)
+    if not candidates:
+      return None
+
+    def value(placement):
+      return evaluate_rows(placement.rows, board.width, placement.lines)
+
+    ranked = sorted(candidates, key=value, reverse=True)
+    best = ranked[0]
+    if self.lookahead:
+      best_value = None
+      for placement in ranked[:self.beam_width]:
+        total = value(placement) + self.__best_next(board, placement.rows, figures.next_figure, value)
+        if best_value is None or total > best_value:
+          best, best_value = placement, total
+    return best
+
+  def __best_next(self, board: Board, rows, next_figure: Figure, value):
+    """Value of the best placement of the next figure on rows"""
+    after = Board.from_rows(board.width, board.height, rows)
+    cached = self.table.get(after.hash, next_figure.shape)
+    if cached is not None:
+      return cached
+    next_candidates = self.search.placements(after, next_figure)
+    self.placements += len(next_candidates)
+    best = max((value(p) for p in next_candidates), default=-1000)
+    self.table.put(after.hash, next_figure.shape, None, best)
+    return best
+
+  def step(self, game: Game):
+    """Place the current figure, one tick of the game"""
+    placement = self.choose(game)
+    if placement is None:
+      # nowhere to go, let it fall where it is
+      return game.step()
+    return game.place(placement.rotation, placement.x, placement.y)
+
+  def play(self, game: Game, max_pieces: int = None):
+    pieces = 0
+    while not game.over and (max_pieces is None or pieces < max_pieces):
+      self.step(game)
+      pieces += 1
+    return game
@@ -0,0 +1,512 @@
+"""Game server for versus matches and live spectators
+
+  python server.py --games 8 --versus            # 4 matches of random bots, players may take a seat
+  python main.py --connect localhost:7531 --game 3 --play
+
+Every game is a headless engine.Game stepped at TICK_RATE by a single asyncio
+task. Clients get a full frame when they join, then only the changed cells of
+each tick, encoded once per game and written to every client of it. Writes
+never wait: a client whose socket buffer is over HIGH_WATER misses deltas
+until it drained below LOW_WATER, then gets a new full frame.
+"""
+import argparse
+import asyncio
+import json
+import struct
+import time
+from random import Random
+from engine import Game, Action, Event, W, H, TICK_RATE, BASIC_ACTIONS
+from figure import Figure, SHAPE_TABLE, RANDOMIZERS
+from item import Item
+from board import Board
+from replay import write_varint, read_varint
+from util import parse_size, parse_count
+
+PORT = 7531
+HIGH_WATER = 64 * 1024   # bytes buffered for a client before its deltas are dropped
+LOW_WATER = 16 * 1024    # a client missing deltas gets a full frame once its buffer is below this
+MAX_TICKS_PER_LOOP = 10  # catch up at most this many ticks at once, drop the rest
+BACKLOG = 1024           # pending connections, spectators tend to arrive together
+
+# Messages: 4 byte big endian length of the rest, type byte, payload of varints and bytes
+#   client -> server
+#     HELLO:  role (SPECTATE or PLAY), game index
+#     INPUT:  Action value
+#   server -> client
+#     FULL:   game index, width, height, tick, score, flags, next piece, row count, rows with every cell
+#     DELTA:  tick, score, flags, next piece if FLAG_PIECE, row count, changed rows
+#   row:    y, mask of the cells that follow, then per cell a code byte, and r, g, b bytes if it is filled
+#   code:   0 empty, 1 filled, 2 + index in ITEMS filled with that item
+#   piece:  shape index in SHAPES + 1, r, g, b bytes, item code
+HELLO, INPUT, FULL, DELTA = 1, 2, 3, 4
+SPECTATE, PLAY = 0, 1
+FLAG_OVER, FLAG_PIECE = 1, 2
+SHAPES = list(SHAPE_TABLE)
+ITEMS = list(Item)
+ITEM_CODES = {item: idx + 2 for idx, item in enumerate(ITEMS)}
+
+
+def frame(kind: int, payload=b''):
+  return struct.pack('>IB', len(payload) + 1, kind) + payload
+
+
+async def read_message(reader: asyncio.StreamReader):
+  """(type, payload) of the next message"""
+  size, = struct.unpack('>I', await reader.readexactly(4))
+  data = await reader.readexactly(size)
+  return data[0], data[1:]
+
+
+def write_cell(out: bytearray, cell):
+  if cell is None:
+    out.append(0)
+    return
+  color, item = cell
+  out.append(ITEM_CODES[item] if item else 1)
+  out += bytes(color)
+
+
+def write_row(out: bytearray, y: int, cells, mask: int):
+  write_varint(out, y)
+  write_varint(out, mask)
+  x = 0
+  while mask:
+    if mask & 1:
+      write_cell(out, cells[x])
+    mask >>= 1
+    x += 1
+
+
+################################### Server side
+
+class GameView:
+
+  def __init__(self, game: Game):
+    """GameView
+    Cells of a game as clients see them, fallen tiles with the falling figure on top.
+    delta() only rebuilds rows whose board row or figure tiles changed since the last tick.
+    """
+    self.game = game
+    self.reset()
+
+  def reset(self):
+    width, height = self.game.width, self.game.height
+    self.rows = [(None,) * width for _ in range(height)]
+    self.__masks = [None] * height        # board row masks of the last delta
+    self.__cell_rows = [None] * height    # board cell lists of the last delta, replaced when rows move
+    self.__figure_rows = set()
+    self.__piece = None
+    self.__score, self.__over = None, None
+    self.__state = None   # nothing visible changed while this is the same
+
+  def __figure_cells(self):
+    figure = self.game.figures.current_figure
+    cells = {}
+    for idx, tile in enumerate(figure.tiles):
+      if 0 <= tile.y < self.game.height:
+        cells[(tile.x, tile.y)] = (figure.color, figure.item if idx == 0 else None)
+    return cells
+
+  def __piece_bytes(self):
+    figure = self.game.figures.next_figure
+    out = bytearray()
+    write_varint(out, SHAPES.index(figure.shape) + 1)
+    out += bytes(figure.color)
+    out.append(ITEM_CODES[figure.item] if figure.item else 0)
+    return bytes(out)
+
+  def delta(self):
+    """DELTA message of the changes since the last call, None when nothing changed"""
+    game, board = self.game, self.game.field
+    figure = game.figures.current_figure
+    state = (board, board.hash, figure, figure.x, figure.y, figure.rotation, game.figures.next_figure, game.score, game.over)
+    if state == self.__state:
+      return None
+    self.__state = state
+    figure_cells = self.__figure_cells()
+    figure_rows = {y for _, y in figure_cells}
+    masks, cell_rows = self.__masks, self.__cell_rows
+    dirty = figure_rows | self.__figure_rows
+    dirty.update(y for y in range(game.height) if board.rows[y] != masks[y] or board.cells[y] is not cell_rows[y])
+    self.__figure_rows = figure_rows
+
+    changed = []
+    for y in sorted(dirty):
+      mask, row = board.rows[y], board.cells[y]
+      masks[y], cell_rows[y] = mask, row
+      new = [row[x] if mask >> x & 1 else None for x in range(game.width)]
+      for (x, figure_y), cell in figure_cells.items():
+        if figure_y == y:
+          new[x] = cell
+      new = tuple(new)
+      old = self.rows[y]
+      diff = 0
+      for x in range(game.width):
+        if new[x] != old[x]:
+          diff |= 1 << x
+      if diff:
+        self.rows[y] = new
+        changed.append((y, diff))
+
+    piece = self.__piece_bytes()
+    flags = FLAG_OVER if game.over else 0
+    if piece != self.__piece:
+      flags |= FLAG_PIECE
+    if not changed and not flags & FLAG_PIECE and game.score == self.__score and game.over == self.__over:
+      return None
+    self.__piece, self.__score, self.__over = piece, game.score, game.over
+
+    out = bytearray()
+    write_varint(out, game.ticks)
+    write_varint(out, game.score)
+    out.append(flags)
+    if flags & FLAG_PIECE:
+      out += piece
+    write_varint(out, len(changed))
+    for y, diff in changed:
+      write_row(out, y, self.rows[y], diff)
+    return frame(DELTA, bytes(out))
+
+  def full(self, index: int):
+    """FULL message of the cells sent so far"""
+    game = self.game
+    out = bytearray()
+    for value in (index, game.width, game.height, game.ticks, game.score):
+      write_varint(out, value)
+    out.append((FLAG_OVER if game.over else 0) | FLAG_PIECE)
+    out += self.__piece or self.__piece_bytes()
+    write_varint(out, game.height)
+    every = (1 << game.width) - 1
+    for y, row in enumerate(self.rows):
+      write_row(out, y, row, every)
+    return frame(FULL, bytes(out))
+
+
+class Client:
+
+  def __init__(self, writer: asyncio.StreamWriter, hosted):
+    """Client
+    Connection of a spectator or player, frames are written without waiting for the socket.
+    """
+    self.writer = writer
+    self.hosted = hosted
+    self.resync = True   # the next frame is a full one, set on join and after dropped deltas
+    self.frames, self.bytes, self.dropped, self.resyncs = 0, 0, 0, 0
+
+  def send(self, delta):
+    """Write the delta of this tick, None when the game did not change"""
+    transport = self.writer.transport
+    if transport.is_closing() or (delta is None and not self.resync):
+      return
+    buffered = transport.get_write_buffer_size()
+    if self.resync:
+      if buffered > LOW_WATER:
+        self.dropped += 1
+        return
+      self.__write(self.hosted.view.full(self.hosted.index))
+      self.resync = False
+      return
+    if buffered > HIGH_WATER:
+      # slow reader, skip deltas instead of buffering without bound or stalling the tick
+      self.resync = True
+      self.resyncs += 1
+      self.dropped += 1
+      return
+    self.__write(delta)
+
+  def __write(self, data):
+    self.writer.write(data)
+    self.frames += 1
+    self.bytes += len(data)
+
+
+class Hosted:
+  """A game of the server with its view, clients, player inputs and bot"""
+
+  def __init__(self, index, game, bot_seed):
+    self.index = index
+    self.game = game
+    self.view = GameView(game)
+    self.clients = []
+    self.player = None
+    self.inputs = []
+    self.bot = Random(bot_seed)
+    self.opponent = None
+
+
+class Server:
+
+  def __init__(self, games: int = 1, versus: bool = False, bots: bool = True, seed: int = 0,
+               randomizer: str = 'uniform', tick_rate: int = TICK_RATE, size=(W, H)):
+    """Server
+    Hosts headless games stepped at tick_rate by one asyncio task.
+    With versus, games 2k and 2k+1 are a match: a clear of more than one line pushes
+    completed - 1 garbage lines into the opponent, both restart when one tops out.
+    Seats without a player are played by a random bot when bots is set, otherwise they wait.
+    size is the (width, height) of every field.
+    """
+    self.tick_rate = tick_rate
+    self.versus = versus
+    self.bots = bots
+    self.hosted = [Hosted(idx, Game(*size, seed=seed + idx, randomizer=randomizer), seed + idx) for idx in range(games)]
+    if versus:
+      for idx in range(0, games - 1, 2):
+        self.hosted[idx].opponent, self.hosted[idx + 1].opponent = self.hosted[idx + 1], self.hosted[idx]
+    self.__next_seed = seed + games
+    self.ticks, self.late_ticks, self.matches = 0, 0, 0
+    self.__closed_clients = []
+    self.__writers = set()   # every open connection, with or without hello
+    self.__stopped = False
+
+  ######################## simulation
+
+  def tick(self):
+    """Step every game once and broadcast the changes"""
+    self.ticks += 1
+    for hosted in self.hosted:
+      game = hosted.game
+      if hosted.player is None and not self.bots:
+        continue
+      for action in hosted.inputs:
+        game.apply(action)
+      hosted.inputs.clear()
+      action = hosted.bot.choice(BASIC_ACTIONS) if hosted.player is None else Action.NONE
+      for kind, data in game.step(action):
+        if kind == Event.COMPLETED and data["completed"] > 1 and hosted.opponent:
+          hosted.opponent.game.add_garbage(data["completed"] - 1)
+
+    for hosted in self.hosted:
+      delta = hosted.view.delta()
+      for client in hosted.clients:
+        client.send(delta)
+    # after the game over frame was sent
+    for hosted in self.hosted:
+      if hosted.game.over:
+        self.__restart(hosted)
+
+  def __restart(self, hosted):
+    """New game for the seat, and for its opponent: the match is over"""
+    self.matches += 1
+    for seat in ([hosted, hosted.opponent] if hosted.opponent else [hosted]):
+      seat.game.reset(self.__next_seed)
+      self.__next_seed += 1
+      seat.inputs.clear()
+
+  async def run(self, duration: float = None):
+    """Tick at tick_rate until stop() or for duration seconds"""
+    loop = asyncio.get_running_loop()
+    self.__stopped = False
+    interval = 1 / self.tick_rate
+    started = next_tick = loop.time()
+    while not self.__stopped:
+      now = loop.time()
+      if duration is not None and now - started >= duration:
+        break
+      ticks = 0
+      while now >= next_tick:
+        if ticks == MAX_TICKS_PER_LOOP:
+          # too far behind, drop the rest instead of spiraling
+          self.late_ticks += int((now - next_tick) / interval) + 1
+          next_tick = now + interval
+          break
+        self.tick()
+        next_tick += interval
+        ticks += 1
+      await asyncio.sleep(max(0.0, next_tick - loop.time()))
+
+  def stop(self):
+    """run() returns before its next tick"""
+    self.__stopped = True
+
+  ######################## connections
+
+  async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    client = None
+    self.__writers.add(writer)
+    try:
+      kind, payload = await read_message(reader)
+      if kind != HELLO:
+        return
+      role, pos = read_varint(payload, 0)
+      index, pos = read_varint(payload, pos)
+      hosted = self.hosted[index % len(self.hosted)]
+      client = Client(writer, hosted)
+      if role == PLAY and hosted.player is None:
+        hosted.player = client
+      hosted.clients.append(client)
+      while True:
+        kind, payload = await read_message(reader)
+        if kind == INPUT and hosted.player is client and payload:
+          hosted.inputs.append(Action(payload[0]))
+    # ValueError of an unknown action, IndexError of a HELLO cut short in a varint
+    except (asyncio.IncompleteReadError, ConnectionError, ValueError, IndexError):
+      pass
+    finally:
+      self.__writers.discard(writer)
+      if client:
+        client.hosted.clients.remove(client)
+        if client.hosted.player is client:
+          client.hosted.player = None
+        self.__closed_clients.append(client)
+      writer.close()
+
+  def close(self):
+    """Close every connection, their handlers return"""
+    for writer in list(self.__writers):
+      writer.close()
+
+  def clients(self):
+    return [client for hosted in self.hosted for client in hosted.clients]
+
+  def report(self, elapsed: float, cpu: float):
+    clients = self.clients() + self.__closed_clients
+    return {
+      "games": len(self.hosted),
+      "spectators": len(clients),
+      "seconds": elapsed,
+      "cpu seconds": cpu,
+      "ticks": self.ticks,
+      "sustained": self.ticks / (elapsed * self.tick_rate) if elapsed else 0.0,
+      "late ticks": self.late_ticks,
+      "matches": self.matches,
+      "frames": sum(client.frames for client in clients),
+      "dropped": sum(client.dropped for client in clients),
+      "resyncs": sum(client.resyncs for client in clients),
+      "bytes": sum(client.bytes for client in clients),
+    }
+
+
+async def serve(server: Server, host='localhost', port=PORT, duration=None):
+  """Accept clients and tick until duration or cancelled, returns the report"""
+  listener = await asyncio.start_server(server.handle, host, port, backlog=BACKLOG)
+  started, cpu = time.perf_counter(), time.process_time()
+  try:
+    await server.run(duration)
+    report = server.report(time.perf_counter() - started, time.process_time() - cpu)
+  finally:
+    listener.close()
+    server.close()
+    # handlers see the closed connections and return before the loop goes away
+    await asyncio.sleep(0.1)
+  return report
+
+
+################################### Client side
+
+async def connect(host: str, port: int = PORT, role: int = SPECTATE, index: int = 0):
+  """Open a connection and say hello, returns (reader, writer)"""
+  reader, writer = await asyncio.open_connection(host, port)
+  out = bytearray()
+  write_varint(out, role)
+  write_varint(out, index)
+  writer.write(frame(HELLO, bytes(out)))
+  await writer.drain()
+  return reader, writer
+
+
+def send_input(writer: asyncio.StreamWriter, action: Action):
+  writer.write(frame(INPUT, bytes([action.value])))
+
+
+class RemoteGame:
+
+  def __init__(self):
+    """RemoteGame
+    Client side copy of a served game, built from its FULL and DELTA messages.
+    board holds every visible cell, the falling figure included, next_figure is a Figure for the preview.
+    """
+    self.index = None
+    self.board = None
+    self.next_figure = None
+    self.tick, self.score, self.over = 0, 0, False
+    self.frames = 0
+
+  def apply(self, kind: int, payload: bytes):
+    self.frames += 1
+    if kind == FULL:
+      self.__full(payload)
+    elif kind == DELTA and self.board is not None:
+      self.__delta(payload, 0)
+
+  def __full(self, data):
+    pos = 0
+    header = []
+    for _ in range(5):
+      value, pos = read_varint(data, pos)
+      header.append(value)
+    self.index, width, height, self.tick, self.score = header
+    if self.board is None or (self.board.width, self.board.height) != (width, height):
+      self.board = Board(width, height)
+    pos = self.__state(data, pos)
+    self.__rows(data, pos)
+
+  def __delta(self, data, pos):
+    self.tick, pos = read_varint(data, pos)
+    self.score, pos = read_varint(data, pos)
+    pos = self.__state(data, pos)
+    self.__rows(data, pos)
+
+  def __state(self, data, pos):
+    flags = data[pos]
+    pos += 1
+    self.over = bool(flags & FLAG_OVER)
+    if flags & FLAG_PIECE:
+      shape, pos = read_varint(data, pos)
+      color = tuple(data[pos:pos + 3])
+      code = data[pos + 3]
+      pos += 4
+      shape = SHAPES[shape - 1]
+      self.next_figure = Figure(SHAPE_TABLE[shape][0], (self.board.width // 2, 1), ITEMS[code - 2] if code else None,
+                                color=color)
+    return pos
+
+  def __rows(self, data, pos):
+    board = self.board
+    count, pos = read_varint(data, pos)
+    for _ in range(count):
+      y, pos = read_varint(data, pos)
+      mask, pos = read_varint(data, pos)
+      # a new list for the row, renderers compare rows by their cell list
+      row = board.cells[y] = board.cells[y][:]
+      x = 0
+      while mask:
+        if mask & 1:
+          code = data[pos]
+          pos += 1
+          if code:
+            row[x] = (tuple(data[pos:pos + 3]), ITEMS[code - 2] if code > 1 else None)
+            board.rows[y] |= 1 << x
+            pos += 3
+          else:
+            row[x] = None
+            board.rows[y] &= ~(1 << x)
+        mask >>= 1
+        x += 1
+    return pos
+
+
+def main():
+  parser = argparse.ArgumentParser(description="Serve games to players and spectators")
+  parser.add_argument('--host', default='localhost')
+  parser.add_argument('--port', type=int, default=PORT)
+  parser.add_argument('--games', type=parse_count, default=2)
+  parser.add_argument('--versus', action='store_true', help="pair games 2k and 2k+1 into matches with garbage lines")
+  parser.add_argument('--no-bots', dest='bots', action='store_false', help="seats wait for a player instead of a random bot")
+  parser.add_argument('--seed', type=int, default=0, help="game i starts with seed + i")
+  parser.add_argument('--randomizer', choices=list(RANDOMIZERS), default='uniform', help="sequence of the random figures")
+  parser.add_argument('--size', type=parse_size, default=(W, H), metavar='WxH', help=f"field size, {W}x{H} by default")
+  parser.add_argument('--duration', type=float, default=None, help="stop after this many seconds")
+  parser.add_argument('--report', action='store_true', help="print the load report as JSON at exit")
+  args = parser.parse_args()
+
+  server = Server(args.games, args.versus, args.bots, args.seed, args.randomizer, size=args.size)
+  try:
+    report = asyncio.run(serve(server, args.host, args.port, args.duration))
+  except KeyboardInterrupt:
+    return
+  if args.report:
+    print(json.dumps(report))
+
+
+if __name__ == '__main__':
+  main()
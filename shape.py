@@ -1,6 +1,6 @@
 from enum import auto
 from strenum import StrEnum
-from random import choice
+import random
 
 class Shape(StrEnum):
   BAR = 'BAR'
@@ -22,5 +22,5 @@ class DifficultShape(StrEnum):
     return [member.name for member in cls]
 
   @classmethod
-  def random(cls):
-    return DifficultShape(choice(DifficultShape.all()))
\ No newline at end of file
+  def random(cls, rng=random):
+    return DifficultShape(rng.choice(DifficultShape.all()))
\ No newline at end of file
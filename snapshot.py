@@ -0,0 +1,215 @@
+"""Save and restore a game mid-play
+
+  snapshot.save(game, 'quick.tts')
+  game = snapshot.load('quick.tts')    # plays on exactly as the saved game would have
+
+The state section is small and parsed as a whole. The board is the row masks
+at a fixed offset, then the cells of the filled tiles only. load() maps the file
+and reads the masks and the filled rows, the cost grows with the height and the
+filled tiles, not with the area of the board.
+"""
+import mmap
+import os
+import struct
+from engine import Game, GameState, new_scores
+from figure import QueueState, Piece, SHAPE_TABLE
+from item import Item
+from board import Board
+from replay import write_varint, read_varint, zigzag, unzigzag, RANDOMIZER_NAMES
+
+# Binary snapshot format, little endian
+#   HEADER:  MAGIC, width, height, offset of the board
+#   state:   item presence ratio as a double, then unsigned LEB128 varints (signed ones zigzag encoded):
+#            falling_speed_initial, lock delay, randomizer index, zigzag seed, ticks, falling speed, falling count,
+#            fast falling, lock timer + 1 (0 for none), lock resets, hard dropped, over, scores in new_scores() order,
+#            game Random, queue Random, Random of added pieces, count and shapes of recent,
+#            pieces generated since, current piece, rotation, x, y, fallen,
+#            next piece, count and pieces of queue, count and pieces of lookahead
+#   Random:  RANDOM_STATE words, 1 and a double if a gauss value is pending else 0
+#   piece:   shape index in SHAPES, r, g, b, item code
+#   board:   at an offset aligned to BOARD_ALIGN, height row masks of (width + 7) // 8 bytes,
+#            then r, g, b, item code bytes per filled tile, rows from the top, tiles from the left
+#   item code: 0 none, 1 + index in ITEMS
+MAGIC = b'TTS\x05'  # 02: Random of added pieces, 03: pieces generated since the start of the bag,
+                    # 04: seed zigzag encoded, negative seeds,
+                    # 05: cells of filled tiles only
+HEADER = struct.Struct('<4sHHI')
+RANDOM_STATE = struct.Struct('<625I')  # random.Random.getstate() version 3, 624 words and the position
+DOUBLE = struct.Struct('<d')
+BOARD_ALIGN = 64
+CELL_BYTES = 4
+SHAPES = list(SHAPE_TABLE)
+ITEMS = list(Item)
+SCORE_KEYS = list(new_scores())
+
+
+def item_code(item):
+  return ITEMS.index(item) + 1 if item else 0
+
+
+################################### encode
+
+def write_random(out: bytearray, state):
+  version, words, gauss = state
+  out += RANDOM_STATE.pack(*words)
+  if gauss is None:
+    out.append(0)
+  else:
+    out.append(1)
+    out += DOUBLE.pack(gauss)
+
+
+def write_piece(out: bytearray, piece: Piece):
+  write_varint(out, SHAPES.index(piece.shape))
+  out += bytes(piece.color)
+  out.append(item_code(piece.item))
+
+
+def write_board(out: bytearray, board: Board):
+  row_bytes = (board.width + 7) // 8
+  for mask in board.rows:
+    out += mask.to_bytes(row_bytes, 'little')
+  for _, _, (color, item) in board.filled_tiles():
+    out += bytes(color)
+    out.append(item_code(item))
+
+
+def encode(state: GameState):
+  out = bytearray(HEADER.size)
+  out += DOUBLE.pack(state.item_presence_ratio)
+  for value in (state.falling_speed_initial, state.lock_delay, RANDOMIZER_NAMES.index(state.randomizer), zigzag(state.seed),
+                state.ticks, state.falling_speed, state.falling_count, state.fast_falling,
+                0 if state.lock_timer is None else state.lock_timer + 1, state.lock_resets, state.hard_dropped,
+                state.over):
+    write_varint(out, int(value))
+  for key in SCORE_KEYS:
+    write_varint(out, state.scores[key])
+  write_random(out, state.rng)
+  figures = state.figures
+  write_random(out, figures.rng)
+  write_random(out, figures.added)
+  write_varint(out, len(figures.recent))
+  for shape in figures.recent:
+    write_varint(out, SHAPES.index(shape))
+  write_varint(out, figures.since)
+  write_piece(out, figures.current)
+  rotation, x, y, fallen = figures.pose
+  for value in (rotation, zigzag(x), zigzag(y), fallen):
+    write_varint(out, int(value))
+  write_piece(out, figures.next)
+  for pieces in (figures.queue, figures.lookahead):
+    write_varint(out, len(pieces))
+    for piece in pieces:
+      write_piece(out, piece)
+  # pad to the board, its offset does not depend on the state
+  board_at = -len(out) % BOARD_ALIGN + len(out)
+  out += bytes(board_at - len(out))
+  HEADER.pack_into(out, 0, MAGIC, state.width, state.height, board_at)
+  write_board(out, state.field)
+  return bytes(out)
+
+
+################################### decode
+
+def read_random(data, pos):
+  words = RANDOM_STATE.unpack_from(data, pos)
+  pos += RANDOM_STATE.size
+  gauss = None
+  if data[pos]:
+    gauss, = DOUBLE.unpack_from(data, pos + 1)
+    pos += DOUBLE.size
+  return (3, words, gauss), pos + 1
+
+
+def read_piece(data, pos):
+  shape, pos = read_varint(data, pos)
+  code = data[pos + 3]
+  return Piece(SHAPES[shape], tuple(data[pos:pos + 3]), ITEMS[code - 1] if code else None), pos + 4
+
+
+def read_board(data, board_at, width, height):
+  """Board from the mapped data, only filled rows are read"""
+  board = Board(width, height)
+  row_bytes = (width + 7) // 8
+  at = board_at + row_bytes * height
+  for y in range(height):
+    mask = int.from_bytes(data[board_at + y * row_bytes:board_at + (y + 1) * row_bytes], 'little')
+    if not mask:
+      continue
+    board.rows[y] = mask
+    cells = board.cells[y] = [None] * width
+    row = data[at:at + bin(mask).count('1') * CELL_BYTES]
+    at += len(row)
+    pos = 0
+    while mask:
+      low = mask & -mask
+      code = row[pos + 3]
+      cells[low.bit_length() - 1] = (tuple(row[pos:pos + 3]), ITEMS[code - 1] if code else None)
+      pos += CELL_BYTES
+      mask ^= low
+  board.rehash()
+  return board
+
+
+def decode(data):
+  """GameState of a snapshot, data is bytes or a mapped file"""
+  magic, width, height, board_at = HEADER.unpack_from(data, 0)
+  if magic != MAGIC:
+    raise ValueError("not a tetris snapshot")
+  pos = HEADER.size
+  item_presence_ratio, = DOUBLE.unpack_from(data, pos)
+  pos += DOUBLE.size
+  values = []
+  for _ in range(12 + len(SCORE_KEYS)):
+    value, pos = read_varint(data, pos)
+    values.append(value)
+  (falling_speed_initial, lock_delay, randomizer, seed, ticks, falling_speed, falling_count, fast_falling,
+   lock_timer, lock_resets, hard_dropped, over) = values[:12]
+  scores = dict(zip(SCORE_KEYS, values[12:]))
+  rng, pos = read_random(data, pos)
+  queue_rng, pos = read_random(data, pos)
+  added_rng, pos = read_random(data, pos)
+  count, pos = read_varint(data, pos)
+  recent = []
+  for _ in range(count):
+    shape, pos = read_varint(data, pos)
+    recent.append(SHAPES[shape])
+  since, pos = read_varint(data, pos)
+  current, pos = read_piece(data, pos)
+  pose = []
+  for _ in range(4):
+    value, pos = read_varint(data, pos)
+    pose.append(value)
+  rotation, x, y, fallen = pose
+  next_piece, pos = read_piece(data, pos)
+  queues = []
+  for _ in range(2):
+    count, pos = read_varint(data, pos)
+    pieces = []
+    for _ in range(count):
+      piece, pos = read_piece(data, pos)
+      pieces.append(piece)
+    queues.append(tuple(pieces))
+  figures = QueueState(queue_rng, added_rng, tuple(recent), since, current, (rotation, unzigzag(x), unzigzag(y), bool(fallen)),
+                       next_piece, *queues)
+  return GameState(width, height, item_presence_ratio, falling_speed_initial, lock_delay, RANDOMIZER_NAMES[randomizer],
+                   unzigzag(seed), ticks, falling_speed, falling_count, bool(fast_falling),
+                   lock_timer - 1 if lock_timer else None, lock_resets, bool(hard_dropped), scores, bool(over),
+                   rng, figures, read_board(data, board_at, width, height))
+
+
+################################### files
+
+def save(game: Game, path):
+  """Write the snapshot next to path and rename it over, a crash never leaves half a snapshot"""
+  data = encode(game.state())
+  temporary = path + '.tmp'
+  with open(temporary, 'wb') as f:
+    f.write(data)
+  os.replace(temporary, path)
+
+
+def load(path, sink=None):
+  """Game continuing from the snapshot at path"""
+  with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+    return Game.from_state(decode(data), sink)
@@ -0,0 +1,149 @@
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+STATS_PATH = '.stats.db'
+LEGACY_RECORD = '.record'   # plain text high score of older versions, imported once
+BATCH_SIZE = 64        # rows per transaction at most
+FLUSH_INTERVAL = 1.0   # seconds a row may wait for its batch
+BUSY_TIMEOUT_MS = 10000  # other processes writing the same database
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS games (
+  id INTEGER PRIMARY KEY,
+  finished REAL NOT NULL,
+  mode TEXT NOT NULL,
+  seed INTEGER NOT NULL,
+  score INTEGER NOT NULL,
+  total_lines INTEGER NOT NULL,
+  max_combo INTEGER NOT NULL,
+  pieces INTEGER NOT NULL,
+  items INTEGER NOT NULL,
+  ticks INTEGER NOT NULL,
+  duration REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS games_score ON games (mode, score DESC);
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+"""
+
+COLUMNS = ('finished', 'mode', 'seed', 'score', 'total_lines', 'max_combo', 'pieces', 'items', 'ticks', 'duration')
+FLUSH = object()   # queued by flush(), writes the batch without waiting for more rows
+INSERT = f"INSERT INTO games ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})"
+
+
+def connect(path):
+  connection = sqlite3.connect(path, timeout=BUSY_TIMEOUT_MS / 1000)
+  connection.execute("PRAGMA journal_mode=WAL")
+  connection.execute("PRAGMA synchronous=NORMAL")
+  return connection
+
+
+class StatsStore:
+
+  def __init__(self, path=STATS_PATH, batch_size=BATCH_SIZE, flush_interval=FLUSH_INTERVAL):
+    """StatsStore
+    Per game results in SQLite (WAL mode), several processes can write the same file.
+    add() only queues the row, a writer thread inserts them in batches, one transaction each.
+    The record is kept in memory, reads of it never touch the disk.
+    """
+    self.path = path
+    self.batch_size = batch_size
+    self.flush_interval = flush_interval
+    self.__connection = connect(path)
+    with self.__connection:
+      self.__connection.executescript(SCHEMA)
+    self.__import_legacy_record()
+    self.__records = dict(self.__connection.execute("SELECT mode, MAX(score) FROM games GROUP BY mode"))
+    legacy = self.__connection.execute("SELECT value FROM meta WHERE key = 'legacy_record'").fetchone()
+    self.__legacy = int(legacy[0]) if legacy else 0
+
+    self.__queue = queue.Queue()
+    self.__writer = threading.Thread(target=self.__write_loop, name='stats-writer', daemon=True)
+    self.__writer.start()
+
+  def __import_legacy_record(self):
+    if not os.path.exists(LEGACY_RECORD):
+      return
+    try:
+      with open(LEGACY_RECORD) as f:
+        value = int(f.readline() or 0)
+    except (OSError, ValueError):
+      return
+    with self.__connection:
+      self.__connection.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('legacy_record', ?)", (str(value),))
+
+  ######################## game loop side
+
+  def record(self, mode='window'):
+    """Best score of the mode, from memory"""
+    return max(self.__records.get(mode) or 0, self.__legacy if mode == 'window' else 0)
+
+  def add(self, game, mode='window'):
+    """Queue the result of a finished game"""
+    from engine import TICK_RATE
+    scores = game.scores
+    row = (time.time(), mode, game.seed, scores["score"], scores["total_lines"], scores["max_combo"],
+           scores["pieces"], scores["items"], game.ticks, game.ticks / TICK_RATE)
+    self.__records[mode] = max(self.__records.get(mode) or 0, scores["score"])
+    self.__queue.put(row)
+
+  def flush(self):
+    """Wait until every queued row is written"""
+    self.__queue.put(FLUSH)
+    self.__queue.join()
+
+  def close(self):
+    self.__queue.put(None)
+    self.__writer.join()
+    self.__connection.close()
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *exc):
+    self.close()
+
+  ######################## queries
+
+  def leaderboard(self, limit=10, mode='window'):
+    """Best games of the mode as dicts, best first"""
+    self.flush()
+    cursor = self.__connection.execute(
+      f"SELECT {', '.join(COLUMNS)} FROM games WHERE mode = ? ORDER BY score DESC, id LIMIT ?", (mode, limit))
+    return [dict(zip(COLUMNS, row)) for row in cursor]
+
+  def summary(self, mode='window'):
+    self.flush()
+    games, mean, lines, best_combo = self.__connection.execute(
+      "SELECT COUNT(*), AVG(score), SUM(total_lines), MAX(max_combo) FROM games WHERE mode = ?", (mode,)).fetchone()
+    return {"games": games, "mean score": mean or 0.0, "total lines": lines or 0,
+            "best combo": best_combo or 0, "record": self.record(mode)}
+
+  ######################## writer thread
+
+  def __write_loop(self):
+    # sqlite connections belong to their thread
+    connection = connect(self.path)
+    done = False
+    while not done:
+      batch = [self.__queue.get()]
+      deadline = time.monotonic() + self.flush_interval
+      while batch[-1] is not None and batch[-1] is not FLUSH and len(batch) < self.batch_size:
+        timeout = deadline - time.monotonic()
+        if timeout <= 0:
+          break
+        try:
+          batch.append(self.__queue.get(timeout=timeout))
+        except queue.Empty:
+          break
+      if batch[-1] is None:
+        done = True
+      rows = [row for row in batch if row is not None and row is not FLUSH]
+      if rows:
+        with connection:
+          connection.executemany(INSERT, rows)
+      for _ in batch:
+        self.__queue.task_done()
+    connection.close()
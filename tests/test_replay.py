@@ -0,0 +1,82 @@
+"""Roundtrip of the replay format
+
+  python -m unittest discover tests
+"""
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from controls import Action
+from replay import Replay, read_varint, unzigzag, write_varint, zigzag
+
+FIELDS = ('seed', 'width', 'height', 'falling_speed_initial', 'item_presence_ratio', 'lock_delay', 'randomizer', 'inputs',
+          'ticks', 'score')
+
+
+def fields(replay: Replay):
+  return {name: getattr(replay, name) for name in FIELDS}
+
+
+class VarintTest(unittest.TestCase):
+
+  def test_roundtrip(self):
+    for value in (0, 1, 127, 128, 2 ** 63, 2 ** 64 - 1, 2 ** 200):
+      out = bytearray()
+      write_varint(out, value)
+      self.assertEqual(read_varint(bytes(out), 0), (value, len(out)))
+
+  def test_negative(self):
+    with self.assertRaises(ValueError):
+      write_varint(bytearray(), -1)
+
+  def test_zigzag(self):
+    for value in (0, -1, 1, -2 ** 63, 2 ** 64 - 1, -2 ** 200):
+      self.assertGreaterEqual(zigzag(value), 0)
+      self.assertEqual(unzigzag(zigzag(value)), value)
+
+
+class ReplayTest(unittest.TestCase):
+
+  def assertRoundtrip(self, replay: Replay):
+    decoded = Replay.decode(replay.encode())
+    self.assertEqual(fields(decoded), fields(replay))
+
+  def test_zero(self):
+    self.assertRoundtrip(Replay(0, falling_speed_initial=0, item_presence_ratio=0.0, lock_delay=0, ticks=0, score=0))
+
+  def test_no_score(self):
+    self.assertRoundtrip(Replay(0))
+
+  def test_seeds(self):
+    for seed in (1, -1, 2 ** 32 - 1, 2 ** 64 - 1, -2 ** 63, 2 ** 200):
+      with self.subTest(seed=seed):
+        self.assertRoundtrip(Replay(seed))
+
+  def test_configs(self):
+    replay = Replay(7, 5, 4, 3, 0.125, [(0, Action.LEFT), (0, Action.ROTATE), (9, Action.HARD_DROP), (300, Action.RIGHT)],
+                    301, 1200, 0, 'history')
+    self.assertRoundtrip(replay)
+
+  def test_played(self):
+    """A recorded game replays to the same score after the roundtrip"""
+    replay = Replay(2 ** 64 - 1, 8, 12, item_presence_ratio=0.5)
+    game = replay.game()
+    actions = [Action.LEFT, Action.RIGHT, Action.ROTATE, Action.HARD_DROP, Action.NONE, Action.NONE]
+    while not game.over and game.ticks < 2000:
+      action = actions[game.ticks % len(actions)]
+      if action != Action.NONE:
+        replay.inputs.append((game.ticks, action))
+        game.apply(action)
+      game.step()
+    replay.ticks, replay.score = game.ticks, game.score
+
+    decoded = Replay.decode(replay.encode())
+    self.assertEqual(fields(decoded), fields(replay))
+    played = decoded.play()
+    self.assertEqual((played.ticks, played.score, played.field.rows), (game.ticks, game.score, game.field.rows))
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,113 @@
+"""FULL and DELTA messages of server.py rebuild the served field on the client
+
+  python -m unittest discover tests
+"""
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from engine import Event, Game
+from search import AutoPlayer
+from server import DELTA, FULL, GameView, RemoteGame
+
+
+def message(data: bytes):
+  """(type, payload) of a framed message"""
+  return data[4], data[5:]
+
+
+def visible(game: Game):
+  """Rows of cells a spectator sees, fallen tiles with the falling figure on top"""
+  board = game.field
+  rows = [[board.cells[y][x] if board.rows[y] >> x & 1 else None for x in range(game.width)] for y in range(game.height)]
+  figure = game.figures.current_figure
+  for idx, tile in enumerate(figure.tiles):
+    if 0 <= tile.y < game.height:
+      rows[tile.y][tile.x] = (figure.color, figure.item if idx == 0 else None)
+  return rows
+
+
+class ProtocolTest(unittest.TestCase):
+
+  def assertSynced(self, remote: RemoteGame, game: Game, tick=True):
+    board = remote.board
+    self.assertEqual((board.width, board.height), (game.width, game.height))
+    self.assertEqual([list(row) for row in board.cells], visible(game))
+    self.assertEqual((remote.score, remote.over), (game.score, game.over))
+    if tick:
+      self.assertEqual(remote.tick, game.ticks)
+    self.assertEqual(remote.next_figure.shape, game.figures.next_figure.shape)
+
+  def play(self, width, height, seed, garbage_every=7, pieces=120):
+    """Autoplayed game with garbage pushed in, checked after every message"""
+    game = Game(width, height, item_presence_ratio=0.3, seed=seed)
+    view, remote, player = GameView(game), RemoteGame(), AutoPlayer(lookahead=False)
+    view.delta()
+    remote.apply(*message(view.full(3)))
+    self.assertEqual(remote.index, 3)
+    self.assertSynced(remote, game)
+
+    cleared, pushed = 0, 0
+    for piece in range(pieces):
+      if game.over:
+        break
+      # a few falling steps first, so deltas also carry moves of the figure
+      for _ in range(2):
+        game.step()
+        self.sync(view, remote, game)
+      if piece % garbage_every == garbage_every - 1:
+        game.add_garbage(1 + piece % 2)
+        pushed += 1
+        self.sync(view, remote, game)
+      if game.over:
+        break
+      placement = player.choose(game)
+      if placement is None:
+        break
+      events = game.place(placement.rotation, placement.x, placement.y)
+      cleared += sum(data["completed"] for kind, data in events if kind == Event.COMPLETED)
+      self.sync(view, remote, game)
+    return cleared, pushed
+
+  def sync(self, view: GameView, remote: RemoteGame, game: Game):
+    delta = view.delta()
+    if delta is not None:
+      kind, payload = message(delta)
+      self.assertEqual(kind, DELTA)
+      remote.apply(kind, payload)
+    # no delta when nothing visible changed, the client keeps the tick of the last one
+    self.assertSynced(remote, game, tick=delta is not None)
+
+  def test_default_size(self):
+    cleared, pushed = self.play(10, 20, seed=1)
+    self.assertGreater(cleared, 0)
+    self.assertGreater(pushed, 0)
+
+  def test_sizes(self):
+    for width, height in ((7, 12), (16, 24), (40, 30)):
+      with self.subTest(size=f"{width}x{height}"):
+        cleared, pushed = self.play(width, height, seed=width)
+        self.assertGreater(cleared, 0)
+        self.assertGreater(pushed, 0)
+
+  def test_resync(self):
+    """A FULL frame in the middle of the game replaces whatever the client had"""
+    game = Game(12, 16, seed=5)
+    view, player = GameView(game), AutoPlayer(lookahead=False)
+    for _ in range(20):
+      placement = player.choose(game)
+      game.place(placement.rotation, placement.x, placement.y)
+      view.delta()
+    game.add_garbage(2)
+    view.delta()
+    remote = RemoteGame()
+    kind, payload = message(view.full(0))
+    self.assertEqual(kind, FULL)
+    remote.apply(kind, payload)
+    self.assertSynced(remote, game)
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -1,18 +1,3 @@
-def get_record():
-  try:
-    with open('.record') as f:
-      return f.readline()
-  except FileNotFoundError:
-    with open('.record', 'w') as f:
-      f.write('0')
-    return '0'
-
-
-def set_record(record, score):
-  rec = max(int(record), score)
-  with open('.record', 'w') as f:
-    f.write(str(rec))
-
 def filenames(path):
   import glob
   return glob.glob(path)
@@ -20,4 +5,27 @@ def filenames(path):
 def svg2png(path):
   import cairosvg
   print(f"Converting.. {path}")
-  cairosvg.svg2png(url=f"{path}.svg", write_to=f"{path}.png")
\ No newline at end of file
+  cairosvg.svg2png(url=f"{path}.svg", write_to=f"{path}.png")
+
+def parse_size(text):
+  """(width, height) of 'WxH', for argparse, at least figure.MIN_WIDTH wide"""
+  import argparse
+  from figure import MIN_WIDTH
+  try:
+    width, height = (int(value) for value in text.lower().split('x'))
+  except ValueError:
+    raise argparse.ArgumentTypeError(f"size must be WIDTHxHEIGHT, not {text!r}")
+  if width < MIN_WIDTH or height < 4:
+    raise argparse.ArgumentTypeError(f"size must be at least {MIN_WIDTH}x4, not {text!r}")
+  return width, height
+
+def parse_count(text):
+  """int of at least 1, for argparse"""
+  import argparse
+  try:
+    count = int(text)
+  except ValueError:
+    raise argparse.ArgumentTypeError(f"must be a whole number, not {text!r}")
+  if count < 1:
+    raise argparse.ArgumentTypeError(f"must be at least 1, not {text!r}")
+  return count